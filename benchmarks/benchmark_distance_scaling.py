@@ -0,0 +1,99 @@
+# import packages
+from haversine import haversine
+import pandas as pd
+import numpy as np
+import argparse
+import random
+import time
+import os
+
+from parameters import run_parameters
+from objects.MaritimeDistanceIndex import MaritimeDistanceIndex
+from objects.DistanceProvider import great_circle_distance_km
+from benchmarks.benchmark_maritime_distance import PORTS
+
+
+def create_port_pairs(number_of_pairs):
+    """
+    :return: list of distinct (origin_latlong, destination_latlong) pairs near the ports of typical provisioning lanes
+    """
+    random.seed(0)
+    ports = list(PORTS.values())
+    pairs = []
+    for i in range(number_of_pairs):
+        origin_latlong, destination_latlong = random.sample(ports, 2)
+
+        # move the ports slightly so that every pair is computed
+        pairs.append(((origin_latlong[0] + random.uniform(-0.2, 0.2), origin_latlong[1] + random.uniform(-0.2, 0.2)),
+                      (destination_latlong[0] + random.uniform(-0.2, 0.2), destination_latlong[1] + random.uniform(-0.2, 0.2))))
+    return pairs
+
+
+def time_air_distances(number_of_legs):
+    """
+    :return: the seconds per air leg of the haversine per leg and of the vectorized great circle distance
+    """
+
+    random.seed(0)
+    legs_df = pd.DataFrame({'Origin Latitude': [random.uniform(-60, 60) for i in range(number_of_legs)],
+                            'Origin Longitude': [random.uniform(-180, 180) for i in range(number_of_legs)],
+                            'Destination Latitude': [random.uniform(-60, 60) for i in range(number_of_legs)],
+                            'Destination Longitude': [random.uniform(-180, 180) for i in range(number_of_legs)]})
+
+    start_time = time.perf_counter()
+    for row in legs_df.itertuples(index=False):
+        np.around(haversine((row[0], row[1]), (row[2], row[3])) + run_parameters.DETOUR_KM, 2)
+    per_leg_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    np.around(great_circle_distance_km(legs_df) + run_parameters.DETOUR_KM, 2)
+    vectorized_seconds = time.perf_counter() - start_time
+
+    return per_leg_seconds / number_of_legs, vectorized_seconds / number_of_legs
+
+
+def time_maritime_distances(pairs, max_workers):
+    """
+    :param max_workers: the number of worker processes, 0 to compute the distances in this process
+    :return: the seconds to compute the sea route distances of all pairs, including the start of the workers
+    """
+    index = MaritimeDistanceIndex(None, max_workers=max_workers, min_pool_pairs=1)
+    start_time = time.perf_counter()
+    index.build(pairs)
+    seconds = time.perf_counter() - start_time
+    index.close()
+    return seconds
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Times the distance stage of the legs with 1 to N worker processes')
+    parser.add_argument('--air-legs', type=int, default=100000, help='number of air legs')
+    parser.add_argument('--port-pairs', type=int, default=400, help='number of unknown sea route distances')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        help='numbers of worker processes to time, by default 1, 2, 4, ... up to the number of cores')
+    args = parser.parse_args()
+
+    per_leg_seconds, vectorized_seconds = time_air_distances(args.air_legs)
+    print(f"Air great circle distances ({args.air_legs} legs):")
+    print(f"  {'haversine per leg (before)':<30}{per_leg_seconds * 1e6:10.3f} us per leg")
+    print(f"  {'vectorized':<30}{vectorized_seconds * 1e6:10.3f} us per leg")
+
+    # load the marine network of searoute before timing
+    pairs = create_port_pairs(args.port_pairs)
+    time_maritime_distances(pairs[:1], 0)
+
+    workers = args.workers
+    if workers is None:
+        workers = [1]
+        while workers[-1] * 2 <= os.cpu_count():
+            workers.append(workers[-1] * 2)
+        if workers[-1] != os.cpu_count():
+            workers.append(os.cpu_count())
+
+    serial_seconds = time_maritime_distances(pairs, 0)
+    print(f"Sea route distances ({args.port_pairs} port pairs, {os.cpu_count()} cores):")
+    print(f"  {'in this process (before)':<30}{serial_seconds:10.2f} s")
+    for max_workers in workers:
+        seconds = time_maritime_distances(pairs, max_workers)
+        print(f"  {f'{max_workers} worker processes':<30}{seconds:10.2f} s   speedup {serial_seconds / seconds:5.2f}x")
@@ -0,0 +1,202 @@
+# import packages
+import contextlib
+import tempfile
+import argparse
+import json
+import time
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+from parameters import run_parameters
+from objects.MockNTMServer import MockNTMServer
+from benchmarks.benchmark_maritime_distance import PORTS
+
+# workbook the new shipment of the synthetic workbooks is taken from
+SOURCE_WORKBOOK_PATH = run_parameters.path_to_workbook
+
+# numbers of legs of the synthetic workbooks
+WORKBOOK_SIZES = [10, 1000, 100000]
+
+# stored timings of each stage, compared with every run
+BASELINE_PATH = './benchmarks/baselines/benchmark_end_to_end.json'
+
+# a stage regresses if it takes longer than the tolerance times its baseline and at least the noise floor more
+REGRESSION_TOLERANCE = 1.5
+NOISE_FLOOR_SECONDS = 0.05
+
+
+def create_synthetic_workbook(path, number_of_legs, seed=0):
+    """
+    Writes a workbook with the input sheets of the script, the new shipment of the real workbook and number_of_legs
+    random transportation legs and provisioning legs to its origin service center
+    """
+
+    random = np.random.default_rng(seed)
+    shipment_df = pd.read_excel(SOURCE_WORKBOOK_PATH, sheet_name='Script input new shipment data')
+    shipment = shipment_df.iloc[0]
+
+    # road legs within Europe and North America, air legs between them
+    def random_points(size):
+        is_europe = random.random(size) < 0.5
+        return np.where(is_europe, random.uniform(40, 55, size), random.uniform(30, 45, size)), \
+               np.where(is_europe, random.uniform(-5, 20, size), random.uniform(-100, -75, size))
+
+    origin_latitude, origin_longitude = random_points(number_of_legs)
+    destination_latitude, destination_longitude = random_points(number_of_legs)
+    transportation_df = pd.DataFrame({
+        'Leg': [f"{leg + 1}. Synthetic leg" for leg in range(number_of_legs)],
+        'Origin': 'Synthetic origin',
+        'Transportation Mode': random.choice(['Road', 'Road', 'Road', 'Air'], number_of_legs),
+        'Origin Latitude': origin_latitude.round(6), 'Origin Longitude': origin_longitude.round(6),
+        'Destination': 'Synthetic destination',
+        'Destination Latitude': destination_latitude.round(6), 'Destination Longitude': destination_longitude.round(6),
+        'Shipment Weight [kg]': random.integers(100, 5000, number_of_legs),
+        'Shipment Volume [m3]': random.integers(1, 30, number_of_legs)})
+
+    # maritime provisioning legs run between the ports of typical provisioning lanes
+    origin_latitude, origin_longitude = random_points(number_of_legs)
+    destination_latitude, destination_longitude = random_points(number_of_legs)
+    ports = np.array(list(PORTS.values()))
+    transportation_modes = random.choice(['Road', 'Road', 'Maritime', 'Air'], number_of_legs)
+    is_maritime = transportation_modes == 'Maritime'
+    origin_port_indices = random.integers(0, len(ports), number_of_legs)
+    origin_ports = ports[origin_port_indices]
+    destination_ports = ports[(origin_port_indices + random.integers(1, len(ports), number_of_legs)) % len(ports)]
+    provisioning_df = pd.DataFrame({
+        'Container Type': shipment['Container Type'],
+        'Origin': 'Synthetic origin',
+        'Destination': 'Synthetic destination',
+        'Number of containers shipped': random.integers(1, 5, number_of_legs),
+        'Destination Service Center': shipment['Origin Service Center'],
+        'Transportation Mode': transportation_modes,
+        'Distance [km] (if available)': 0,
+        'Shipment Type': 'Provisioning',
+        'Origin Latitude': np.where(is_maritime, origin_ports[:, 0], origin_latitude.round(6)),
+        'Origin Longitude': np.where(is_maritime, origin_ports[:, 1], origin_longitude.round(6)),
+        'Destination Latitude': np.where(is_maritime, destination_ports[:, 0], destination_latitude.round(6)),
+        'Destination Longitude': np.where(is_maritime, destination_ports[:, 1], destination_longitude.round(6))})
+
+    with pd.ExcelWriter(path) as writer:
+        transportation_df.to_excel(writer, sheet_name='Script input transpo data', index=False)
+        shipment_df.to_excel(writer, sheet_name='Script input new shipment data', index=False)
+        provisioning_df.to_excel(writer, sheet_name='Script input provisioning data', index=False)
+
+
+def time_stage(timings, stage, function, *args):
+    """
+    Runs a stage with its output discarded and stores its duration in seconds
+    :return: the result of the stage
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start_time = time.perf_counter()
+        result = function(*args)
+        timings[stage] = round(time.perf_counter() - start_time, 4)
+    return result
+
+
+def run_end_to_end(number_of_legs, folder, latency_seconds):
+    """
+    Runs all stages of main.py on a synthetic workbook against the local stand-in of the external services
+    :return: dict with the duration of each stage in seconds
+    """
+
+    workbook_path = os.path.join(folder, f"workbook_{number_of_legs}.xlsx")
+    create_synthetic_workbook(workbook_path, number_of_legs)
+
+    # all caches start empty in the temporary folder
+    run_parameters.path_to_workbook = workbook_path
+    run_parameters.workbook_sidecar_folder = os.path.join(folder, f"workbook_{number_of_legs}")
+    run_parameters.NTM_cache_path = os.path.join(folder, f"ntm_results_{number_of_legs}.sqlite")
+    run_parameters.distance_cache_path = os.path.join(folder, f"distances_{number_of_legs}.sqlite")
+    run_parameters.leg_results_path = os.path.join(folder, f"leg_results_{number_of_legs}.sqlite")
+    run_parameters.maritime_distance_index_path = os.path.join(folder, f"maritime_distances_{number_of_legs}.csv")
+    run_parameters.lane_emission_index_path = os.path.join(folder, f"lane_emission_index_{number_of_legs}.parquet")
+
+    # the stages are timed without the state kept between runs and without waiting for the rate limiter, whatever
+    # run_parameters.py sets
+    run_parameters.use_rate_limiter = False
+    run_parameters.use_incremental_recomputation = False
+    run_parameters.use_lane_emission_index = False
+    run_parameters.path_save_leg_results = None
+
+    from objects.EmissionsCalculator import EmissionsCalculator as EMC
+
+    timings = dict()
+    with MockNTMServer(latency_seconds=latency_seconds) as server:
+        run_parameters.offline_server_url = server.url
+        emc = EMC()
+
+        time_stage(timings, 'create_transportation_dict', emc.create_transportation_dict)
+        time_stage(timings, 'token acquisition', emc.auth.get_access_token)
+        time_stage(timings, 'prefetch_road_distances', emc.prefetch_road_distances)
+        time_stage(timings, 'build_maritime_distance_index', emc.build_maritime_distance_index)
+        airfreight_emissions_kg, road_freight_emissions_kg = time_stage(
+            timings, 'calculate_shipment_transportation_emissions', emc.calculate_shipment_transportation_emissions)
+        repositioning_emissions_kg = time_stage(timings, 'calculate_repositioning_emissions',
+                                                emc.calculate_repositioning_emissions)
+
+        # the output as written by main.py
+        new_sheet = pd.DataFrame({'Variable road freight emissions': np.around(road_freight_emissions_kg, 2),
+                                  'Variable air freight emissions': np.around(airfreight_emissions_kg, 2),
+                                  'Repositioning/Provisioning emissions': np.around(repositioning_emissions_kg, 2)},
+                                 index=[0])
+        time_stage(timings, 'output writing', new_sheet.to_excel, os.path.join(folder, 'output.xlsx'))
+
+    timings['total'] = round(sum(timings.values()), 4)
+    return timings
+
+
+def find_regressions(results, baseline):
+    """
+    :return: list with a description of each stage that is slower than its baseline
+    """
+    regressions = []
+    for size, timings in results.items():
+        for stage, seconds in timings.items():
+            baseline_seconds = baseline.get(size, dict()).get(stage)
+            if baseline_seconds is not None and seconds > REGRESSION_TOLERANCE * baseline_seconds and \
+                    seconds - baseline_seconds > NOISE_FLOOR_SECONDS:
+                regressions.append(f"{size} legs, {stage}: {seconds} s instead of {baseline_seconds} s")
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Times each stage of main.py on synthetic workbooks against the local '
+                                                 'stand-in of NTM and Google Maps')
+    parser.add_argument('--sizes', type=int, nargs='+', default=WORKBOOK_SIZES, help='numbers of legs')
+    parser.add_argument('--latency', type=float, default=0, help='latency in seconds of the stand-in services')
+    parser.add_argument('--save-baseline', action='store_true', help='store the timings as new baseline')
+    args = parser.parse_args()
+
+    results = dict()
+    with tempfile.TemporaryDirectory() as folder:
+        for number_of_legs in args.sizes:
+            results[str(number_of_legs)] = run_end_to_end(number_of_legs, folder, args.latency)
+
+            print(f"{number_of_legs} legs:")
+            for stage, seconds in results[str(number_of_legs)].items():
+                print(f"  {stage:<50}{seconds:10.4f} s")
+
+    if args.save_baseline:
+        baseline = dict()
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as file:
+                baseline = json.load(file)
+        baseline.update(results)
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, 'w') as file:
+            json.dump(baseline, file, indent=2)
+        print(f"Saved the baseline to {BASELINE_PATH}.")
+
+    elif os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as file:
+            regressions = find_regressions(results, json.load(file))
+        if len(regressions) > 0:
+            print("Regressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions against the baseline.")
@@ -0,0 +1,65 @@
+# import packages
+import tempfile
+import random
+import time
+import os
+import searoute as sr
+
+from objects.MaritimeDistanceIndex import MaritimeDistanceIndex
+
+# ports of typical provisioning lanes as lat long pairs
+PORTS = {'Port of Rotterdam': (51.881062, 4.322007),
+         'Port of New York and New Jersey': (40.686564, -73.994895),
+         'Port of Cartagena': (10.405623, -75.527676),
+         'Port of Hamburg': (53.539584, 9.966210),
+         'Port of Singapore': (1.264027, 103.840230),
+         'Port of Shanghai': (31.230416, 121.473701),
+         'Port of Santos': (-23.960833, -46.333611),
+         'Port of Los Angeles': (33.736906, -118.262916)}
+
+NUMBER_OF_LEGS = 200
+
+
+def time_per_leg(function, pairs):
+    """
+    :return: the average time per leg in milliseconds
+    """
+    start_time = time.perf_counter()
+    for origin_latlong, destination_latlong in pairs:
+        function(origin_latlong, destination_latlong)
+    return (time.perf_counter() - start_time) / len(pairs) * 1000
+
+
+def searoute_distance(origin_latlong, destination_latlong):
+    return sr.searoute([origin_latlong[1], origin_latlong[0]], [destination_latlong[1], destination_latlong[0]],
+                       units="km")['properties']['length']
+
+
+if __name__ == "__main__":
+
+    # legs on repeating port pairs, as in the provisioning sheet
+    random.seed(0)
+    ports = list(PORTS.values())
+    pairs = [tuple(random.sample(ports, 2)) for i in range(NUMBER_OF_LEGS)]
+
+    # warm up the marine network of searoute
+    searoute_distance(*pairs[0])
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'maritime_distances.csv')
+
+        results = dict()
+        results['searoute per leg (before)'] = time_per_leg(searoute_distance, pairs)
+
+        # the index memoizes the distances of the repeating port pairs
+        index = MaritimeDistanceIndex(path)
+        results['index, empty'] = time_per_leg(index.get_distance, pairs)
+        index.save()
+
+        # a new run loads the persisted table lazily
+        index = MaritimeDistanceIndex(path)
+        results['index, loaded from disk'] = time_per_leg(index.get_distance, pairs)
+
+    print(f"Maritime distance latency per leg ({NUMBER_OF_LEGS} legs on {len(PORTS)} ports):")
+    for name, milliseconds in results.items():
+        print(f"  {name:<30}{milliseconds:10.4f} ms")
@@ -0,0 +1,119 @@
+# import packages
+import subprocess
+import statistics
+import tempfile
+import argparse
+import json
+import time
+import sys
+import os
+
+from objects.MockNTMServer import MockNTMServer
+from benchmarks.benchmark_end_to_end import create_synthetic_workbook
+
+# heavy dependencies that are only loaded when they are needed
+LAZY_MODULES = ['requests', 'googlemaps', 'searoute', 'networkx', 'pyarrow.parquet', 'aiohttp']
+
+# script timing the imports and the calculation of the new shipment in a fresh interpreter
+CALCULATION_SCRIPT = """
+import time
+start_time = time.perf_counter()
+import json
+import sys
+import main
+from parameters import run_parameters
+from objects.EmissionsCalculator import EmissionsCalculator
+import_seconds = time.perf_counter() - start_time
+
+settings = json.loads(sys.argv[1])
+for name, value in settings['run parameters'].items():
+    setattr(run_parameters, name, value)
+
+start_time = time.perf_counter()
+main.run_workbook(EmissionsCalculator())
+calculation_seconds = time.perf_counter() - start_time
+
+print(json.dumps({'import': import_seconds, 'calculation': calculation_seconds,
+                  'loaded': [module for module in settings['lazy modules'] if module in sys.modules]}))
+"""
+
+
+def run_interpreter(arguments):
+    """
+    Runs a fresh interpreter in the repository root
+    :return: the wall time in seconds and the last line of the output
+    """
+    start_time = time.perf_counter()
+    res = subprocess.run([sys.executable] + arguments, capture_output=True, text=True, check=True)
+    wall_seconds = time.perf_counter() - start_time
+    return wall_seconds, res.stdout.strip().split('\n')[-1]
+
+
+def time_calculation(folder, server_url, repetitions, warm_caches):
+    """
+    Times the calculation of a one-leg workbook in fresh interpreters
+    :param warm_caches: if True, all caches hold the results of an earlier run, otherwise every run starts empty
+    :return: dict with the median seconds of the interpreter, the imports and the calculation, and the modules loaded
+    """
+
+    workbook_path = os.path.join(folder, 'workbook.xlsx')
+    if not os.path.exists(workbook_path):
+        create_synthetic_workbook(workbook_path, 1)
+
+    def get_settings(cache_folder):
+        # every file read or written between runs is in the temporary folder, and the state kept between runs apart
+        # from the caches is switched off
+        return {'run parameters': {'offline_server_url': server_url,
+                                   'use_rate_limiter': False,
+                                   'use_incremental_recomputation': False,
+                                   'use_lane_emission_index': False,
+                                   'emissions_service_url': None,
+                                   'path_to_workbook': workbook_path,
+                                   'path_save_solution': os.path.join(folder, 'output.xlsx'),
+                                   'path_save_shipment_results': os.path.join(folder, 'shipment_output.csv'),
+                                   'path_save_leg_results': None,
+                                   'workbook_sidecar_folder': os.path.join(cache_folder, 'workbook'),
+                                   'NTM_cache_path': os.path.join(cache_folder, 'ntm_results.sqlite'),
+                                   'distance_cache_path': os.path.join(cache_folder, 'distances.sqlite'),
+                                   'leg_results_path': os.path.join(cache_folder, 'leg_results.sqlite'),
+                                   'maritime_distance_index_path': os.path.join(cache_folder, 'maritime_distances.csv'),
+                                   'lane_emission_index_path': os.path.join(cache_folder, 'lane_emission_index.parquet')},
+                'lazy modules': LAZY_MODULES}
+
+    # fill the caches once for the warm runs
+    if warm_caches:
+        settings = get_settings(os.path.join(folder, 'warm'))
+        run_interpreter(['-c', CALCULATION_SCRIPT, json.dumps(settings)])
+
+    timings = []
+    for repetition in range(repetitions):
+        if not warm_caches:
+            settings = get_settings(os.path.join(folder, f"cold_{repetition}"))
+        wall_seconds, output = run_interpreter(['-c', CALCULATION_SCRIPT, json.dumps(settings)])
+        timings.append(dict(json.loads(output), wall=wall_seconds))
+
+    return {'wall': statistics.median(timing['wall'] for timing in timings),
+            'import': statistics.median(timing['import'] for timing in timings),
+            'calculation': statistics.median(timing['calculation'] for timing in timings),
+            'loaded': timings[-1]['loaded']}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Times the cold start of main.py in fresh interpreters against the '
+                                                 'local stand-in of NTM and Google Maps')
+    parser.add_argument('--repetitions', type=int, default=5, help='runs per measurement, the median is reported')
+    args = parser.parse_args()
+
+    help_seconds = statistics.median(run_interpreter(['main.py', '--help'])[0] for _ in range(args.repetitions))
+    import_seconds = statistics.median(run_interpreter(['-c', 'import main'])[0] for _ in range(args.repetitions))
+    print(f"{'main.py --help':<45}{help_seconds:10.4f} s")
+    print(f"{'import main':<45}{import_seconds:10.4f} s")
+
+    with tempfile.TemporaryDirectory() as folder, MockNTMServer() as server:
+        for warm_caches in [False, True]:
+            timings = time_calculation(folder, server.url, args.repetitions, warm_caches)
+            name = f"one-leg workbook, {'warm' if warm_caches else 'cold'} caches"
+            print(f"{name:<45}{timings['wall']:10.4f} s ({timings['import']:.4f} s imports, "
+                  f"{timings['calculation']:.4f} s calculation)")
+            print(f"  lazily loaded: {', '.join(timings['loaded']) if len(timings['loaded']) > 0 else 'none'}")
@@ -1,30 +1,269 @@
 # import packages
-import numpy as np
-import pandas as pd
-from parameters.run_parameters import path_save_solution
-from objects.EmissionsCalculator import EmissionsCalculator as EMC
+import argparse
+import json
+import os
+from parameters import run_parameters
 
-if __name__ == "__main__":
+# pandas, numpy and the calculation modules are imported by the functions using them, so that --help and the client
+# mode do not load them
 
-    # create emissions calculator object
-    emc = EMC()
 
-    # create dictionary with all parameters as well as transportation routes
-    emc.create_transportation_dict()
+def run_workbook(emc, provisioning_path=None):
+    """
+    Calculates the emissions of the new shipment in the workbook and saves them for the Excel model
+    :param provisioning_path: csv or parquet provisioning history streamed instead of the provisioning sheet
+    """
+
+    emissions_dict = emc.calculate_workbook_emissions(provisioning_path)
+
+    # save it as Excel sheet
+    with emc.instrumentation.timer('stage_seconds', stage='output writing'):
+        save_workbook_emissions(emissions_dict)
+
 
-    # Calculate transportation emissions
-    airfreight_emissions_kg, road_freight_emissions_kg = emc.calculate_shipment_transportation_emissions()
+def save_workbook_emissions(emissions_dict):
+    """
+    Saves the emissions of the new shipment as table and, if enabled, as Excel sheet for the Excel model
+    :param emissions_dict: dict with the road freight, air freight and repositioning/provisioning emissions in kg
+    """
 
-    # Calculate repositioning emissions
-    repositioning_emissions_kg = emc.calculate_repositioning_emissions()
+    import numpy as np
+    import pandas as pd
+    from objects.ShipmentBatchCalculator import write_table
 
     # save them temporarily as df
-    emissions_dict = {'Variable road freight emissions': np.around(road_freight_emissions_kg, 2),
-                      'Variable air freight emissions': np.around(airfreight_emissions_kg, 2),
-                      'Repositioning/Provisioning emissions': np.around(repositioning_emissions_kg, 2)}
     new_sheet = pd.DataFrame(emissions_dict, index=[0])
 
-    # save it as Excel sheet
-    new_sheet.to_excel(path_save_solution)
+    # totals with failed legs are left empty instead of undercounting the emissions
+    for name, emissions_kg in emissions_dict.items():
+        if np.isnan(emissions_kg):
+            print(f"{name} could not be calculated since legs failed, see the failed legs reported above.")
+
+    write_table(new_sheet, run_parameters.path_save_shipment_results)
+
+    # the Excel sheet is a view of the shipment results
+    if run_parameters.write_excel_summary:
+        new_sheet.to_excel(run_parameters.path_save_solution)
+
+
+def run_batch(emc, shipments_path, legs_path, output_path):
+    """
+    Calculates the emissions of a table of shipments and their legs and saves one row per shipment
+    """
+
+    from objects.ShipmentBatchCalculator import ShipmentBatchCalculator, read_table, write_table
+
+    # the shipments and legs can be two sheets of the same Excel file
+    shipments_df = read_table(shipments_path, sheet_name='Shipments')
+    legs_df = read_table(legs_path if legs_path is not None else shipments_path, sheet_name='Legs')
+
+    # the provisioning data is still taken from the workbook
+    emc.build_maritime_distance_index()
+
+    output_df = ShipmentBatchCalculator(emc).calculate_shipment_emissions(shipments_df, legs_df)
+
+    # large batches are not written through openpyxl
+    if os.path.splitext(output_path)[1].lower() in ['.xlsx', '.xlsm'] and len(output_df) > run_parameters.excel_max_rows:
+        output_path = os.path.splitext(output_path)[0] + '.csv'
+        print(f"{len(output_df)} shipments exceed {run_parameters.excel_max_rows} rows, writing {output_path} instead.")
+
+    write_table(output_df, output_path)
+
+
+def run_sweep(emc, grid_path, output_path):
+    """
+    Calculates the emissions of the new shipment in the workbook for every scenario of a grid of run parameter overrides
+    and saves one row per scenario
+    """
+
+    from objects.ShipmentBatchCalculator import write_table
+    from objects.ScenarioSweep import ScenarioSweep, create_scenarios
+
+    with open(grid_path) as file:
+        scenarios = create_scenarios(json.load(file))
+
+    emc.create_transportation_dict()
+    emc.prefetch_road_distances()
+    emc.build_maritime_distance_index()
+
+    output_df = ScenarioSweep(emc).run(scenarios)
+
+    write_table(output_df, output_path)
+
+
+def calibrate_surrogate(emc, path):
+    """
+    Samples NTM for the NTM parameters of the new shipment and of repositioning and saves the emission factor tables
+    """
+
+    import numpy as np
+    from objects.EmissionFactorSurrogate import EmissionFactorSurrogate
+
+    emc.create_transportation_dict()
+
+    surrogate = EmissionFactorSurrogate()
+    errors = surrogate.calibrate(emc, emc.transport_dict['new shipment'])
+    errors.update(surrogate.calibrate(emc, emc.transport_dict['repositioning']))
+    surrogate.save(path)
+
+    # report the error bound of each configuration against live NTM values
+    for configuration_key, max_relative_error in errors.items():
+        print(f"{configuration_key}: max relative error {np.around(100*max_relative_error, 2)}%")
+
+
+def build_lane_index(emc, path):
+    """
+    Calculates the emissions of every lane of the service-center network and of the new shipment and saves the index
+    """
+
+    from objects.LaneEmissionIndex import LaneEmissionIndex
+
+    emc.create_transportation_dict()
+    emc.prefetch_road_distances()
+    emc.build_maritime_distance_index()
+
+    # the lanes are calculated by the engine wrapped by the index in use, or live if the index is not used
+    lane_index = emc.batch_engine if isinstance(emc.batch_engine, LaneEmissionIndex) else \
+        LaneEmissionIndex(emc.live_engine, path, emissions_calculator=emc)
+    lane_index.path = path
+    index_df = lane_index.build(emc)
+
+    print(f"Indexed {len(index_df)} lanes in {path}")
+
+
+def run_locally(args):
+    """
+    Runs the calculation selected by the command line arguments in this process and reports the caches and timings
+    """
+
+    import numpy as np
+    from objects.EmissionsCalculator import EmissionsCalculator as EMC
+    from objects.EmissionFactorSurrogate import EmissionFactorSurrogate
+    from objects.IncrementalEmissionsEngine import IncrementalEmissionsEngine
+    from objects.LaneEmissionIndex import LaneEmissionIndex
+    from objects.LegOutputWriter import LegOutputWriter
+
+    # create emissions calculator object
+    emc = EMC()
+
+    # estimate all legs from the emission factor tables
+    if args.surrogate:
+        emc.batch_engine = EmissionFactorSurrogate.load(run_parameters.surrogate_tables_path, emc)
+
+    # write every calculated leg of the workbook and batch runs while they are calculated
+    leg_output_path = args.leg_output if args.leg_output is not None else run_parameters.path_save_leg_results
+    if leg_output_path is not None and not args.calibrate_surrogate and not args.build_lane_index and args.sweep is None:
+        emc.leg_output = LegOutputWriter(leg_output_path)
+
+    try:
+        if args.calibrate_surrogate:
+            calibrate_surrogate(emc, run_parameters.surrogate_tables_path)
+        elif args.build_lane_index:
+            build_lane_index(emc, run_parameters.lane_emission_index_path)
+        elif args.sweep is not None:
+            run_sweep(emc, args.sweep, args.output if args.output is not None else run_parameters.path_save_sweep_solution)
+        elif args.shipments is not None:
+            run_batch(emc, args.shipments, args.legs,
+                      args.output if args.output is not None else run_parameters.path_save_batch_solution)
+        else:
+            run_workbook(emc, args.provisioning)
+    finally:
+        emc.maritime_distance_index.close()
+        if emc.leg_output is not None:
+            emc.leg_output.close()
+            print(f"Wrote {emc.leg_output.number_of_legs} legs to {leg_output_path}")
+
+    # report how many NTM queries were answered from the cache
+    if emc.ntm_cache is not None:
+        cache_statistics = emc.ntm_cache.statistics()
+        print(f"NTM cache: {cache_statistics['hits']} hits, {cache_statistics['misses']} misses, "
+              f"{cache_statistics['saved seconds']} seconds saved")
+    if run_parameters.use_distance_cache:
+        cache_statistics = emc.road_distance_provider.cache.statistics()
+        print(f"Road distance cache: {cache_statistics['hits']} hits, {cache_statistics['misses']} misses, "
+              f"{cache_statistics['saved seconds']} seconds saved")
+
+    # report how many legs were taken from the lane index and from an earlier run
+    engine = emc.batch_engine
+    while engine is not None:
+        if isinstance(engine, LaneEmissionIndex):
+            print(f"Lane emission index: {engine.number_of_indexed_legs} legs from the index, "
+                  f"{engine.number_of_live_legs} legs on unseen lanes calculated")
+        if isinstance(engine, IncrementalEmissionsEngine):
+            print(f"Incremental recomputation: {engine.number_of_reused_legs} legs reused, "
+                  f"{engine.number_of_calculated_legs} legs calculated")
+        engine = getattr(engine, 'engine', None)
+
+    # report how many legs and distance lookups were answered by an identical request of the run
+    coalescing_statistics = emc.coalescer.statistics
+    for kind in ['legs', 'distances']:
+        statistics = coalescing_statistics.get(kind, {'requests': 0, 'shared': 0})
+        print(f"Coalescing of {kind}: {statistics['shared']} of {statistics['requests']} shared, "
+              f"dedup ratio {np.around(emc.coalescer.get_dedup_ratio(kind), 3)}")
+
+    # report where the run spent its time
+    print(emc.instrumentation.summary())
+    if args.metrics is not None:
+        emc.instrumentation.export(args.metrics)
+
+
+def run_service_client(service_url, args):
+    """
+    Sends the calculation selected by the command line arguments to a running emissions service and saves the results
+    like the local calculation
+    """
+
+    # the client is only imported in client mode, so local runs answered from the caches do not load requests
+    from objects.EmissionsServiceClient import EmissionsServiceClient
+    from objects.ShipmentBatchCalculator import read_table, write_table
+
+    client = EmissionsServiceClient(service_url)
+
+    if args.shipments is not None:
+        shipments_df = read_table(args.shipments, sheet_name='Shipments')
+        legs_df = read_table(args.legs if args.legs is not None else args.shipments, sheet_name='Legs')
+        write_table(client.calculate_shipment_emissions(shipments_df, legs_df),
+                    args.output if args.output is not None else run_parameters.path_save_batch_solution)
+    else:
+        # the service may run in another working directory
+        provisioning_path = os.path.abspath(args.provisioning) if args.provisioning is not None else None
+        save_workbook_emissions(client.calculate_workbook_emissions(provisioning_path))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Calculates the transportation and repositioning emissions of shipments')
+    parser.add_argument('--shipments', help='csv, parquet or Excel table of shipments with a "Shipment ID" column '
+                                            'and the columns of "Script input new shipment data" (sheet "Shipments" '
+                                            'in Excel files). Without it the new shipment of the workbook is calculated.')
+    parser.add_argument('--legs', help='csv, parquet or Excel table of legs with a "Shipment ID" column and the '
+                                       'columns of "Script input transpo data" (sheet "Legs" in Excel files, by '
+                                       'default in the shipments file)')
+    parser.add_argument('--output', help='csv, parquet or Excel file of the emissions per shipment or per scenario')
+    parser.add_argument('--leg-output', help='csv or parquet file to write the result of every calculated leg to, by '
+                                             'default run_parameters.path_save_leg_results')
+    parser.add_argument('--provisioning', help='csv or parquet provisioning history with the columns of "Script input '
+                                               'provisioning data", streamed in chunks instead of reading the sheet')
+    parser.add_argument('--metrics', help='json file or Prometheus text file (e.g. metrics.prom) to export the call '
+                                          'counts, latency histograms and failures of the run to')
+    parser.add_argument('--sweep', help='json file with the list of values of each run parameter to sweep, the '
+                                        'emissions of the new shipment in the workbook are calculated per scenario')
+    parser.add_argument('--calibrate-surrogate', action='store_true',
+                        help='sample NTM for the parameters in the workbook and store the emission factor tables')
+    parser.add_argument('--build-lane-index', action='store_true',
+                        help='calculate the emissions of every lane of the service-center network and store the index '
+                             'the following runs answer these lanes from')
+    parser.add_argument('--surrogate', action='store_true',
+                        help='estimate the emissions offline from the stored emission factor tables instead of NTM')
+    parser.add_argument('--service', help='url of a running emissions service (python -m objects.EmissionsService) '
+                                          'to send the calculation to instead of calculating it in this process')
+    args = parser.parse_args()
+
+    # send the calculation to a running emissions service, sweeps, calibrations and lane indexes always run locally
+    service_url = args.service if args.service is not None else run_parameters.emissions_service_url
+    if service_url is not None and args.sweep is None and not args.calibrate_surrogate and not args.build_lane_index:
+        run_service_client(service_url, args)
+    else:
+        run_locally(args)
 
-    print('Finished.')
\ No newline at end of file
+    print('Finished.')
@@ -0,0 +1,212 @@
+# import packages
+import asyncio
+import aiohttp
+import numpy as np
+import pandas as pd
+import time
+
+from parameters import run_parameters
+from objects.AsyncNTM_Authentifier import AsyncAuth
+from objects.RetryPolicy import RETRY_STATUS_CODES, get_backoff_seconds, get_retry_after_seconds
+from objects.EmissionsCalculator import EmissionsCalculator
+from parameters.authenfitication_parameters import NTM_authentification_settings
+
+
+class AsyncEmissionsCalculator:
+    """
+    Class object calculating the emissions of many legs with coroutines sharing one pooled keep-alive HTTP session.
+    Distances, parameters and caches are taken from the wrapped EmissionsCalculator.
+
+    Usage:
+        async with AsyncEmissionsCalculator() as calculator:
+            airfreight_emissions_kg, road_freight_emissions_kg = await calculator.calculate_shipment_transportation_emissions()
+    """
+
+    def __init__(self, emissions_calculator=None, max_concurrent_requests=None):
+        """
+        :param emissions_calculator: the EmissionsCalculator providing distances, parameters and caches
+        :param max_concurrent_requests: the maximum number of NTM requests in flight at the same time
+        """
+        self.emissions_calculator = emissions_calculator if emissions_calculator is not None else EmissionsCalculator()
+        self.max_concurrent_requests = max_concurrent_requests if max_concurrent_requests is not None else \
+            run_parameters.NTM_max_concurrent_requests
+
+        # created when entering the context
+        self.session = None
+        self.auth = None
+        self.semaphore = None
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_concurrent_requests))
+        self.auth = AsyncAuth(NTM_authentification_settings, self.post_with_retries, run_parameters.offline_server_url,
+                              self.emissions_calculator.instrumentation)
+        self.semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.session.close()
+
+    async def post_with_retries(self, url, service='ntm', **kwargs):
+        """
+        Sends a POST request and retries connection errors, rate limits and server errors with exponential backoff
+        :param url: the url of the request
+        :param service: the service of the request, 'ntm' or 'ntm token', whose rate limiter every attempt waits for
+        :return: the status code and the json response
+        """
+
+        rate_limiter = self.emissions_calculator.rate_limiters.get(service)
+        for attempt in range(run_parameters.NTM_max_retries + 1):
+            if rate_limiter is not None:
+                await rate_limiter.acquire_async()
+            start_time = time.perf_counter()
+
+            status = None
+            retry_after_seconds = None
+            try:
+                async with self.semaphore:
+                    async with self.session.post(url, **kwargs) as res:
+                        status = res.status
+                        retry_after_seconds = get_retry_after_seconds(res.headers)
+                        if res.status not in RETRY_STATUS_CODES or attempt == run_parameters.NTM_max_retries:
+                            return res.status, await res.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == run_parameters.NTM_max_retries:
+                    raise
+            finally:
+                if rate_limiter is not None:
+                    rate_limiter.release(status, time.perf_counter() - start_time, retry_after_seconds)
+
+            self.emissions_calculator.instrumentation.increment('retries', service=service)
+            await asyncio.sleep(get_backoff_seconds(attempt))
+
+    async def post_transport_activity(self, calculation_object_id, API_parameters):
+        """
+        Sends a transport activity query to the NTM API
+        :param calculation_object_id: the id of the NTM calculation object (e.g. the vehicle or aircraft type)
+        :param API_parameters: the list of parameters of the calculation object
+        :return: the json response of the NTM API
+        """
+
+        ntm_cache = self.emissions_calculator.ntm_cache
+
+        # look up the query in the cache
+        if ntm_cache is not None:
+            cache_key = EmissionsCalculator.make_transport_activity_key(calculation_object_id, API_parameters)
+            response = ntm_cache.get(cache_key)
+            self.emissions_calculator.instrumentation.increment('cache_lookups', cache='ntm',
+                                                                result='hit' if response is not None else 'miss')
+            if response is not None:
+                return response
+
+        start_time = time.perf_counter()
+
+        # Get the access token needed for authentication and authorization in the web service
+        access_token = await self.auth.get_access_token()
+
+        # run the query
+        instrumentation = self.emissions_calculator.instrumentation
+        instrumentation.increment('external_calls', service='ntm')
+        with instrumentation.timer('external_call_seconds', service='ntm'):
+            status, response = await self.post_with_retries(self.emissions_calculator.transport_activities_url,
+                                                             headers={'Content-Type': 'application/json',
+                                                                      'Authorization': 'Bearer ' + access_token},
+                                                             json={"calculationObject": {"id": calculation_object_id,
+                                                                                         "version": "1"},
+                                                                   "parameters": API_parameters})
+        if 'resultTable' not in response:
+            instrumentation.increment('failures', service='ntm')
+
+        # only store successful calculations in the cache
+        if ntm_cache is not None and 'resultTable' in response:
+            ntm_cache.set(cache_key, response, latency_seconds=time.perf_counter() - start_time)
+
+        return response
+
+    async def calculate_single_leg(self, leg, parameter_dict):
+        """
+        Calculates the emissions of a single leg
+        :param leg: dict with the leg data
+        :param parameter_dict: the parameter dict used for the leg
+        :return: tuple of the emissions (NaN if failed) and the error message (None if successful)
+        """
+
+        emc = self.emissions_calculator
+        transportation_mode = leg['Transportation Mode']
+        if transportation_mode not in ['Road', 'Air', 'Maritime']:
+            return np.nan, f"Unsupported transportation mode {transportation_mode}"
+
+        # get the origin and destination points
+        origin_latlong = (leg['Origin Latitude'], leg['Origin Longitude'])
+        dest_latlong = (leg['Destination Latitude'], leg['Destination Longitude'])
+
+        try:
+            # distance lookups may block on Google or searoute, so they run outside the event loop
+            distance_km = leg.get('Distance [km]')
+            if pd.isna(distance_km):
+                distance_km = await asyncio.to_thread(emc.get_distance, transportation_mode, origin_latlong, dest_latlong)
+
+            if transportation_mode == 'Air':
+                query = emc.create_air_freight_query(leg['Shipment Weight [kg]'], leg['Shipment Volume [m3]'],
+                                                     distance_km, parameter_dict)
+            elif transportation_mode == 'Road':
+                query = emc.create_road_freight_query(leg['Shipment Weight [kg]'], distance_km, parameter_dict)
+            else:
+                query = emc.create_maritime_freight_query(leg['Shipment Weight [kg]'], distance_km, parameter_dict)
+
+            response = await self.post_transport_activity(*query)
+            emissions_kg = emc.get_co2_emissions(response)
+        except Exception as err:
+            return np.nan, str(err)
+
+        # apply the radiative forcing index to air freight
+        if transportation_mode == 'Air':
+            emissions_kg = run_parameters.RFI*emissions_kg
+
+        return emissions_kg, None
+
+    async def calculate_leg_emissions(self, legs_df, parameter_dict):
+        """
+        Calculates the emissions of all legs concurrently
+        :param legs_df: DataFrame with one row per leg, see BatchEmissionsEngine.calculate_leg_emissions
+        :param parameter_dict: the parameter dict used for all legs
+        :return: copy of legs_df in the same order with the columns 'Emissions [kg]' and 'Error'
+        """
+
+        results = await asyncio.gather(*[self.calculate_single_leg(leg, parameter_dict)
+                                         for leg in legs_df.to_dict('records')])
+
+        results_df = legs_df.copy()
+        results_df['Emissions [kg]'] = [emissions for emissions, error in results]
+        results_df['Error'] = [error for emissions, error in results]
+
+        return results_df
+
+    async def calculate_shipment_transportation_emissions(self):
+        """
+        Calculates the transportation emissions for the new shipment of the wrapped EmissionsCalculator
+        """
+
+        emc = self.emissions_calculator
+        legs_df = await self.calculate_leg_emissions(emc.get_shipment_legs(), emc.transport_dict['new shipment'])
+
+        # sum up the emissions per transportation mode
+        airfreight_emissions = emc.sum_emissions(legs_df.loc[legs_df['Transportation Mode']=='Air', 'Emissions [kg]'])
+        road_freight_emissions = emc.sum_emissions(legs_df.loc[legs_df['Transportation Mode']=='Road', 'Emissions [kg]'])
+
+        return airfreight_emissions, road_freight_emissions
+
+    async def calculate_repositioning_emissions(self):
+        """
+        Calculate the emissions from repositioning/provisioning for the new shipment of the wrapped EmissionsCalculator
+        """
+
+        emc = self.emissions_calculator
+        df_repositioning, number_of_outgoing_shipments = emc.get_repositioning_legs()
+        legs_df = await self.calculate_leg_emissions(df_repositioning, emc.transport_dict['repositioning'])
+
+        # keep the sea route distances computed in this run
+        emc.maritime_distance_index.save()
+
+        # attribute the repositioning emissions per outgoing container to the new shipment
+        return emc.sum_emissions(legs_df['Emissions [kg]'])/number_of_outgoing_shipments*\
+               emc.transport_dict['new shipment']['shipment parameters']['Number of containers shipped']
@@ -0,0 +1,75 @@
+# import packages
+import asyncio
+import base64
+
+from objects.NTM_Authentifier import Expiration
+from objects.Instrumentation import Instrumentation
+
+
+class AsyncAuth:
+    """
+    Class object getting the authorization token for coroutines sharing one HTTP session. Coroutines waiting for an
+    expired token share a single renewal instead of each logging in.
+    """
+
+    def __init__(self, settings, post_with_retries, server_url=None, instrumentation=None):
+        """
+        :param settings: the NTM authentification settings
+        :param post_with_retries: coroutine function sending a POST request of a service with retries, returning status
+        and json
+        :param server_url: the url of the authorization server, by default https:// and the authServer of the settings
+        :param instrumentation: the Instrumentation counting the token requests, a new one by default
+        """
+        self.settings = settings
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        self.server_url = server_url if server_url is not None else f"https://{self.settings['authServer']}"
+        self.post_with_retries = post_with_retries
+        self.auth_response = None
+        self.access_token_expiration = Expiration()
+        self.refresh_token_expiration = Expiration()
+        self.basic_authorization = base64.b64encode(
+            f"{self.settings['clientId']}:{self.settings['clientSecret']}".encode()).decode()
+        self.lock = asyncio.Lock()
+
+    async def get_access_token(self):
+
+        # the existing access token is still valid
+        if not self.access_token_expiration.has_expired():
+            self.instrumentation.increment('token_requests', grant='existing token')
+            return self.auth_response['access_token']
+
+        # only one coroutine renews the token, the others wait and use the renewed token
+        async with self.lock:
+            if not self.access_token_expiration.has_expired():
+                return self.auth_response['access_token']
+
+            # use the credentials at the initial acquire or when the refresh token has expired, otherwise the refresh token
+            if self.refresh_token_expiration.has_expired():
+                parameters = {
+                    'grant_type': 'password',
+                    'username': self.settings['userName'],
+                    'password': self.settings['passWord']
+                }
+            else:
+                parameters = {
+                    'grant_type': 'refresh_token',
+                    'refresh_token': self.auth_response['refresh_token']
+                }
+
+            # Send a POST request to the token end point with the prepared parameters and authorization header
+            self.instrumentation.increment('token_requests', grant=parameters['grant_type'])
+            with self.instrumentation.timer('external_call_seconds', service='ntm token'):
+                status, response = await self.post_with_retries(
+                    f"{self.server_url}{self.settings['tokenEndPointPath']}",
+                    service='ntm token',
+                    data=parameters,
+                    headers={'Authorization': f"Basic {self.basic_authorization}",
+                             'Content-Type': 'application/x-www-form-urlencoded'})
+            if status != 200:
+                self.instrumentation.increment('failures', service='ntm token')
+                raise Exception(f"NTM authentication failed with status {status}")
+
+            self.auth_response = response
+            self.access_token_expiration.set_expiration_time(self.auth_response['expires_in'])
+            self.refresh_token_expiration.set_expiration_time(self.auth_response['refresh_expires_in'])
+            return self.auth_response['access_token']
@@ -0,0 +1,162 @@
+# import packages
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import numpy as np
+import logging
+
+from parameters import run_parameters
+from objects.Leg import Leg
+from objects.DistanceProvider import great_circle_distance_km
+
+logger = logging.getLogger(__name__)
+
+# columns added to the legs, in the order of the results of calculate_single_leg
+RESULT_COLUMNS = ['Emissions [kg]', 'Error', 'Calculation distance [km]', 'Distance source', 'Payload hash']
+
+
+class BatchEmissionsEngine:
+    """
+    Class object calculating the emissions of many transportation legs concurrently
+    """
+
+    def __init__(self, emissions_calculator, max_workers=None):
+        self.emissions_calculator = emissions_calculator
+        self.max_workers = max_workers if max_workers is not None else run_parameters.NTM_max_concurrent_requests
+
+        # calculation method for each supported transportation mode
+        self.calculation_methods = {'Road': emissions_calculator.calculate_road_freight_emissions,
+                                    'Air': emissions_calculator.calculate_air_freight_emissions,
+                                    'Maritime': emissions_calculator.calculate_maritime_freight_emissions}
+
+    def calculate_leg_emissions(self, legs_df, parameter_dict):
+        """
+        Calculates the emissions of all legs with a bounded number of requests in flight
+        :param legs_df: DataFrame with one row per leg and the columns 'Transportation Mode', 'Origin Latitude',
+        'Origin Longitude', 'Destination Latitude', 'Destination Longitude', 'Shipment Weight [kg]',
+        'Shipment Volume [m3]' and optionally 'Distance [km]'
+        :param parameter_dict: the parameter dict used for all legs
+        :return: copy of legs_df in the same order with the columns 'Calculation distance [km]', 'Distance source',
+        'Payload hash', 'Emissions [kg]', 'Error' and 'Result source'
+        """
+
+        legs = Leg.from_dataframe(legs_df)
+
+        # compute the distances before the emission calls
+        pending_positions = self.resolve_distances(legs_df, legs)
+
+        # the NTM queries of each transportation mode are only filled with the weight, volume and distance of a leg
+        query_templates = {transportation_mode: self.emissions_calculator.get_query_template(transportation_mode,
+                                                                                             parameter_dict)
+                           for transportation_mode in set(legs_df['Transportation Mode'])
+                           if transportation_mode in self.calculation_methods}
+
+        # run the legs concurrently, the legs waiting for their sea route distance last
+        is_pending = np.zeros(len(legs), dtype=bool)
+        is_pending[pending_positions] = True
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {position: executor.submit(self.calculate_single_leg, legs[position], parameter_dict,
+                                                 query_templates)
+                       for position in np.argsort(is_pending, kind='stable')}
+            results = [futures[position].result() for position in range(len(legs))]
+
+        # add the results to the legs
+        results_df = legs_df.copy()
+        for position, column in enumerate(RESULT_COLUMNS):
+            results_df[column] = [result[position] for result in results]
+        results_df['Result source'] = 'NTM'
+
+        # count the legs and failures per transportation mode
+        instrumentation = self.emissions_calculator.instrumentation
+        for transportation_mode, number_of_legs in results_df['Transportation Mode'].value_counts().items():
+            instrumentation.increment('legs', int(number_of_legs), mode=transportation_mode)
+
+        # report the failed legs in one line, the error of each leg is in the Error column
+        failed_legs = results_df[results_df['Error'].notna()]
+        failed_legs_per_mode = failed_legs['Transportation Mode'].value_counts()
+        for transportation_mode, number_of_legs in failed_legs_per_mode.items():
+            instrumentation.increment('failed_legs', int(number_of_legs), mode=transportation_mode)
+        if len(failed_legs) > 0:
+            logger.warning(f"{len(failed_legs)} of {len(results_df)} legs failed ("
+                           + ', '.join(f"{number_of_legs} {mode}" for mode, number_of_legs in failed_legs_per_mode.items())
+                           + "), most frequent errors: "
+                           + '; '.join(f"{error} ({number_of_legs} legs)"
+                                       for error, number_of_legs in failed_legs['Error'].value_counts().head(3).items()))
+
+        return results_df
+
+    def resolve_distances(self, legs_df, legs):
+        """
+        Sets the great circle distance of all air legs without distance in one pass and starts computing the unknown sea
+        route distances of the maritime legs in the worker processes of the maritime distance index
+        :param legs_df: DataFrame with one row per leg
+        :param legs: list with the Leg of each row
+        :return: the positions of the maritime legs without distance, their distance is looked up when calculated
+        """
+
+        has_distance = np.array([leg.distance_km is not None for leg in legs], dtype=bool)
+        transportation_modes = legs_df['Transportation Mode'].to_numpy()
+
+        # the haversine distance of all air legs at once
+        air_positions = np.flatnonzero((transportation_modes == 'Air') & ~has_distance)
+        if len(air_positions) > 0:
+            distances = np.around(great_circle_distance_km(legs_df.iloc[air_positions]) + run_parameters.DETOUR_KM, 2)
+            for position, distance_km in zip(air_positions, distances.tolist()):
+                legs[position].distance_km = distance_km
+                legs[position].distance_source = 'great circle'
+
+        # the sea route distances are computed while the other legs are sent to NTM
+        maritime_positions = np.flatnonzero((transportation_modes == 'Maritime') & ~has_distance)
+        if len(maritime_positions) > 0:
+            self.emissions_calculator.maritime_distance_index.submit(
+                [(legs[position].origin_latlong, legs[position].destination_latlong) for position in maritime_positions])
+
+        return maritime_positions
+
+    def get_distance_source(self, transportation_mode):
+        """
+        :return: the source of the distances looked up for legs of a transportation mode without distance
+        """
+        if transportation_mode == 'Road':
+            return self.emissions_calculator.road_distance_provider.name
+        return {'Air': 'great circle', 'Maritime': 'searoute'}[transportation_mode]
+
+    def calculate_single_leg(self, leg, parameter_dict, query_templates=None):
+        """
+        Calculates the emissions of a single leg, legs of the run with the same NTM query share one calculation
+        :param leg: the Leg
+        :param parameter_dict: the parameter dict used for the leg
+        :param query_templates: dict with the QueryTemplate of the parameter dict per transportation mode
+        :return: tuple of the emissions (NaN if failed), the error message (None if successful), the distance, the
+        source of the distance and the hash of the NTM query, see RESULT_COLUMNS
+        """
+
+        emc = self.emissions_calculator
+        if leg.transportation_mode not in self.calculation_methods:
+            return np.nan, f"Unsupported transportation mode {leg.transportation_mode}", leg.distance_km, \
+                   leg.distance_source, None
+
+        payload_hash = None
+        try:
+            # legs on the same lane share the distance lookup
+            if leg.distance_km is None:
+                leg.distance_km = emc.get_distance(leg.transportation_mode, leg.origin_latlong, leg.destination_latlong)
+                leg.distance_source = self.get_distance_source(leg.transportation_mode)
+
+            # the hash of the NTM query identifies the query in the NTM cache and in audits
+            query_template = query_templates.get(leg.transportation_mode) if query_templates is not None else None
+            if query_template is None:
+                query_template = emc.get_query_template(leg.transportation_mode, parameter_dict)
+            payload_hash = emc.make_transport_activity_key(*query_template.create_query(
+                leg.shipment_weight_kg, leg.shipment_volume_m3, leg.distance_km))
+
+            # legs with the same NTM query share the calculation of the first one, whatever else their shipments differ
+            # in. The emissions of air freight legs also include the radiative forcing index.
+            emissions_kg = emc.coalescer.call(
+                'legs', (payload_hash, run_parameters.RFI if leg.transportation_mode == 'Air' else None),
+                self.calculation_methods[leg.transportation_mode],
+                leg.shipment_weight_kg, leg.shipment_volume_m3, leg.origin_latlong, leg.destination_latlong,
+                parameter_dict, distance_km=leg.distance_km, query_template=query_template)
+        except Exception as err:
+            return np.nan, str(err), leg.distance_km, leg.distance_source, payload_hash
+
+        return emissions_kg, None, leg.distance_km, leg.distance_source, payload_hash
@@ -0,0 +1,315 @@
+# import packages
+from concurrent.futures import ThreadPoolExecutor
+from haversine import haversine
+import numpy as np
+import threading
+import time
+
+from parameters import run_parameters
+from objects.Instrumentation import Instrumentation
+
+# limits of the Google Maps distance matrix API per request
+MAX_MATRIX_ORIGINS = 25
+MAX_MATRIX_DESTINATIONS = 25
+MAX_MATRIX_ELEMENTS = 100
+
+# number of the last planned requests a block of distances may be added to
+MATRIX_PACKING_WINDOW = 10
+
+
+class GoogleMapsDistanceProvider:
+    """
+    Class object getting road distances from the Google Maps distance matrix API
+    """
+    name = 'google'
+
+    def __init__(self, key, base_url=None, instrumentation=None, rate_limiter=None, min_utilization=None,
+                 max_workers=None):
+        """
+        :param key: the Google Maps API key
+        :param base_url: the base url of the Google Maps API, by default the live API
+        :param instrumentation: the Instrumentation timing the distance matrix requests
+        :param rate_limiter: the RateLimiter of the distance matrix API
+        :param min_utilization: the minimum share of needed elements of a request, see
+        run_parameters.distance_matrix_min_utilization
+        :param max_workers: the number of distance matrix requests in flight at the same time
+        """
+        self.key = key
+        self.base_url = base_url
+        self.min_utilization = min_utilization if min_utilization is not None else \
+            run_parameters.distance_matrix_min_utilization
+        self.max_workers = max_workers if max_workers is not None else \
+            run_parameters.rate_limits['google distance matrix']['max_concurrency']
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        self.rate_limiter = rate_limiter
+
+        # the client is created on first use, runs with all distances known never import googlemaps
+        self.client = None
+        self.lock = threading.Lock()
+
+    @property
+    def gmaps(self):
+        """
+        :return: the Google Maps client, created on first use
+        """
+        with self.lock:
+            if self.client is None:
+                import googlemaps
+                if self.base_url is None:
+                    self.client = googlemaps.Client(key=self.key)
+                else:
+                    # the local stand-in is not throttled by the client, like the rate limiters do not limit it
+                    self.client = googlemaps.Client(key=self.key, base_url=self.base_url, queries_per_second=10000,
+                                                    queries_per_minute=None)
+            return self.client
+
+    def get_distance(self, origin_latlong, destination_latlong):
+        """
+        Queries the driving distance between two points
+        :param origin_latlong: the origin as lat long pair
+        :param destination_latlong: the destination as lat long pair
+        :return: the distance in km
+        """
+
+        # query distance via google maps API
+        results = self.query_distance_matrix(origin_latlong, destination_latlong)
+
+        # get the distance in km
+        return results['rows'][0]['elements'][0]['distance']['value'] / 1000
+
+    def query_distance_matrix(self, origins, destinations):
+        """
+        Sends a distance matrix request within the quota of the distance matrix API
+        :param origins: an origin or list of origins as lat long pairs
+        :param destinations: a destination or list of destinations as lat long pairs
+        :return: the json response
+        """
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+        self.instrumentation.increment('external_calls', service='google distance matrix')
+        start_time = time.perf_counter()
+        try:
+            with self.instrumentation.timer('external_call_seconds', service='google distance matrix'):
+                results = self.gmaps.distance_matrix(origins, destinations,
+                                                     mode='driving',
+                                                     departure_time='now',
+                                                     traffic_model='best_guess')
+        except Exception as err:
+            # the client raises once its own retries of rate limits and server errors are exhausted
+            if self.rate_limiter is not None:
+                self.rate_limiter.release(429 if 'OVER_QUERY_LIMIT' in str(err) else None,
+                                          time.perf_counter() - start_time)
+            raise
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.release(200, time.perf_counter() - start_time)
+
+        return results
+
+    def get_distances(self, pairs):
+        """
+        Queries the driving distances of many origin destination pairs in few distance matrix requests. Google bills
+        every element of a request, so the requests are built from blocks of origins that need the same destinations
+        and only combined while most of their elements are needed.
+        :param pairs: list of (origin_latlong, destination_latlong) tuples
+        :return: list with the distance in km of each pair, None if Google found no route
+        """
+
+        # query distance matrix via google maps API, several requests at once
+        requests = self.create_requests(pairs)
+        with ThreadPoolExecutor(max_workers=max(self.max_workers, 1)) as executor:
+            responses = list(executor.map(lambda request: self.query_distance_matrix(*request), requests))
+
+        distances = dict()
+        for (chunk_origins, chunk_destinations), results in zip(requests, responses):
+            for origin, row in zip(chunk_origins, results['rows']):
+                for destination, element in zip(chunk_destinations, row['elements']):
+                    if element['status'] == 'OK':
+                        distances[(origin, destination)] = element['distance']['value'] / 1000
+                    else:
+                        self.instrumentation.increment('failures', service='google distance matrix')
+
+        return [distances.get((tuple(origin_latlong), tuple(destination_latlong))) for origin_latlong, destination_latlong in pairs]
+
+    def create_requests(self, pairs):
+        """
+        Plans the distance matrix requests of many origin destination pairs within the limits of the API
+        :param pairs: list of (origin_latlong, destination_latlong) tuples
+        :return: list with the origins and destinations of each request
+        """
+
+        # the needed destinations of each origin and origins of each destination
+        destinations_by_origin = dict()
+        origins_by_destination = dict()
+        for origin_latlong, destination_latlong in pairs:
+            destinations_by_origin.setdefault(tuple(origin_latlong), set()).add(tuple(destination_latlong))
+            origins_by_destination.setdefault(tuple(destination_latlong), set()).add(tuple(origin_latlong))
+
+        # the origins needing the same destinations form a block of which every element is needed, the blocks are
+        # built on the side giving fewer blocks
+        origin_blocks = dict()
+        for origin, destination_set in destinations_by_origin.items():
+            origin_blocks.setdefault(frozenset(destination_set), []).append(origin)
+        destination_blocks = dict()
+        for destination, origin_set in origins_by_destination.items():
+            destination_blocks.setdefault(frozenset(origin_set), []).append(destination)
+        if len(origin_blocks) <= len(destination_blocks):
+            blocks = [(origins, sorted(destination_set)) for destination_set, origins in origin_blocks.items()]
+        else:
+            blocks = [(sorted(origin_set), destinations) for origin_set, destinations in destination_blocks.items()]
+
+        # split the blocks into tiles within the limits of a request
+        tiles = []
+        for origins, destinations in blocks:
+            destination_chunk_size = min(len(destinations), MAX_MATRIX_DESTINATIONS, MAX_MATRIX_ELEMENTS)
+            origin_chunk_size = min(MAX_MATRIX_ORIGINS, MAX_MATRIX_ELEMENTS // destination_chunk_size)
+            for origin_start in range(0, len(origins), origin_chunk_size):
+                for destination_start in range(0, len(destinations), destination_chunk_size):
+                    tiles.append((origins[origin_start:origin_start + origin_chunk_size],
+                                  destinations[destination_start:destination_start + destination_chunk_size]))
+
+        # combine the tiles into one of the last requests as long as it stays within the limits and the share of
+        # needed elements does not drop below min_utilization
+        requests = []
+        for tile_origins, tile_destinations in sorted(tiles, key=lambda tile: -len(tile[0])*len(tile[1])):
+            for request in requests[-MATRIX_PACKING_WINDOW:]:
+                origins = request['origins'] | set(tile_origins)
+                destinations = request['destinations'] | set(tile_destinations)
+                number_of_needed_elements = request['needed elements'] + len(tile_origins)*len(tile_destinations)
+                if len(origins) <= MAX_MATRIX_ORIGINS and len(destinations) <= MAX_MATRIX_DESTINATIONS and \
+                        len(origins)*len(destinations) <= MAX_MATRIX_ELEMENTS and \
+                        number_of_needed_elements >= self.min_utilization*len(origins)*len(destinations):
+                    request.update({'origins': origins, 'destinations': destinations,
+                                    'needed elements': number_of_needed_elements})
+                    break
+            else:
+                requests.append({'origins': set(tile_origins), 'destinations': set(tile_destinations),
+                                 'needed elements': len(tile_origins)*len(tile_destinations)})
+
+        return [(sorted(request['origins']), sorted(request['destinations'])) for request in requests]
+
+
+class HaversineDistanceProvider:
+    """
+    Class object estimating road distances offline from the great-circle distance and a road circuity factor
+    """
+    name = 'haversine'
+
+    def __init__(self, circuity_factor):
+        self.circuity_factor = circuity_factor
+
+    def get_distance(self, origin_latlong, destination_latlong):
+        """
+        Estimates the road distance between two points
+        :param origin_latlong: the origin as lat long pair
+        :param destination_latlong: the destination as lat long pair
+        :return: the distance in km
+        """
+        return haversine(origin_latlong, destination_latlong) * self.circuity_factor
+
+    def get_distances(self, pairs):
+        """
+        Estimates the road distances of many origin destination pairs
+        :param pairs: list of (origin_latlong, destination_latlong) tuples
+        :return: list with the distance in km of each pair
+        """
+        return [self.get_distance(origin_latlong, destination_latlong) for origin_latlong, destination_latlong in pairs]
+
+
+class CachedDistanceProvider:
+    """
+    Class object answering distance queries from a persistent cache and only asking the wrapped provider on a miss
+    """
+
+    def __init__(self, provider, cache, precision, instrumentation=None):
+        """
+        :param provider: the distance provider queried on a cache miss
+        :param cache: the ResultCache holding the distances
+        :param precision: the number of decimals the coordinates are rounded to before the lookup
+        :param instrumentation: the Instrumentation counting the cache lookups
+        """
+        self.provider = provider
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        self.cache = cache
+        self.precision = precision
+        self.name = provider.name
+
+    def get_distance(self, origin_latlong, destination_latlong):
+        """
+        Looks up the distance between two points
+        :param origin_latlong: the origin as lat long pair
+        :param destination_latlong: the destination as lat long pair
+        :return: the distance in km
+        """
+
+        # the cache key is made of the provider and the rounded coordinates
+        cache_key = make_distance_key(self.provider.name, origin_latlong, destination_latlong, self.precision)
+
+        distance_km = self.cache.get(cache_key)
+        self.instrumentation.increment('cache_lookups', cache='distance', result='hit' if distance_km is not None else 'miss')
+        if distance_km is None:
+            start_time = time.perf_counter()
+            distance_km = self.provider.get_distance(origin_latlong, destination_latlong)
+            self.cache.set(cache_key, distance_km, latency_seconds=time.perf_counter() - start_time)
+
+        return distance_km
+
+    def get_distances(self, pairs):
+        """
+        Looks up the distances of many origin destination pairs and queries all misses at once
+        :param pairs: list of (origin_latlong, destination_latlong) tuples
+        :return: list with the distance in km of each pair, None if the provider found no route
+        """
+
+        cache_keys = [make_distance_key(self.provider.name, origin_latlong, destination_latlong, self.precision)
+                      for origin_latlong, destination_latlong in pairs]
+        distances = [self.cache.get(cache_key) for cache_key in cache_keys]
+
+        # query the missing distances in one go
+        missing_positions = [position for position, distance_km in enumerate(distances) if distance_km is None]
+        self.instrumentation.increment('cache_lookups', len(distances) - len(missing_positions), cache='distance', result='hit')
+        self.instrumentation.increment('cache_lookups', len(missing_positions), cache='distance', result='miss')
+        if len(missing_positions) > 0:
+            start_time = time.perf_counter()
+            missing_distances = self.provider.get_distances([pairs[position] for position in missing_positions])
+            latency_seconds = (time.perf_counter() - start_time) / len(missing_positions)
+
+            for position, distance_km in zip(missing_positions, missing_distances):
+                distances[position] = distance_km
+                if distance_km is not None:
+                    self.cache.set(cache_keys[position], distance_km, latency_seconds=latency_seconds)
+
+        return distances
+
+
+def make_distance_key(provider_name, origin_latlong, destination_latlong, precision):
+    """
+    Creates the cache key of a distance query
+    :param provider_name: the name of the distance provider
+    :param origin_latlong: the origin as lat long pair
+    :param destination_latlong: the destination as lat long pair
+    :param precision: the number of decimals the coordinates are rounded to
+    :return: the cache key
+    """
+    return (f"{provider_name}:{round(float(origin_latlong[0]), precision)},{round(float(origin_latlong[1]), precision)}:"
+            f"{round(float(destination_latlong[0]), precision)},{round(float(destination_latlong[1]), precision)}")
+
+
+def great_circle_distance_km(legs_df):
+    """
+    Calculates the haversine distance of all legs at once
+    :param legs_df: DataFrame with the origin and destination coordinates of the legs
+    :return: array with the distance of each leg in km
+    """
+    origin_latitude = np.radians(legs_df['Origin Latitude'].to_numpy(dtype=float))
+    origin_longitude = np.radians(legs_df['Origin Longitude'].to_numpy(dtype=float))
+    destination_latitude = np.radians(legs_df['Destination Latitude'].to_numpy(dtype=float))
+    destination_longitude = np.radians(legs_df['Destination Longitude'].to_numpy(dtype=float))
+
+    a = np.sin((destination_latitude - origin_latitude) / 2) ** 2 + np.cos(origin_latitude) * \
+        np.cos(destination_latitude) * np.sin((destination_longitude - origin_longitude) / 2) ** 2
+
+    # mean earth radius in km as used by the haversine package
+    return 2 * 6371.0088 * np.arcsin(np.sqrt(a))
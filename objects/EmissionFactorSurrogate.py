@@ -0,0 +1,200 @@
+# import packages
+import numpy as np
+import pandas as pd
+import json
+import os
+
+from parameters import run_parameters
+from objects.DistanceProvider import great_circle_distance_km
+
+# distances in km at which the emission factors are sampled for each transportation mode
+CALIBRATION_DISTANCES_KM = {'Road': [1, 10, 50, 100, 250, 500, 1000, 2000],
+                            'Air': [100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 10000, 12000, 15000],
+                            'Maritime': [100, 500, 1000, 2500, 5000, 10000, 15000, 20000, 25000]}
+
+# shipment weights in kg sampled at each distance
+CALIBRATION_WEIGHTS_KG = [100, 1000, 10000]
+
+# number of random legs per configuration used to measure the error against live NTM values
+NUMBER_OF_VALIDATION_LEGS = 20
+
+
+class EmissionFactorSurrogate:
+    """
+    Class object estimating NTM emissions offline from emission factor tables calibrated against NTM. For a fixed
+    vehicle, aircraft or ship configuration NTM is close to linear in the tonne-kilometres, so each configuration
+    stores the emissions per tonne-kilometre at a grid of distances which are interpolated for each leg.
+    """
+
+    def __init__(self, tables=None, emissions_calculator=None):
+        """
+        :param tables: dict with the emission factor table of each configuration, keyed by the configuration key
+        :param emissions_calculator: the EmissionsCalculator used to look up the distance of road and maritime legs
+        without distance, otherwise these legs fail
+        """
+        self.tables = tables if tables is not None else dict()
+        self.emissions_calculator = emissions_calculator
+
+    @staticmethod
+    def get_configuration_key(transportation_mode, parameter_dict):
+        """
+        :return: the key of the NTM parameters of a transportation mode
+        """
+        return transportation_mode + ':' + json.dumps(parameter_dict['NTM parameters'][transportation_mode],
+                                                      sort_keys=True, default=str)
+
+    @staticmethod
+    def get_tonne_kilometres(transportation_mode, weight_kg, volume_m3, distance_km, parameter_dict):
+        """
+        Calculates the tonne-kilometres the emission factors refer to, for air freight based on the chargeable weight
+        :return: array with the tonne-kilometres of each leg
+        """
+        weight_kg = np.asarray(weight_kg, dtype=float)
+        if transportation_mode == 'Air':
+            volumetric_weight_kg = np.asarray(volume_m3, dtype=float) * \
+                                   float(parameter_dict['NTM parameters']['Air']['commercial_volumetric_factor'])
+            weight_kg = np.maximum(weight_kg, volumetric_weight_kg)
+        return weight_kg / 1000 * np.asarray(distance_km, dtype=float)
+
+    @classmethod
+    def load(cls, path, emissions_calculator=None):
+        """
+        Loads the emission factor tables from a json file
+        """
+        with open(path) as file:
+            return cls(json.load(file), emissions_calculator)
+
+    def save(self, path):
+        """
+        Writes the emission factor tables to a json file
+        """
+        if os.path.dirname(path) != '':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(self.tables, file, indent=2)
+
+    def calibrate(self, emissions_calculator, parameter_dict, transportation_modes=('Road', 'Air', 'Maritime')):
+        """
+        Samples NTM for the configuration of each transportation mode, fits the emission factor tables and measures
+        their error against live NTM values on random legs
+        :param emissions_calculator: the EmissionsCalculator used to query NTM
+        :param parameter_dict: the parameter dict with the NTM parameters to calibrate
+        :param transportation_modes: the transportation modes to calibrate
+        :return: dict with the maximum relative error of each calibrated configuration
+        """
+
+        random = np.random.default_rng(0)
+        errors = dict()
+        for transportation_mode in transportation_modes:
+            configuration_key = self.get_configuration_key(transportation_mode, parameter_dict)
+            distances_km = CALIBRATION_DISTANCES_KM[transportation_mode]
+
+            # sample each distance with several weights, the volume stays below the chargeable weight
+            samples_df = pd.DataFrame([(distance_km, weight_kg) for distance_km in distances_km
+                                       for weight_kg in CALIBRATION_WEIGHTS_KG],
+                                      columns=['Distance [km]', 'Shipment Weight [kg]'])
+            samples_df['Shipment Volume [m3]'] = samples_df['Shipment Weight [kg]'] / 1000
+            samples_df = self.calculate_live_emissions(emissions_calculator, samples_df, transportation_mode,
+                                                       parameter_dict)
+
+            # emission factor per tonne-kilometre at each distance, excluding the radiative forcing index of air freight.
+            # The factor is fitted over the sum of the weights, so the rounding of small samples does not distort it.
+            radiative_forcing_index = run_parameters.RFI if transportation_mode == 'Air' else 1
+            samples_df['Tonne-kilometres'] = self.get_tonne_kilometres(
+                transportation_mode, samples_df['Shipment Weight [kg]'], samples_df['Shipment Volume [m3]'],
+                samples_df['Distance [km]'], parameter_dict)
+            sums_df = samples_df.groupby('Distance [km]')[['Emissions [kg]', 'Tonne-kilometres']].sum()
+            emission_factors = sums_df['Emissions [kg]'] / radiative_forcing_index / sums_df['Tonne-kilometres']
+
+            self.tables[configuration_key] = {'Transportation Mode': transportation_mode,
+                                              'Distances [km]': list(emission_factors.index.astype(float)),
+                                              'Emission factors [kg/tkm]': list(emission_factors.values.astype(float))}
+
+            # compare the tables to live NTM values of random legs, both including the radiative forcing index
+            validation_df = pd.DataFrame({
+                'Distance [km]': np.around(random.uniform(distances_km[0], distances_km[-1], NUMBER_OF_VALIDATION_LEGS), 2),
+                'Shipment Weight [kg]': np.around(random.uniform(50, 20000, NUMBER_OF_VALIDATION_LEGS), 2),
+                'Shipment Volume [m3]': np.around(random.uniform(0.1, 50, NUMBER_OF_VALIDATION_LEGS), 2)})
+            validation_df = self.calculate_live_emissions(emissions_calculator, validation_df, transportation_mode,
+                                                          parameter_dict)
+            estimated_emissions = self.calculate_leg_emissions(validation_df.drop(columns=['Emissions [kg]', 'Error']),
+                                                               parameter_dict)['Emissions [kg]']
+            relative_errors = np.abs(estimated_emissions - validation_df['Emissions [kg]']) / validation_df['Emissions [kg]']
+
+            self.tables[configuration_key]['Max relative error'] = float(relative_errors.max())
+            self.tables[configuration_key]['Mean relative error'] = float(relative_errors.mean())
+            errors[configuration_key] = float(relative_errors.max())
+
+        return errors
+
+    @staticmethod
+    def calculate_live_emissions(emissions_calculator, samples_df, transportation_mode, parameter_dict):
+        """
+        Calculates the emissions of sampled legs with NTM, bypassing the engines wrapped around the live engine
+        :return: the successfully calculated samples with the column 'Emissions [kg]' as calculated by the engine
+        """
+
+        # the coordinates are not used since the distance is given
+        samples_df = samples_df.assign(**{'Transportation Mode': transportation_mode, 'Origin Latitude': 0,
+                                          'Origin Longitude': 0, 'Destination Latitude': 0, 'Destination Longitude': 0})
+        # the samples are compared to live values, not to stored results or the lane index
+        samples_df = emissions_calculator.live_engine.calculate_leg_emissions(samples_df, parameter_dict)
+        samples_df = samples_df[samples_df['Error'].isna()]
+
+        return samples_df.reset_index(drop=True)
+
+    def calculate_leg_emissions(self, legs_df, parameter_dict):
+        """
+        Estimates the emissions of all legs from the emission factor tables. Same interface as
+        BatchEmissionsEngine.calculate_leg_emissions, the legs need a distance except air freight legs.
+        :param legs_df: DataFrame with one row per leg
+        :param parameter_dict: the parameter dict used for all legs
+        :return: copy of legs_df in the same order with the columns 'Emissions [kg]', 'Error' and 'Result source'
+        """
+
+        # work on positions since the index of the legs may contain duplicates
+        transportation_modes = legs_df['Transportation Mode'].to_numpy()
+        emissions = np.full(len(legs_df), np.nan)
+        errors = np.full(len(legs_df), None, dtype=object)
+        distances = legs_df['Distance [km]'].to_numpy(dtype=float) if 'Distance [km]' in legs_df.columns else \
+            np.full(len(legs_df), np.nan)
+
+        for transportation_mode in pd.unique(transportation_modes):
+            positions = np.flatnonzero(transportation_modes == transportation_mode)
+            mode_df = legs_df.iloc[positions]
+
+            configuration_key = self.get_configuration_key(transportation_mode, parameter_dict) \
+                if transportation_mode in CALIBRATION_DISTANCES_KM else None
+            if configuration_key not in self.tables:
+                errors[positions] = f"No emission factor table for {transportation_mode} with these parameters"
+                continue
+
+            distance_km = distances[positions]
+            if transportation_mode == 'Air':
+                distance_km = np.where(np.isnan(distance_km), great_circle_distance_km(mode_df) + run_parameters.DETOUR_KM,
+                                       distance_km)
+            elif self.emissions_calculator is not None and np.isnan(distance_km).any():
+                for position in np.flatnonzero(np.isnan(distance_km)):
+                    leg = mode_df.iloc[position]
+                    distance_km[position] = self.emissions_calculator.get_distance(
+                        transportation_mode, (leg['Origin Latitude'], leg['Origin Longitude']),
+                        (leg['Destination Latitude'], leg['Destination Longitude']))
+
+            # interpolate the emission factors at the distance of each leg
+            table = self.tables[configuration_key]
+            emission_factors = np.interp(distance_km, table['Distances [km]'], table['Emission factors [kg/tkm]'])
+            emissions_kg = emission_factors * self.get_tonne_kilometres(
+                transportation_mode, mode_df['Shipment Weight [kg]'], mode_df['Shipment Volume [m3]'], distance_km,
+                parameter_dict)
+            if transportation_mode == 'Air':
+                emissions_kg = run_parameters.RFI * emissions_kg
+
+            emissions[positions] = np.around(emissions_kg, 2)
+            errors[positions[np.isnan(distance_km)]] = "Missing distance"
+
+        results_df = legs_df.copy()
+        results_df['Emissions [kg]'] = emissions
+        results_df['Error'] = errors
+        results_df['Result source'] = 'emission factor tables'
+
+        return results_df
@@ -1,24 +1,289 @@
 # import packages
 from haversine import haversine
-import searoute as sr
+from urllib.parse import urlparse
 import pandas as pd
+import logging
 import numpy as np
-import googlemaps
-import requests
-import copy
+import threading
+import time
+import os
 
 from parameters import run_parameters
 from objects.NTM_Authentifier import Auth
+from objects.Instrumentation import Instrumentation
+from objects.RetryPolicy import post_with_retries
+from objects.RateLimiter import create_rate_limiters
+from objects.BatchEmissionsEngine import BatchEmissionsEngine
+from objects.IncrementalEmissionsEngine import IncrementalEmissionsEngine
+from objects.LaneEmissionIndex import LaneEmissionIndex
+from objects.ResultCache import ResultCache
+from objects.RequestCoalescer import RequestCoalescer
+from objects.QueryTemplate import QueryTemplate
+from objects.MaritimeDistanceIndex import MaritimeDistanceIndex
+from objects.WorkbookLoader import WorkbookLoader
+from objects.ProvisioningStream import StreamingRepositioningCalculator
+from objects.DistanceProvider import GoogleMapsDistanceProvider, HaversineDistanceProvider, CachedDistanceProvider, \
+    make_distance_key
 from parameters.authenfitication_parameters import NTM_authentification_settings, API_KEY
 
+logger = logging.getLogger(__name__)
+
 class EmissionsCalculator:
     """
     Class object calculating the emissions from transportation and repositioning/provisioning
     """
 
-    def __init__(self):
-        self.auth = Auth(NTM_authentification_settings)
-        self.gmaps = googlemaps.Client(key=API_KEY)
+    def __init__(self, road_distance_provider=None):
+        """
+        :param road_distance_provider: 'google' or 'haversine' to override run_parameters.road_distance_provider for this run
+        """
+        # call counts, latency histograms and failures of the run
+        self.instrumentation = Instrumentation()
+
+        # client-side quotas of the NTM API, the NTM token endpoint and the Google Maps distance matrix
+        self.rate_limiters = create_rate_limiters(self.instrumentation)
+
+        if run_parameters.offline_server_url is None:
+            self.auth = Auth(NTM_authentification_settings, instrumentation=self.instrumentation,
+                             rate_limiter=self.rate_limiters.get('ntm token'))
+            self.transport_activities_url = run_parameters.NTM_transport_activities_url
+
+        # send all requests to the local stand-in of the services, which does not check the credentials
+        else:
+            self.auth = Auth(NTM_authentification_settings, run_parameters.offline_server_url, self.instrumentation,
+                             self.rate_limiters.get('ntm token'))
+            self.transport_activities_url = run_parameters.offline_server_url + \
+                                            urlparse(run_parameters.NTM_transport_activities_url).path
+
+        # provider of road distances for legs without a distance
+        self.road_distance_provider = self.create_road_distance_provider(
+            road_distance_provider if road_distance_provider is not None else run_parameters.road_distance_provider)
+
+        # road distances in km resolved in bulk, keyed by the rounded origin and destination
+        self.road_distances = dict()
+
+        # identical legs and distance lookups of a run share one calculation
+        self.coalescer = RequestCoalescer(self.instrumentation)
+
+        # NTM queries with the parameters of each transportation mode and configuration serialized once
+        self.query_templates = dict()
+        self.query_templates_lock = threading.Lock()
+
+        # input sheets of the workbook, read once on first use
+        self.workbook_loader = WorkbookLoader(run_parameters.path_to_workbook,
+                                              sidecar_folder=run_parameters.workbook_sidecar_folder,
+                                              sidecar_format=run_parameters.workbook_sidecar_format)
+        self.workbook = None
+
+        # repositioning emissions of all container types and service centers, calculated on demand
+        self.repositioning_table = None
+
+        # memoized sea route distances between ports, loaded from disk on first use
+        self.maritime_distance_index = MaritimeDistanceIndex(run_parameters.maritime_distance_index_path,
+                                                             run_parameters.maritime_distance_index_precision,
+                                                             self.instrumentation)
+
+        # shared session so that NTM requests reuse open connections, created on the first NTM request
+        self.http_session = None
+        self.session_lock = threading.Lock()
+
+        # engine running many legs concurrently against the NTM API, live_engine always queries NTM (or its cache)
+        self.live_engine = BatchEmissionsEngine(self)
+        self.batch_engine = self.live_engine
+
+        # only calculate the legs that are new or changed since an earlier run
+        if run_parameters.use_incremental_recomputation:
+            leg_results = ResultCache(self.get_cache_path(run_parameters.leg_results_path),
+                                      ttl_seconds=run_parameters.leg_results_ttl_seconds,
+                                      max_entries=run_parameters.leg_results_max_entries)
+            self.batch_engine = IncrementalEmissionsEngine(self.batch_engine, leg_results)
+
+        # answer the legs on the lanes of the service-center network from the index built with main.py --build-lane-index
+        if run_parameters.use_lane_emission_index:
+            self.batch_engine = LaneEmissionIndex(self.batch_engine, run_parameters.lane_emission_index_path,
+                                                  emissions_calculator=self)
+
+        # LegOutputWriter receiving the result of every calculated leg, None to not write the legs
+        self.leg_output = None
+
+        # on-disk cache of NTM results so that identical queries are not sent again in later runs
+        self.ntm_cache = None
+        if run_parameters.use_NTM_cache:
+            self.ntm_cache = ResultCache(self.get_cache_path(run_parameters.NTM_cache_path),
+                                         ttl_seconds=run_parameters.NTM_cache_ttl_seconds,
+                                         max_entries=run_parameters.NTM_cache_max_entries)
+
+
+    @property
+    def session(self):
+        """
+        :return: the HTTP session shared by all NTM requests, created on first use so that runs answered from the
+        caches do not import requests
+        """
+
+        with self.session_lock:
+            if self.http_session is None:
+                import requests
+                self.http_session = requests.Session()
+                self.http_session.mount('https://', requests.adapters.HTTPAdapter(
+                    pool_maxsize=run_parameters.NTM_max_concurrent_requests))
+                self.http_session.mount('http://', requests.adapters.HTTPAdapter(
+                    pool_maxsize=run_parameters.NTM_max_concurrent_requests))
+            return self.http_session
+
+
+    def get_sheet(self, sheet_name):
+        """
+        Returns an input sheet of the workbook, reading all input sheets in one pass on first use
+        :param sheet_name: the name of the sheet
+        :return: the DataFrame of the sheet
+        """
+
+        if self.workbook is None:
+            self.workbook = self.workbook_loader.load()
+
+        return self.workbook[sheet_name]
+
+
+    @staticmethod
+    def get_cache_path(path):
+        """
+        Gets the path of a cache of NTM results or distances. The stand-in answers with synthetic values under the same
+        keys as the live services, so runs against it use a separate file next to the cache of the live services
+        :param path: the path of the cache in run_parameters.py
+        :return: the path of the cache used by this run
+        """
+
+        if run_parameters.offline_server_url is None:
+            return path
+        root, extension = os.path.splitext(path)
+        return f"{root}_offline{extension}"
+
+
+    def create_road_distance_provider(self, provider_name):
+        """
+        Creates the provider of road distances, wrapped in the persistent distance cache if enabled
+        :param provider_name: 'google' for the Google Maps distance matrix or 'haversine' for the offline estimate
+        :return: the distance provider
+        """
+
+        if provider_name == 'google' and run_parameters.offline_server_url is None:
+            provider = GoogleMapsDistanceProvider(API_KEY, instrumentation=self.instrumentation,
+                                                  rate_limiter=self.rate_limiters.get('google distance matrix'))
+        elif provider_name == 'google':
+            # the local stand-in does not check the key, but the client expects a Google Maps key
+            provider = GoogleMapsDistanceProvider('AIza-offline', run_parameters.offline_server_url,
+                                                  self.instrumentation, self.rate_limiters.get('google distance matrix'))
+        elif provider_name == 'haversine':
+            provider = HaversineDistanceProvider(run_parameters.road_circuity_factor)
+        else:
+            raise Exception("Please select a valid road distance provider")
+
+        if run_parameters.use_distance_cache:
+            provider = CachedDistanceProvider(provider,
+                                              ResultCache(self.get_cache_path(run_parameters.distance_cache_path),
+                                                          ttl_seconds=run_parameters.distance_cache_ttl_seconds),
+                                              run_parameters.distance_cache_precision,
+                                              self.instrumentation)
+
+        return provider
+
+
+    @staticmethod
+    def make_transport_activity_key(calculation_object_id, API_parameters):
+        """
+        Creates the canonical hash of a transport activity query - the order of the parameters does not matter to NTM
+        :param calculation_object_id: the id of the NTM calculation object
+        :param API_parameters: the list of parameters of the calculation object
+        :return: the hex digest of the query
+        """
+        return ResultCache.make_key({"calculationObject": {"id": calculation_object_id, "version": "1"},
+                                     "parameters": sorted(API_parameters, key=lambda parameter: parameter['id'])})
+
+
+    def post_transport_activity(self, calculation_object_id, API_parameters):
+        """
+        Sends a transport activity query to the NTM API
+        :param calculation_object_id: the id of the NTM calculation object (e.g. the vehicle or aircraft type)
+        :param API_parameters: the list of parameters of the calculation object
+        :return: the json response of the NTM API
+        """
+
+        calculation_object = {"id": calculation_object_id,
+                              "version": "1"}
+
+        # look up the query in the cache
+        if self.ntm_cache is not None:
+            cache_key = self.make_transport_activity_key(calculation_object_id, API_parameters)
+            response = self.ntm_cache.get(cache_key)
+            self.instrumentation.increment('cache_lookups', cache='ntm', result='hit' if response is not None else 'miss')
+            if response is not None:
+                return response
+
+        start_time = time.perf_counter()
+
+        # Get the access token needed for authentication and authorization in the web service
+        access_token = self.auth.get_access_token()
+
+        # run the query
+        self.instrumentation.increment('external_calls', service='ntm')
+        with self.instrumentation.timer('external_call_seconds', service='ntm'):
+            res = post_with_retries(self.session.post, self.transport_activities_url,
+                                    instrumentation=self.instrumentation, service='ntm',
+                                    rate_limiter=self.rate_limiters.get('ntm'),
+                                    headers={'Content-Type': 'application/json',
+                                             'Authorization': 'Bearer ' + access_token},
+                                    json={"calculationObject": calculation_object,
+                                          "parameters": API_parameters})
+
+            # get the json response
+            response = res.json()
+
+        if 'resultTable' not in response:
+            self.instrumentation.increment('failures', service='ntm')
+
+        # only store successful calculations in the cache
+        if self.ntm_cache is not None and 'resultTable' in response:
+            self.ntm_cache.set(cache_key, response, latency_seconds=time.perf_counter() - start_time)
+
+        return response
+
+
+    def calculate_workbook_emissions(self, provisioning_path=None):
+        """
+        Calculates the emissions of the new shipment in the workbook, timing each stage
+        :param provisioning_path: csv or parquet provisioning history streamed instead of the provisioning sheet
+        :return: dict with the road freight, air freight and repositioning/provisioning emissions in kg
+        """
+
+        # create dictionary with all parameters as well as transportation routes
+        with self.instrumentation.timer('stage_seconds', stage='create_transportation_dict'):
+            self.create_transportation_dict()
+
+        # resolve the distances of all road legs in bulk
+        with self.instrumentation.timer('stage_seconds', stage='prefetch_road_distances'):
+            self.prefetch_road_distances()
+
+        # start computing the sea route distances between all ports, many distances are computed in worker processes
+        # while the transportation emissions are calculated
+        with self.instrumentation.timer('stage_seconds', stage='build_maritime_distance_index'):
+            self.build_maritime_distance_index(wait_for_distances=False)
+
+        # Calculate transportation emissions
+        with self.instrumentation.timer('stage_seconds', stage='calculate_shipment_transportation_emissions'):
+            airfreight_emissions_kg, road_freight_emissions_kg = self.calculate_shipment_transportation_emissions()
+
+        # Calculate repositioning emissions
+        with self.instrumentation.timer('stage_seconds', stage='calculate_repositioning_emissions'):
+            if provisioning_path is None:
+                repositioning_emissions_kg = self.calculate_repositioning_emissions()
+            else:
+                repositioning_emissions_kg = StreamingRepositioningCalculator(self).calculate_repositioning_emissions(
+                    provisioning_path)
+
+        return {'Variable road freight emissions': np.around(road_freight_emissions_kg, 2),
+                'Variable air freight emissions': np.around(airfreight_emissions_kg, 2),
+                'Repositioning/Provisioning emissions': np.around(repositioning_emissions_kg, 2)}
 
 
     def calculate_shipment_transportation_emissions(self):
@@ -26,304 +291,525 @@ class EmissionsCalculator:
         Calculates the transportation emissions for the new shipment
         """
 
+        # Calculate the emissions for all legs at once
+        legs_df = self.batch_engine.calculate_leg_emissions(self.get_shipment_legs(), self.transport_dict['new shipment'])
+        self.write_leg_results(legs_df, 'transportation')
+
+        # sum up the emissions per transportation mode
+        airfreight_emissions = self.sum_emissions(legs_df.loc[legs_df['Transportation Mode']=='Air', 'Emissions [kg]'])
+        road_freight_emissions = self.sum_emissions(legs_df.loc[legs_df['Transportation Mode']=='Road', 'Emissions [kg]'])
+
+        return airfreight_emissions, road_freight_emissions
+
+
+    def get_shipment_legs(self):
+        """
+        Gets the legs of the new shipment with the road distances resolved
+        :return: DataFrame with one row per leg
+        """
+
         # get the transportation data
-        transportation_df = pd.read_excel(run_parameters.path_to_workbook, sheet_name='Script input transpo data')
+        transportation_df = self.get_sheet('Script input transpo data')
 
-        airfreight_emissions = 0
-        road_freight_emissions = 0
+        # only road and air legs are part of the shipment itinerary
+        transportation_df = transportation_df[transportation_df['Transportation Mode'].isin(['Road', 'Air'])]
 
-        # Calculate the emissions for each leg
-        for index, row in transportation_df.iterrows():
+        # resolve the missing road distances in bulk
+        return self.resolve_road_distances(transportation_df)
 
-            # retrieve the shipment data
-            shipment_weight_kg = row['Shipment Weight [kg]']
-            shipment_volume_m3 = row['Shipment Volume [m3]']
 
-            # get the origin and destination points
-            origin_latlong = (row['Origin Latitude'], row['Origin Longitude'])
-            dest_latlong = (row['Destination Latitude'], row['Destination Longitude'])
 
-            # calculate road freight emissions
-            if row['Transportation Mode']=='Road':
-                road_freight_emissions+=self.calculate_road_freight_emissions(shipment_weight_kg, shipment_volume_m3,
-                                                                 origin_latlong, dest_latlong, self.transport_dict['new shipment'])
+    def prefetch_road_distances(self):
+        """
+        Resolves the missing distances of all road legs of the transportation and provisioning sheets in bulk
+        """
 
-            # calculate airfreight emissions
-            elif row['Transportation Mode']=='Air':
-                airfreight_emissions+=self.calculate_air_freight_emissions(shipment_weight_kg, shipment_volume_m3,
-                                                               origin_latlong, dest_latlong, self.transport_dict['new shipment'])
+        # get the transportation and provisioning data
+        transportation_df = self.get_sheet('Script input transpo data')
+        provisioning_df = self.get_sheet('Script input provisioning data')
 
+        # only use the distance of provisioning legs if available
+        provisioning_df = provisioning_df.assign(**{'Distance [km]': provisioning_df['Distance [km] (if available)'].where(
+            provisioning_df['Distance [km] (if available)']>0)})
 
-        return airfreight_emissions, road_freight_emissions
+        self.resolve_road_distances(pd.concat([transportation_df, provisioning_df]))
+
+
+    def build_maritime_distance_index(self, wait_for_distances=True):
+        """
+        Computes the sea route distances of the maritime legs in the workbook without distance and saves the index
+        :param wait_for_distances: if False, return while the distances are computed in worker processes
+        """
+
+        # get the transportation and provisioning data
+        transportation_df = self.get_sheet('Script input transpo data')
+        provisioning_df = self.get_sheet('Script input provisioning data')
+
+        # only the maritime legs without distance need a sea route
+        legs_df = pd.concat([transportation_df, provisioning_df])
+        legs_df = legs_df[legs_df['Transportation Mode']=='Maritime']
+        if 'Distance [km] (if available)' in legs_df.columns:
+            legs_df = legs_df[~(legs_df['Distance [km] (if available)']>0)]
+
+        # index the distances of the distinct port pairs of the legs, the index shares the two directions of a pair
+        pairs = set(zip(zip(legs_df['Origin Latitude'], legs_df['Origin Longitude']),
+                        zip(legs_df['Destination Latitude'], legs_df['Destination Longitude'])))
+        self.maritime_distance_index.build(list(pairs), wait_for_distances)
+
+
+    def resolve_road_distances(self, legs_df):
+        """
+        Adds the distance of all road legs without distance, querying all unknown origin destination pairs at once
+        :param legs_df: DataFrame with one row per leg and optionally the column 'Distance [km]'
+        :return: copy of legs_df with the column 'Distance [km]' filled for the road legs and the column
+        'Distance source' with 'input' or the name of the road distance provider
+        """
+
+        legs_df = legs_df.copy()
+        if 'Distance [km]' not in legs_df.columns:
+            legs_df['Distance [km]'] = np.nan
+        if 'Distance source' not in legs_df.columns:
+            legs_df['Distance source'] = np.where(legs_df['Distance [km]'].notna(), 'input', None)
+
+        # road legs without distance
+        is_missing = (legs_df['Transportation Mode']=='Road') & legs_df['Distance [km]'].isna()
+        if not is_missing.any():
+            return legs_df
+
+        pairs = [((row['Origin Latitude'], row['Origin Longitude']), (row['Destination Latitude'], row['Destination Longitude']))
+                 for row in legs_df.loc[is_missing].to_dict('records')]
+        keys = [make_distance_key('road', origin_latlong, destination_latlong, run_parameters.distance_cache_precision)
+                for origin_latlong, destination_latlong in pairs]
+
+        # query the pairs that are not resolved yet, each pair only once
+        unresolved_pairs = dict()
+        for key, pair in zip(keys, pairs):
+            if key not in self.road_distances:
+                unresolved_pairs[key] = pair
+        if len(unresolved_pairs) > 0:
+            distances = self.road_distance_provider.get_distances(list(unresolved_pairs.values()))
+            for key, distance_km in zip(unresolved_pairs, distances):
+                if distance_km is None:
+                    continue
+
+                # if distance is 0, set to value close to 0 to avoid crash in emissions transportation calculation
+                distance_km = np.around(distance_km, 2)
+                if distance_km==0:
+                    distance_km=0.01
+                self.road_distances[key] = distance_km
+
+        # legs without route keep no distance and are queried individually
+        legs_df.loc[is_missing, 'Distance [km]'] = [self.road_distances.get(key, np.nan) for key in keys]
+        legs_df.loc[is_missing, 'Distance source'] = [self.road_distance_provider.name if key in self.road_distances
+                                                      else None for key in keys]
+
+        return legs_df
+
+
+    def get_distance(self, transportation_mode, origin_latlong, destination_latlong):
+        """
+        Gets the distance of a leg without known distance - legs on the same road or sea lane share one lookup, also if
+        their weights differ
+        :param transportation_mode: 'Road', 'Air' or 'Maritime'
+        :param origin_latlong: the origin as lat long pair
+        :param destination_latlong: the destination as lat long pair
+        :return: the distance in km
+        """
+
+        # the air distance is calculated directly
+        if transportation_mode=='Air':
+            return self.lookup_distance(transportation_mode, origin_latlong, destination_latlong)
 
+        lane = (transportation_mode, tuple(origin_latlong), tuple(destination_latlong))
+        return self.coalescer.call('distances', lane, self.lookup_distance, transportation_mode, origin_latlong,
+                                   destination_latlong)
+
+
+    def lookup_distance(self, transportation_mode, origin_latlong, destination_latlong):
+        """
+        Looks up the distance of a leg without known distance
+        :param transportation_mode: 'Road', 'Air' or 'Maritime'
+        :param origin_latlong: the origin as lat long pair
+        :param destination_latlong: the destination as lat long pair
+        :return: the distance in km
+        """
+
+        if transportation_mode=='Air':
+            # set haversine distance
+            return np.around(haversine(origin_latlong, destination_latlong) + run_parameters.DETOUR_KM, 2)
+
+        elif transportation_mode=='Road':
+            # get the distance in km from the road distance provider
+            distance_km = np.around(self.road_distance_provider.get_distance(origin_latlong, destination_latlong), 2)
+
+            # if distance is 0, set to value close to 0 to avoid crash in emissions transportation calculation
+            if distance_km==0:
+                distance_km=0.01
+
+            return distance_km
+
+        # get the sea route distance from the maritime distance index
+        return self.maritime_distance_index.get_distance(origin_latlong, destination_latlong)
+
+
+    def write_leg_results(self, legs_df, stage):
+        """
+        Writes the calculated legs to the leg output if set
+        :param legs_df: DataFrame with one row per calculated leg
+        :param stage: the stage that calculated the legs, e.g. 'transportation' or 'repositioning'
+        """
+        if self.leg_output is not None:
+            self.leg_output.write(legs_df, stage)
+
+
+    @staticmethod
+    def sum_emissions(emissions):
+        """
+        Sums up the emissions of legs - failed legs are not counted as zero, the total is NaN unless partial totals
+        are allowed
+        :param emissions: Series with the emissions of each leg, NaN for failed legs
+        :return: the total emissions
+        """
+        if emissions.isna().any() and not run_parameters.allow_partial_totals:
+            return np.nan
+        return emissions.sum()
+
+
+    @staticmethod
+    def get_co2_emissions(response):
+        """
+        :param response: the json response of the NTM API
+        :return: the total CO2 emissions in kg
+        """
+        try:
+            return np.around(response['resultTable']['totals'][response['resultTable']['index']['co2_total']]['value'], 2)
+        except (KeyError, IndexError, TypeError):
+            raise Exception(f"NTM returned no result: {response}")
 
 
     def calculate_air_freight_emissions(self,shipment_weight_kg, shipment_volume_m3, origin_latlong, destination_latlong,
-                                        parameter_dict, distance_km=None):
+                                        parameter_dict, distance_km=None, query_template=None):
         """
         Calculates the emissions from air freight transportation
         :param shipment_weight_kg: the weight of the shipment
         :param shipment_volume_m3: the volume of the shipment
         :param origin_latlong: the origin_latlong as lat long pair
         :param destination_latlong: the destination as lat long pair
+        :param query_template: the air freight QueryTemplate of the parameter dict, looked up if not given
         :return: the emissions
         """
 
         if distance_km==None:
-            # set haversine distance
-            distance_km = np.around(haversine(origin_latlong, destination_latlong) +
-                                    run_parameters.DETOUR_KM, 2)
+            distance_km = self.get_distance('Air', origin_latlong, destination_latlong)
+
+        if query_template is None:
+            query_template = self.get_query_template('Air', parameter_dict)
 
         try:
-            # get the access token
-            access_token = self.auth.get_access_token()
-
-            # set default aircraft type
-            aircraft_type = "freight_aircraft"
-
-            API_parameters = [
-                                        {
-                                            "id": "calculation_model",
-                                            "value": "shipment_transport_volumetric_weight"
-                                        },
-                                        {
-                                            "id": "aircraft_type",
-                                            "value": str(parameter_dict['NTM parameters']['Air']['aircraft_type_ID'])
-                                        },
-                                        {
-                                            "id": "shipment_volume",
-                                            "value": str(np.around(shipment_volume_m3,2)),
-                                            "unit": "m3"
-                                        },
-                                        {
-                                            "id": "shipment_weight",
-                                            "value": str(np.around(shipment_weight_kg,2)),
-                                            "unit": "kg"
-                                        },
-                                        {
-                                            "id": "distance",
-                                            "value": str(np.around(distance_km,2)),
-                                            "unit": "km"
-                                        },
-                                        {
-                                            "id": "volumetric_cargo_load_factor",
-                                            "value": str(parameter_dict['NTM parameters']['Air']['volumetric_cargo_load_factor']),
-                                            "unit": "%weight"
-                                        },
-                                        {
-                                            "id": "cargo_load_factor_weight",
-                                            "value": str(parameter_dict['NTM parameters']['Air']['cargo_load_factor_weight']),
-                                            "unit": "%weight"
-                                        },
-                                        {
-                                            "id": "commercial_volumetric_factor",
-                                            "value": str(parameter_dict['NTM parameters']['Air']['commercial_volumetric_factor']),
-                                            "unit": "kg/m3"
-                                        }]
-
-            # add passenger load factor parameter if needed:
-            if parameter_dict['NTM parameters']['Air']['aircraft type'] =='Belly freight - cargo':
-                API_parameters.append({"id": "passenger_load_factor",
-                                   "value": str(parameter_dict['NTM parameters']['Air']['passenger_load_factor'])})
-
-                aircraft_type = "belly_freighter_cargo"
-
-            # run the request
-            res = requests.post('https://api.transportmeasures.org/v1/transportactivities',
-                                headers={'Content-Type': 'application/json',
-                                         'Authorization': 'Bearer ' + access_token},
-                                json={
-                                    "calculationObject":
-                                        {
-                                            "id": aircraft_type,
-                                            "version": "1"
-                                        },
-                                    "parameters": API_parameters})
-
-            # run the query and get the response
-            response = res.json()
+            # run the query and get the CO2 emissions
+            response = self.post_transport_activity(*query_template.create_query(shipment_weight_kg, shipment_volume_m3,
+                                                                                 distance_km))
+            co2_emissions_kg = run_parameters.RFI*self.get_co2_emissions(response)
 
         except Exception as err:
-            print(err)
-            return False
-
-        # return the CO2 emissions
-        co2_emissions_kg = run_parameters.RFI*np.around(response['resultTable']['totals'][response['resultTable']['index']['co2_total']]['value'], 2)
+            # the engine reports the leg as failed with this error
+            logger.warning(f"Air freight emissions could not be calculated: {err}")
+            raise
 
         return co2_emissions_kg
 
+    def create_air_freight_query(self, shipment_weight_kg, shipment_volume_m3, distance_km, parameter_dict):
+        """
+        Creates the NTM query of an air freight leg
+        :param shipment_weight_kg: the weight of the shipment
+        :param shipment_volume_m3: the volume of the shipment
+        :param distance_km: the distance of the leg
+        :return: the id of the calculation object and the list of API parameters
+        """
+        return self.get_query_template('Air', parameter_dict).create_query(shipment_weight_kg, shipment_volume_m3,
+                                                                           distance_km)
+
+    def create_air_freight_query_template(self, parameter_dict):
+        """
+        Creates the NTM query of the air freight legs of a parameter dict, without weight, volume and distance
+        :return: the QueryTemplate
+        """
+
+        # set default aircraft type
+        aircraft_type = "freight_aircraft"
+
+        API_parameters = [
+                                    {
+                                        "id": "calculation_model",
+                                        "value": "shipment_transport_volumetric_weight"
+                                    },
+                                    {
+                                        "id": "aircraft_type",
+                                        "value": str(parameter_dict['NTM parameters']['Air']['aircraft_type_ID'])
+                                    },
+                                    {
+                                        "id": "shipment_volume",
+                                        "value": None,
+                                        "unit": "m3"
+                                    },
+                                    {
+                                        "id": "shipment_weight",
+                                        "value": None,
+                                        "unit": "kg"
+                                    },
+                                    {
+                                        "id": "distance",
+                                        "value": None,
+                                        "unit": "km"
+                                    },
+                                    {
+                                        "id": "volumetric_cargo_load_factor",
+                                        "value": str(parameter_dict['NTM parameters']['Air']['volumetric_cargo_load_factor']),
+                                        "unit": "%weight"
+                                    },
+                                    {
+                                        "id": "cargo_load_factor_weight",
+                                        "value": str(parameter_dict['NTM parameters']['Air']['cargo_load_factor_weight']),
+                                        "unit": "%weight"
+                                    },
+                                    {
+                                        "id": "commercial_volumetric_factor",
+                                        "value": str(parameter_dict['NTM parameters']['Air']['commercial_volumetric_factor']),
+                                        "unit": "kg/m3"
+                                    }]
+
+        # add passenger load factor parameter if needed:
+        if parameter_dict['NTM parameters']['Air']['aircraft type'] =='Belly freight - cargo':
+            API_parameters.append({"id": "passenger_load_factor",
+                               "value": str(parameter_dict['NTM parameters']['Air']['passenger_load_factor'])})
+
+            aircraft_type = "belly_freighter_cargo"
+
+        return QueryTemplate('Air', aircraft_type, API_parameters)
+
     def calculate_road_freight_emissions(self,shipment_weight_kg, shipment_volume_m3, origin_latlong, destination_latlong,
-                                         parameter_dict, distance_km=None):
+                                         parameter_dict, distance_km=None, query_template=None):
         """
         Calculates the emissions from road freight transportation
         :param shipment_weight_kg: the weight of the shipment
         :param shipment_volume_m3: the volume of the shipment
         :param origin_latlong: the origin_latlong as lat long pair
         :param destination: the destination as lat long pair
+        :param query_template: the road freight QueryTemplate of the parameter dict, looked up if not given
         :return: the emissions
         """
 
         if distance_km==None:
+            distance_km = self.get_distance('Road', origin_latlong, destination_latlong)
 
-            # query distance via google maps API
-            results = self.gmaps.distance_matrix(origin_latlong, destination_latlong,
-                                                 mode='driving',
-                                                 departure_time='now',
-                                                 traffic_model='best_guess')
-
-            # get the distance in km
-            distance_km = np.around(results['rows'][0]['elements'][0]['distance']['value'] / 1000, 2)
-
-            # if distance is 0, set to value close to 0 to avoid crash in emissions transportation calculation
-            if distance_km==0:
-                distance_km=0.01
-
-        # get the weight in tons
-        shipment_weight_ton = shipment_weight_kg / 1000
-
-        # get the tonne-kilometres
-        shipment_tkms = np.around(distance_km * shipment_weight_ton, 2)
+        if query_template is None:
+            query_template = self.get_query_template('Road', parameter_dict)
 
         try:
-            # Get the access token needed for authentication and authorization in the web service
-            access_token = self.auth.get_access_token()
-
-            # run the query
-            res = requests.post('https://api.transportmeasures.org/v1/transportactivities',
-                                headers={'Content-Type': 'application/json',
-                                         'Authorization': 'Bearer ' + access_token},
-                                json={"calculationObject":
-                                          {"id": "rigid_truck_7_5_t",
-                                           "version": "1"},
-                                      "parameters": [
-                                          {
-                                              "id": "calculation_model",
-                                              "value": "shipment_transport_tonne_kilometres"
-                                          },
-                                          {
-                                              "id": "fuel",
-                                              "value": str(parameter_dict['NTM parameters']['Road']['fuel'])
-                                          },
-                                          {
-                                              "id": "road_type",
-                                              "value": str(parameter_dict['NTM parameters']['Road']['road_type'])
-                                          },
-                                          {
-                                              "id": "euro_class",
-                                              "value": str(parameter_dict['NTM parameters']['Road']['euro_class'])
-                                          },
-                                          {
-                                              "id": "transport_effort",
-                                              "value": str(shipment_tkms),
-                                              "unit": "tkm"
-                                              },
-                                          {
-                                              "id": "cargo_carrier_capacity_weight",
-                                              "value": str(parameter_dict['NTM parameters']['Road']['cargo_carrier_capacity_weight']),
-                                              "unit": "tonne"
-                                              }
-                                          ]})
-
-            # get the json response
-            response = res.json()
+            # run the query and get the emissions
+            response = self.post_transport_activity(*query_template.create_query(shipment_weight_kg, shipment_volume_m3,
+                                                                                 distance_km))
+            emissions_kg = self.get_co2_emissions(response)
 
         except Exception as err:
-            print(err)
-            return False
-
-        # get the emissions
-        emissions_kg = np.around(response['resultTable']['totals'][response['resultTable']['index']['co2_total']]['value'], 2)
+            # the engine reports the leg as failed with this error
+            logger.warning(f"Road freight emissions could not be calculated: {err}")
+            raise
 
         return emissions_kg
 
+    def create_road_freight_query(self, shipment_weight_kg, distance_km, parameter_dict):
+        """
+        Creates the NTM query of a road freight leg
+        :param shipment_weight_kg: the weight of the shipment
+        :param distance_km: the distance of the leg
+        :return: the id of the calculation object and the list of API parameters
+        """
+        return self.get_query_template('Road', parameter_dict).create_query(shipment_weight_kg, None, distance_km)
+
+    def create_road_freight_query_template(self, parameter_dict):
+        """
+        Creates the NTM query of the road freight legs of a parameter dict, without the tonne-kilometres
+        :return: the QueryTemplate
+        """
+
+        return QueryTemplate('Road', "rigid_truck_7_5_t", [
+                                      {
+                                          "id": "calculation_model",
+                                          "value": "shipment_transport_tonne_kilometres"
+                                      },
+                                      {
+                                          "id": "fuel",
+                                          "value": str(parameter_dict['NTM parameters']['Road']['fuel'])
+                                      },
+                                      {
+                                          "id": "road_type",
+                                          "value": str(parameter_dict['NTM parameters']['Road']['road_type'])
+                                      },
+                                      {
+                                          "id": "euro_class",
+                                          "value": str(parameter_dict['NTM parameters']['Road']['euro_class'])
+                                      },
+                                      {
+                                          "id": "transport_effort",
+                                          "value": None,
+                                          "unit": "tkm"
+                                          },
+                                      {
+                                          "id": "cargo_carrier_capacity_weight",
+                                          "value": str(parameter_dict['NTM parameters']['Road']['cargo_carrier_capacity_weight']),
+                                          "unit": "tonne"
+                                          }
+                                      ])
+
 
     def calculate_maritime_freight_emissions(self, shipment_weight_kg, shipment_volume_m3,
                                              origin_latlong, destination_latlong,
-                                             parameter_dict, distance_km=None):
+                                             parameter_dict, distance_km=None, query_template=None):
         """
         Calculates the emissions from road freight transportation
         :param shipment_weight_kg: the weight of the shipment
         :param shipment_volume_m3: the volume of the shipment
         :param origin_latlong: the origin_latlong as lat long pair
         :param destination: the destination as lat long pair
+        :param query_template: the maritime freight QueryTemplate of the parameter dict, looked up if not given
         :return: the emissions
         """
 
         if distance_km==None:
-            origin_longlat = origin_latlong[::-1]
-            destination_longlat = destination_latlong[::-1]
-
-            origin_longlat = list(origin_longlat)
-            destination_longlat = list(destination_longlat)
+            distance_km = self.get_distance('Maritime', origin_latlong, destination_latlong)
 
-            distance_km = sr.searoute(origin_longlat, destination_longlat, units="km")['properties']['length']
+        if query_template is None:
+            query_template = self.get_query_template('Maritime', parameter_dict)
 
         try:
-            # Get the access token needed for authentication and authorization in the web service
-            access_token = self.auth.get_access_token()
-
-            # get the weight in tons
-            shipment_weight_ton = shipment_weight_kg / 1000
-
-            # run the query
-            res = requests.post('https://api.transportmeasures.org/v1/transportactivities',
-                                headers={'Content-Type': 'application/json',
-                                         'Authorization': 'Bearer ' + access_token},
-                                json={"calculationObject":
-                                    {"id": "container_ship",
-                                    "version": "1"},
-                                      "parameters": [
-                                          {
-                                          "id": "calculation_model",
-                                          "value": "shipment_transport_weight"
-                                          },
-                                          {
-                                              "id": "type_of_waters",
-                                              "value": parameter_dict['NTM parameters']['Maritime']['type_of_waters']
-                                          },
-                                          {
-                                              "id": "ship_size",
-                                              "value": parameter_dict['NTM parameters']['Maritime']['ship_size'],
-                                              "unit": "dwt"
-                                          },
-                                          {
-                                              "id": "shipment_weight",
-                                              "value": str(shipment_weight_ton),
-                                              "unit": "tonne"
-                                          },
-                                          {
-                                              "id": "distance",
-                                              "value": str(distance_km),
-                                              "unit": "km"
-                                          },
-                                          {
-                                              "id": "cargo_load_factor_weight",
-                                              "value": parameter_dict['NTM parameters']['Maritime']['cargo_load_factor_weight'],
-                                              "unit": "%weight"
-                                          }
-                                      ]})
-            # get the json response
-            response = res.json()
+            # run the query and get the emissions
+            response = self.post_transport_activity(*query_template.create_query(shipment_weight_kg, shipment_volume_m3,
+                                                                                 distance_km))
+            emissions_kg = self.get_co2_emissions(response)
 
         except Exception as err:
-            print(err)
-            return False
-
-        # get the emissions
-        emissions_kg = np.around(response['resultTable']['totals'][response['resultTable']['index']['co2_total']]['value'], 2)
+            # the engine reports the leg as failed with this error
+            logger.warning(f"Maritime freight emissions could not be calculated: {err}")
+            raise
 
         return emissions_kg
 
+    def create_maritime_freight_query(self, shipment_weight_kg, distance_km, parameter_dict):
+        """
+        Creates the NTM query of a maritime freight leg
+        :param shipment_weight_kg: the weight of the shipment
+        :param distance_km: the distance of the leg
+        :return: the id of the calculation object and the list of API parameters
+        """
+        return self.get_query_template('Maritime', parameter_dict).create_query(shipment_weight_kg, None, distance_km)
+
+    def create_maritime_freight_query_template(self, parameter_dict):
+        """
+        Creates the NTM query of the maritime freight legs of a parameter dict, without weight and distance
+        :return: the QueryTemplate
+        """
+
+        return QueryTemplate('Maritime', "container_ship", [
+                                      {
+                                      "id": "calculation_model",
+                                      "value": "shipment_transport_weight"
+                                      },
+                                      {
+                                          "id": "type_of_waters",
+                                          "value": parameter_dict['NTM parameters']['Maritime']['type_of_waters']
+                                      },
+                                      {
+                                          "id": "ship_size",
+                                          "value": parameter_dict['NTM parameters']['Maritime']['ship_size'],
+                                          "unit": "dwt"
+                                      },
+                                      {
+                                          "id": "shipment_weight",
+                                          "value": None,
+                                          "unit": "tonne"
+                                      },
+                                      {
+                                          "id": "distance",
+                                          "value": None,
+                                          "unit": "km"
+                                      },
+                                      {
+                                          "id": "cargo_load_factor_weight",
+                                          "value": parameter_dict['NTM parameters']['Maritime']['cargo_load_factor_weight'],
+                                          "unit": "%weight"
+                                      }
+                                  ])
+
+    def get_query_template(self, transportation_mode, parameter_dict):
+        """
+        Returns the NTM query template of a transportation mode, created once per configuration of NTM parameters
+        :param transportation_mode: 'Road', 'Air' or 'Maritime'
+        :param parameter_dict: the parameter dict used for the leg
+        :return: the QueryTemplate
+        """
+
+        configuration_key = QueryTemplate.get_configuration_key(transportation_mode, parameter_dict)
+        query_template = self.query_templates.get(configuration_key)
+        if query_template is None:
+            query_template = {'Air': self.create_air_freight_query_template,
+                              'Road': self.create_road_freight_query_template,
+                              'Maritime': self.create_maritime_freight_query_template}[transportation_mode](parameter_dict)
+            with self.query_templates_lock:
+                query_template = self.query_templates.setdefault(configuration_key, query_template)
+
+        return query_template
+
 
 
-    def calculate_repositioning_emissions(self):
+    def calculate_repositioning_emissions(self, vectorized=False):
         """
         Calculate the emissions from repositioning/provisioning
+        :param vectorized: if True, look up the emissions in the repositioning table of all container types and service
+        centers instead of calculating only the legs of the new shipment
         :return: the emissions created by repositioning/provisioning and attributed to the new shipment
         """
 
-        # read in the csv
-        df = pd.read_excel(run_parameters.path_to_workbook, sheet_name='Script input provisioning data')
+        if vectorized:
+            if self.repositioning_table is None:
+                self.calculate_repositioning_table()
+
+            return self.lookup_repositioning_emissions(
+                self.transport_dict['new shipment']['shipment parameters']['Container Type'],
+                self.transport_dict['new shipment']['shipment parameters']['Origin Service Center'],
+                self.transport_dict['new shipment']['shipment parameters']['Number of containers shipped'])
+
+        # get the repositioning legs attributable to the new shipment
+        df_repositioning, number_of_outgoing_shipments = self.get_repositioning_legs()
+
+        # calculate the emissions from repositioning shipments
+        legs_df = self.batch_engine.calculate_leg_emissions(df_repositioning, self.transport_dict['repositioning'])
+        self.write_leg_results(legs_df, 'repositioning')
+        repositioning_emissions = self.sum_emissions(legs_df['Emissions [kg]'])
+
+        # keep the sea route distances computed in this run
+        self.maritime_distance_index.save()
+
+
+        # compute repositioning emissions per container shipment
+        repositioning_emissions_per_outgoing_container = repositioning_emissions/number_of_outgoing_shipments
+
+        # total attributable repositioning emissions for the new shipment
+        repositioning_emissions_for_new_shipment = repositioning_emissions_per_outgoing_container*\
+                                                   self.transport_dict['new shipment']['shipment parameters']['Number of containers shipped']
+
+        return repositioning_emissions_for_new_shipment
+
+
+
+    def get_repositioning_legs(self):
+        """
+        Gets the provisioning legs to the origin service center of the new shipment with the road distances resolved
+        :return: DataFrame with one row per leg and the total number of outgoing shipments of the service center
+        """
+
+        # get the provisioning data
+        df = self.get_sheet('Script input provisioning data')
 
         # only take the subset of repositioning data that matches the container type
         df = df[df['Container Type'] == self.transport_dict['new shipment']['shipment parameters']['Container Type']]
@@ -343,50 +829,119 @@ class EmissionsCalculator:
         outer_volume_per_container = self.transport_dict['new shipment']['shipment parameters']['Shipment Volume [m3]']/\
                                      self.transport_dict['new shipment']['shipment parameters']['Number of containers shipped']
 
-        # calculate the emissions from repositioning shipments
-        repositioning_emissions=0
-        for index, row in df_repositioning.iterrows():
+        # only road, air and maritime legs are considered for repositioning
+        df_repositioning = df_repositioning[df_repositioning['Transportation Mode'].isin(['Road', 'Air', 'Maritime'])].copy()
 
-            # retrieve the shipment data
-            shipment_weight_kg = row['Number of containers shipped']*weight_per_empty_container
-            shipment_volume_m3 = row['Number of containers shipped'] * outer_volume_per_container
+        # retrieve the shipment data of the empty containers
+        df_repositioning['Shipment Weight [kg]'] = df_repositioning['Number of containers shipped']*weight_per_empty_container
+        df_repositioning['Shipment Volume [m3]'] = df_repositioning['Number of containers shipped']*outer_volume_per_container
 
-            # get the origin and destination points
-            origin_latlong = (row['Origin Latitude'], row['Origin Longitude'])
-            dest_latlong = (row['Destination Latitude'], row['Destination Longitude'])
+        # only use the distance if available
+        df_repositioning['Distance [km]'] = df_repositioning['Distance [km] (if available)'].where(
+            df_repositioning['Distance [km] (if available)']>0)
 
-            distance_km=None
-            if row['Distance [km] (if available)']>0:
-                distance_km=row['Distance [km] (if available)']
+        # resolve the missing road distances in bulk
+        df_repositioning = self.resolve_road_distances(df_repositioning)
 
-            # calculate road freight emissions
-            if row['Transportation Mode']=='Road':
-                repositioning_emissions+=self.calculate_road_freight_emissions(shipment_weight_kg, shipment_volume_m3,
-                                                                 origin_latlong, dest_latlong, self.transport_dict['repositioning'],
-                                                                               distance_km=distance_km)
+        return df_repositioning, number_of_outgoing_shipments
 
-            # calculate airfreight emissions
-            elif row['Transportation Mode']=='Air':
-                repositioning_emissions+=self.calculate_air_freight_emissions(shipment_weight_kg, shipment_volume_m3,
-                                                               origin_latlong, dest_latlong, self.transport_dict['repositioning'],
-                                                                              distance_km=distance_km)
 
-            elif row['Transportation Mode']=='Maritime':
-                repositioning_emissions += self.calculate_maritime_freight_emissions(shipment_weight_kg, shipment_volume_m3,
-                                                                                     origin_latlong, dest_latlong,
-                                                                                     self.transport_dict['repositioning'],
-                                                                                     distance_km=distance_km)
+    def calculate_repositioning_table(self, container_specs=None):
+        """
+        Calculates the repositioning emissions of all container types and service centers at once. The emissions of each
+        provisioning leg are calculated once and summed up per container type and destination service center.
+        :param container_specs: dict with the empty weight [kg] and outer volume [m3] per container for each container
+        type to calculate, by default all container types are calculated with the nominal values of the new shipment
+        :return: DataFrame indexed by container type and service center with the repositioning emissions and the
+        number of outgoing containers
+        """
 
+        # get the provisioning data
+        df = self.get_sheet('Script input provisioning data')
 
-        # compute repositioning emissions per container shipment
-        repositioning_emissions_per_outgoing_container = repositioning_emissions/number_of_outgoing_shipments
+        # the number of outgoing containers per container type and service center
+        outgoing_containers = df.groupby(['Container Type', 'Origin'])['Number of containers shipped'].sum()
+        outgoing_containers.index.names = ['Container Type', 'Service Center']
 
-        # total attributable repositioning emissions for the new shipment
-        repositioning_emissions_for_new_shipment = repositioning_emissions_per_outgoing_container*\
-                                                   self.transport_dict['new shipment']['shipment parameters']['Number of containers shipped']
+        # all provisioning legs with road, air or maritime transportation
+        df_repositioning = df[(df['Shipment Type'] == 'Provisioning') &
+                              (df['Transportation Mode'].isin(['Road', 'Air', 'Maritime']))]
 
-        return repositioning_emissions_for_new_shipment
+        # get nominal weight and volume for containers
+        if container_specs is not None:
+            df_repositioning = df_repositioning[df_repositioning['Container Type'].isin(list(container_specs))]
+        else:
+            shipment_parameters = self.transport_dict['new shipment']['shipment parameters']
+            container_specs = {container_type: {'Empty Container Weight [kg]': shipment_parameters['Empty Container Weight [kg]']/
+                                                                                shipment_parameters['Number of containers shipped'],
+                                                'Shipment Volume [m3]': shipment_parameters['Shipment Volume [m3]']/
+                                                                         shipment_parameters['Number of containers shipped']}
+                               for container_type in df_repositioning['Container Type'].unique()}
+        df_repositioning = df_repositioning.copy()
+        weight_per_empty_container = df_repositioning['Container Type'].map(
+            {container_type: specs['Empty Container Weight [kg]'] for container_type, specs in container_specs.items()})
+        outer_volume_per_container = df_repositioning['Container Type'].map(
+            {container_type: specs['Shipment Volume [m3]'] for container_type, specs in container_specs.items()})
+
+        # retrieve the shipment data of the empty containers
+        df_repositioning['Shipment Weight [kg]'] = df_repositioning['Number of containers shipped']*weight_per_empty_container
+        df_repositioning['Shipment Volume [m3]'] = df_repositioning['Number of containers shipped']*outer_volume_per_container
+
+        # only use the distance if available
+        df_repositioning['Distance [km]'] = df_repositioning['Distance [km] (if available)'].where(
+            df_repositioning['Distance [km] (if available)']>0)
+
+        # resolve the missing road distances in bulk
+        df_repositioning = self.resolve_road_distances(df_repositioning)
+
+        # calculate the emissions of all provisioning legs once
+        legs_df = self.batch_engine.calculate_leg_emissions(df_repositioning, self.create_repositioning_parameters())
+        self.write_leg_results(legs_df, 'repositioning table')
+
+        # keep the sea route distances computed in this run
+        self.maritime_distance_index.save()
+
+        # sum up the emissions per container type and destination service center
+        repositioning_emissions = legs_df.groupby(['Container Type', 'Destination Service Center'])['Emissions [kg]'].agg(
+            self.sum_emissions)
+        repositioning_emissions.index.names = ['Container Type', 'Service Center']
+
+        repositioning_table = pd.concat([repositioning_emissions.rename('Repositioning emissions [kg]'),
+                                         outgoing_containers.rename('Outgoing containers')], axis=1)
+
+        # service centers without provisioning legs have no repositioning emissions, those with failed legs stay NaN
+        repositioning_table['Outgoing containers'] = repositioning_table['Outgoing containers'].fillna(0)
+        repositioning_table['Repositioning emissions [kg]'] = repositioning_table['Repositioning emissions [kg]'].where(
+            repositioning_table.index.isin(repositioning_emissions.index), 0)
+
+        self.repositioning_table = repositioning_table
+
+        return repositioning_table
+
+
+    def lookup_repositioning_emissions(self, container_type, service_center, number_of_containers,
+                                       repositioning_table=None):
+        """
+        Looks up the repositioning emissions attributable to a new shipment in the repositioning table
+        :param container_type: the container type of the new shipment
+        :param service_center: the origin service center of the new shipment
+        :param number_of_containers: the number of containers of the new shipment
+        :param repositioning_table: the repositioning table to use, by default the last calculated table
+        :return: the emissions created by repositioning/provisioning and attributed to the new shipment
+        """
+
+        if repositioning_table is None:
+            repositioning_table = self.repositioning_table
 
+        repositioning_emissions = 0
+        number_of_outgoing_shipments = number_of_containers
+        if (container_type, service_center) in repositioning_table.index:
+            row = repositioning_table.loc[(container_type, service_center)]
+            repositioning_emissions = row['Repositioning emissions [kg]']
+            number_of_outgoing_shipments += row['Outgoing containers']
+
+        # compute repositioning emissions per container shipment and attribute them to the new shipment
+        return repositioning_emissions/number_of_outgoing_shipments*number_of_containers
 
 
     def create_transportation_dict(self):
@@ -411,18 +966,28 @@ class EmissionsCalculator:
         Creates the parameters for the new shipment
         """
 
-        # set the default parameters for NTM parameters
-        dic = dict()
-        dic['NTM parameters'] = copy.deepcopy(run_parameters.NTM_default_parameters)
-
         # read in the relevant sheet & create the parameter dict
-        df = pd.read_excel(run_parameters.path_to_workbook, sheet_name='Script input new shipment data')
+        df = self.get_sheet('Script input new shipment data')
 
         # create the parameter dict
         a = list(df.columns)
         b = list(df.loc[0].values)
         shipment_dict = dict(zip(a, b))
 
+        return self.create_shipment_parameters(shipment_dict)
+
+    def create_shipment_parameters(self, shipment_dict):
+        """
+        Creates the parameters for a shipment
+        :param shipment_dict: dict with the columns of 'Script input new shipment data' for the shipment
+        """
+
+        # set the default parameters for NTM parameters, they only hold strings and numbers so copying the dict of
+        # each transportation mode is enough
+        dic = dict()
+        dic['NTM parameters'] = {transportation_mode: dict(NTM_parameters) for transportation_mode, NTM_parameters
+                                 in run_parameters.NTM_default_parameters.items()}
+
         # set the shipment parameters
         dic['shipment parameters'] = shipment_dict
 
@@ -444,8 +1009,10 @@ class EmissionsCalculator:
         Creates the parameters for the new shipment
         """
 
-        # set the default parameters for NTM parameters
+        # set the default parameters for NTM parameters, they only hold strings and numbers so copying the dict of
+        # each transportation mode is enough
         dic = dict()
-        dic['NTM parameters'] = copy.deepcopy(run_parameters.NTM_default_parameters)
+        dic['NTM parameters'] = {transportation_mode: dict(NTM_parameters) for transportation_mode, NTM_parameters
+                                 in run_parameters.NTM_default_parameters.items()}
 
         return dic
\ No newline at end of file
@@ -0,0 +1,205 @@
+# import packages
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+import numpy as np
+import pandas as pd
+import argparse
+import threading
+import logging
+import json
+
+from parameters import run_parameters
+from objects.EmissionsServiceClient import to_records
+from objects.EmissionsCalculator import EmissionsCalculator
+from objects.ShipmentBatchCalculator import ShipmentBatchCalculator
+from objects.EmissionFactorSurrogate import EmissionFactorSurrogate
+
+logger = logging.getLogger(__name__)
+
+
+class EmissionsService:
+    """
+    Class object running a long-lived local HTTP service around one EmissionsCalculator. The NTM token, the distance
+    caches, the sea route distances and the stored leg results are kept warm between requests, so a calculation only
+    costs the lookups of its own legs instead of the start-up of a new run.
+
+    Endpoints:
+        POST /emissions  {"shipments": [...], "legs": [...]} -> {"emissions": [...]}, one record per shipment
+        POST /workbook   {"provisioning": path or null}     -> {"emissions": {...}}, the new shipment of the workbook
+        GET  /health                                        -> {"status": "ok", "calculations": ...}
+        GET  /metrics                                       -> the instrumentation in the Prometheus text format
+    """
+
+    def __init__(self, emissions_calculator=None, host=None, port=None):
+        """
+        :param emissions_calculator: the EmissionsCalculator kept warm, by default a new one
+        :param host: the host the service listens on
+        :param port: the port the service listens on (0 for any free port)
+        """
+        self.emissions_calculator = emissions_calculator if emissions_calculator is not None else EmissionsCalculator()
+        host = host if host is not None else run_parameters.emissions_service_host
+        port = port if port is not None else run_parameters.emissions_service_port
+
+        # the calculations share the state of the emissions calculator and run one at a time, each calculation runs its
+        # legs concurrently
+        self.lock = threading.Lock()
+        self.number_of_calculations = 0
+
+        self.server = ThreadingHTTPServer((host, port), self.create_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """
+        Starts serving in a background thread
+        :return: the url of the service
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.emissions_calculator.maritime_distance_index.close()
+
+    def warm_up(self):
+        """
+        Requests the NTM token, reads the workbook and loads the sea route distances before the first request
+        """
+
+        emc = self.emissions_calculator
+        with emc.instrumentation.timer('stage_seconds', stage='service warm-up'):
+            emc.auth.get_access_token()
+            emc.maritime_distance_index.load()
+            emc.build_maritime_distance_index()
+
+    def reload_workbook(self):
+        """
+        Reads the workbook again on its next use in case it was edited since the last request, unchanged sheets are read
+        from the sidecar files
+        """
+        self.emissions_calculator.workbook = None
+        self.emissions_calculator.repositioning_table = None
+
+        # identical requests are only shared within a calculation
+        self.emissions_calculator.coalescer.clear()
+
+    def calculate_shipment_emissions(self, body):
+        """
+        :param body: dict with the 'shipments' and their 'legs' as lists of records, see main.py --shipments
+        :return: list with the emissions of each shipment as records
+        """
+
+        shipments_df = pd.DataFrame.from_records(body['shipments'])
+        legs_df = pd.DataFrame.from_records(body['legs'])
+
+        with self.lock:
+            self.number_of_calculations += 1
+            self.reload_workbook()
+            output_df = ShipmentBatchCalculator(self.emissions_calculator).calculate_shipment_emissions(shipments_df,
+                                                                                                        legs_df)
+
+        return to_records(output_df)
+
+    def calculate_workbook_emissions(self, body):
+        """
+        :param body: dict with the optional path of a 'provisioning' history streamed instead of the provisioning sheet
+        :return: dict with the emissions of the new shipment in the workbook, NaN totals become None
+        """
+
+        emc = self.emissions_calculator
+        with self.lock:
+            self.number_of_calculations += 1
+            self.reload_workbook()
+            emissions_dict = emc.calculate_workbook_emissions(body.get('provisioning'))
+
+        return {name: None if np.isnan(emissions_kg) else float(emissions_kg)
+                for name, emissions_kg in emissions_dict.items()}
+
+    def create_handler(self):
+        """
+        :return: the request handler class routing the requests to this service
+        """
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def send_body(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_json(self, status, response):
+                self.send_body(status, json.dumps(response).encode(), 'application/json')
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                if path == '/emissions':
+                    calculate = service.calculate_shipment_emissions
+                elif path == '/workbook':
+                    calculate = service.calculate_workbook_emissions
+                else:
+                    return self.send_json(404, {'error': f"Unknown path {path}"})
+
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                    self.send_json(200, {'emissions': calculate(body)})
+                except Exception as err:
+                    logger.warning(f"Calculation of {path} failed: {err}")
+                    self.send_json(500, {'error': str(err)})
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                if path == '/health':
+                    return self.send_json(200, {'status': 'ok', 'calculations': service.number_of_calculations})
+                if path == '/metrics':
+                    return self.send_body(200, service.emissions_calculator.instrumentation.to_prometheus().encode(),
+                                          'text/plain; version=0.0.4')
+                self.send_json(404, {'error': f"Unknown path {path}"})
+
+            def log_message(self, format, *args):
+                # keep the output of the calculations readable
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Runs a local emissions service keeping the NTM token, the distance '
+                                                 'caches and the sea route distances warm between calculations')
+    parser.add_argument('--host', default=run_parameters.emissions_service_host)
+    parser.add_argument('--port', type=int, default=run_parameters.emissions_service_port)
+    parser.add_argument('--surrogate', action='store_true',
+                        help='estimate the emissions from the stored emission factor tables instead of NTM')
+    args = parser.parse_args()
+
+    emc = EmissionsCalculator()
+    if args.surrogate:
+        emc.batch_engine = EmissionFactorSurrogate.load(run_parameters.surrogate_tables_path, emc)
+
+    service = EmissionsService(emc, args.host, args.port)
+    service.warm_up()
+    print(f"Serving on {service.url}, run main.py --service {service.url} or set emissions_service_url in "
+          f"run_parameters.py to use it.")
+    try:
+        service.server.serve_forever()
+    except KeyboardInterrupt:
+        service.server.server_close()
+        emc.maritime_distance_index.close()
+        print(emc.instrumentation.summary())
@@ -0,0 +1,55 @@
+# import packages
+import numpy as np
+import pandas as pd
+import requests
+import json
+
+
+def to_records(df):
+    """
+    :return: list with one json compatible dict per row of a DataFrame, NaN values become None
+    """
+    return json.loads(df.to_json(orient='records'))
+
+
+class EmissionsServiceClient:
+    """
+    Class object sending calculations to a running EmissionsService, with the same results as the local calculation
+    """
+
+    def __init__(self, url):
+        """
+        :param url: the url of the service, e.g. 'http://127.0.0.1:8766'
+        """
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+
+    def post(self, path, body):
+        """
+        :return: the emissions of the response
+        """
+        res = self.session.post(self.url + path, json=body)
+        if res.status_code != 200:
+            raise Exception(f"Emissions service returned {res.status_code}: {res.json().get('error')}")
+        return res.json()['emissions']
+
+    def calculate_shipment_emissions(self, shipments_df, legs_df):
+        """
+        Same interface as ShipmentBatchCalculator.calculate_shipment_emissions
+        :return: DataFrame with one row per shipment and one column per emission component
+        """
+        output_df = pd.DataFrame.from_records(self.post('/emissions', {'shipments': to_records(shipments_df),
+                                                                       'legs': to_records(legs_df)}))
+
+        # failed totals are sent as null
+        emission_columns = [column for column in output_df.columns if column.endswith('emissions')]
+        output_df[emission_columns] = output_df[emission_columns].astype(float)
+        return output_df
+
+    def calculate_workbook_emissions(self, provisioning_path=None):
+        """
+        Same interface as EmissionsCalculator.calculate_workbook_emissions
+        :return: dict with the road freight, air freight and repositioning/provisioning emissions in kg
+        """
+        emissions_dict = self.post('/workbook', {'provisioning': provisioning_path})
+        return {name: np.nan if emissions_kg is None else emissions_kg for name, emissions_kg in emissions_dict.items()}
@@ -0,0 +1,109 @@
+# import packages
+import pandas as pd
+import numpy as np
+import time
+
+from parameters import run_parameters
+from objects.ResultCache import ResultCache
+
+# columns of a leg that determine its emissions
+FINGERPRINT_COLUMNS = ['Transportation Mode', 'Origin Latitude', 'Origin Longitude', 'Destination Latitude',
+                       'Destination Longitude', 'Shipment Weight [kg]', 'Shipment Volume [m3]', 'Distance [km]']
+
+# columns describing how the emissions of a leg were calculated, stored with the emissions
+DETAIL_COLUMNS = ['Calculation distance [km]', 'Distance source', 'Payload hash', 'Result source']
+
+
+class IncrementalEmissionsEngine:
+    """
+    Class object keeping the emissions of each leg between runs and only calculating new or changed legs. Each leg is
+    fingerprinted by its data, the NTM parameters of its transportation mode and the additional factors, so an edited
+    row or parameter leads to a new fingerprint and is calculated again.
+    """
+
+    def __init__(self, engine, store, checkpoint_legs=None):
+        """
+        :param engine: the engine calculating the legs without stored result, e.g. the BatchEmissionsEngine
+        :param store: the ResultCache holding the emissions of each leg keyed by its fingerprint
+        :param checkpoint_legs: the number of legs calculated before their results are stored, so that an interrupted
+        run loses at most these legs
+        """
+        self.engine = engine
+        self.store = store
+        self.checkpoint_legs = checkpoint_legs if checkpoint_legs is not None else run_parameters.leg_results_checkpoint_legs
+
+        # statistics of the current run
+        self.number_of_reused_legs = 0
+        self.number_of_calculated_legs = 0
+
+    @staticmethod
+    def get_fingerprint(leg, parameter_dict):
+        """
+        :param leg: dict with the leg data
+        :param parameter_dict: the parameter dict used for the leg
+        :return: the fingerprint of the leg
+        """
+
+        transportation_mode = leg['Transportation Mode']
+        leg_data = {column: None if pd.isna(leg.get(column)) else leg.get(column) for column in FINGERPRINT_COLUMNS}
+        return ResultCache.make_key({'leg': leg_data,
+                                     'NTM parameters': parameter_dict['NTM parameters'].get(transportation_mode),
+                                     'RFI': run_parameters.RFI if transportation_mode == 'Air' else None,
+                                     'DETOUR_KM': run_parameters.DETOUR_KM if transportation_mode == 'Air' else None})
+
+    def calculate_leg_emissions(self, legs_df, parameter_dict):
+        """
+        Calculates the emissions of all legs, taking the legs calculated in an earlier run from the store. Same
+        interface as BatchEmissionsEngine.calculate_leg_emissions.
+        :param legs_df: DataFrame with one row per leg
+        :param parameter_dict: the parameter dict used for all legs
+        :return: copy of legs_df in the same order with the columns 'Emissions [kg]' and 'Error' and the detail columns
+        of the engine, e.g. 'Calculation distance [km]', 'Distance source', 'Payload hash' and 'Result source'
+        """
+
+        fingerprints = [self.get_fingerprint(leg, parameter_dict) for leg in legs_df.to_dict('records')]
+
+        # results stored by earlier versions only hold the emissions
+        stored_results = [self.store.get(fingerprint) for fingerprint in fingerprints]
+        stored_results = [{'Emissions [kg]': result} if result is not None and not isinstance(result, dict) else result
+                          for result in stored_results]
+
+        emissions = np.array([np.nan if result is None else result['Emissions [kg]'] for result in stored_results])
+        errors = np.full(len(legs_df), None, dtype=object)
+        details = {column: np.array([None if result is None else result.get(column) for result in stored_results],
+                                    dtype=object) for column in DETAIL_COLUMNS}
+
+        # only calculate the new or changed legs, storing the results after every checkpoint_legs legs
+        missing_positions = np.flatnonzero([result is None for result in stored_results])
+        for start in range(0, len(missing_positions), self.checkpoint_legs):
+            checkpoint_positions = missing_positions[start:start + self.checkpoint_legs]
+
+            start_time = time.perf_counter()
+            results_df = self.engine.calculate_leg_emissions(legs_df.iloc[checkpoint_positions], parameter_dict)
+            latency_seconds = (time.perf_counter() - start_time) / len(checkpoint_positions)
+
+            emissions[checkpoint_positions] = results_df['Emissions [kg]'].to_numpy(dtype=float)
+            errors[checkpoint_positions] = results_df['Error'].to_numpy()
+            for column in DETAIL_COLUMNS:
+                if column in results_df.columns:
+                    details[column][checkpoint_positions] = results_df[column].to_numpy()
+
+            # only store the successfully calculated legs
+            for position, emissions_kg, error in zip(checkpoint_positions, results_df['Emissions [kg]'], results_df['Error']):
+                if pd.isna(error) and not pd.isna(emissions_kg):
+                    result = {column: details[column][position] for column in DETAIL_COLUMNS}
+                    result['Emissions [kg]'] = float(emissions_kg)
+                    if result['Calculation distance [km]'] is not None:
+                        result['Calculation distance [km]'] = float(result['Calculation distance [km]'])
+                    self.store.set(fingerprints[position], result, latency_seconds=latency_seconds)
+
+        self.number_of_reused_legs += len(legs_df) - len(missing_positions)
+        self.number_of_calculated_legs += len(missing_positions)
+
+        results_df = legs_df.copy()
+        results_df['Emissions [kg]'] = emissions
+        results_df['Error'] = errors
+        for column in DETAIL_COLUMNS:
+            results_df[column] = details[column]
+
+        return results_df
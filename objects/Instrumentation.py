@@ -0,0 +1,184 @@
+# import packages
+from contextlib import contextmanager
+import threading
+import bisect
+import json
+import time
+import os
+
+# upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS_SECONDS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300]
+
+# prefix of the exported metric names
+METRIC_PREFIX = 'co2_estimator_'
+
+
+class Instrumentation:
+    """
+    Class object collecting counters, gauges and latency histograms of a run, e.g. the calls and latency per external service,
+    token requests, cache lookups and failed legs per transportation mode. Metrics have a name and labels:
+
+        instrumentation.increment('cache_lookups', cache='ntm', result='hit')
+        with instrumentation.timer('external_call_seconds', service='ntm'):
+            ...
+    """
+
+    def __init__(self):
+        # counters, gauges and histograms keyed by the metric name and the sorted labels
+        self.counters = dict()
+        self.gauges = dict()
+        self.histograms = dict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name, amount=1, **labels):
+        """
+        Increments a counter
+        :param name: the name of the counter
+        :param amount: the amount to add
+        :param labels: the labels of the counter, e.g. service='ntm'
+        """
+        key = self.get_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        """
+        Sets a gauge to its current value
+        :param name: the name of the gauge
+        :param value: the current value
+        :param labels: the labels of the gauge, e.g. service='ntm'
+        """
+        key = self.get_key(name, labels)
+        with self.lock:
+            self.gauges[key] = value
+
+    def observe(self, name, seconds, **labels):
+        """
+        Adds a duration to a latency histogram
+        :param name: the name of the histogram
+        :param seconds: the duration in seconds
+        :param labels: the labels of the histogram, e.g. service='ntm'
+        """
+        key = self.get_key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = {'buckets': [0] * (len(LATENCY_BUCKETS_SECONDS) + 1), 'count': 0, 'sum': 0, 'max': 0}
+                self.histograms[key] = histogram
+            histogram['buckets'][bisect.bisect_left(LATENCY_BUCKETS_SECONDS, seconds)] += 1
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+            histogram['max'] = max(histogram['max'], seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        Adds the duration of the enclosed block to a latency histogram, also if the block raises
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    @staticmethod
+    def get_quantile(histogram, quantile):
+        """
+        :return: the upper bound of the bucket holding the quantile of a histogram
+        """
+        rank = quantile * histogram['count']
+        cumulative_count = 0
+        for upper_bound, count in zip(LATENCY_BUCKETS_SECONDS, histogram['buckets']):
+            cumulative_count += count
+            if cumulative_count >= rank:
+                return upper_bound
+        return histogram['max']
+
+    @staticmethod
+    def format_labels(labels):
+        return ', '.join(f"{label}={value}" for label, value in labels)
+
+    def summary(self):
+        """
+        :return: the report of all metrics as text
+        """
+
+        with self.lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted((key, dict(histogram)) for key, histogram in self.histograms.items())
+
+        lines = ['Latency:']
+        for (name, labels), histogram in histograms:
+            lines.append(f"  {name} ({self.format_labels(labels)}): {histogram['count']} calls, "
+                         f"{round(histogram['sum'], 2)} s total, {round(histogram['sum'] / histogram['count'], 4)} s mean, "
+                         f"p50 <= {self.get_quantile(histogram, 0.5)} s, p95 <= {self.get_quantile(histogram, 0.95)} s, "
+                         f"max {round(histogram['max'], 4)} s")
+        lines.append('Counts:')
+        for (name, labels), count in counters:
+            lines.append(f"  {name} ({self.format_labels(labels)}): {count}")
+        if len(gauges) > 0:
+            lines.append('Gauges:')
+            for (name, labels), value in gauges:
+                lines.append(f"  {name} ({self.format_labels(labels)}): {value}")
+
+        return '\n'.join(lines)
+
+    def to_json(self):
+        """
+        :return: dict with all counters, gauges and histograms
+        """
+
+        with self.lock:
+            return {'counters': [{'name': name, 'labels': dict(labels), 'value': count}
+                                 for (name, labels), count in sorted(self.counters.items())],
+                    'gauges': [{'name': name, 'labels': dict(labels), 'value': value}
+                               for (name, labels), value in sorted(self.gauges.items())],
+                    'histograms': [{'name': name, 'labels': dict(labels), 'buckets': LATENCY_BUCKETS_SECONDS,
+                                    'bucket counts': list(histogram['buckets']), 'count': histogram['count'],
+                                    'sum': histogram['sum'], 'max': histogram['max']}
+                                   for (name, labels), histogram in sorted(self.histograms.items())]}
+
+    def to_prometheus(self):
+        """
+        :return: all counters, gauges and histograms in the Prometheus text exposition format
+        """
+
+        def format_prometheus_labels(labels):
+            return '{' + ','.join(f'{label}="{value}"' for label, value in labels) + '}' if len(labels) > 0 else ''
+
+        with self.lock:
+            lines = []
+            for (name, labels), count in sorted(self.counters.items()):
+                lines.append(f"{METRIC_PREFIX}{name}_total{format_prometheus_labels(labels)} {count}")
+
+            for (name, labels), value in sorted(self.gauges.items()):
+                lines.append(f"{METRIC_PREFIX}{name}{format_prometheus_labels(labels)} {value}")
+
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                cumulative_count = 0
+                for upper_bound, count in zip(LATENCY_BUCKETS_SECONDS + ['+Inf'], histogram['buckets']):
+                    cumulative_count += count
+                    lines.append(f"{METRIC_PREFIX}{name}_bucket"
+                                 f"{format_prometheus_labels(labels + (('le', upper_bound),))} {cumulative_count}")
+                lines.append(f"{METRIC_PREFIX}{name}_sum{format_prometheus_labels(labels)} {histogram['sum']}")
+                lines.append(f"{METRIC_PREFIX}{name}_count{format_prometheus_labels(labels)} {histogram['count']}")
+
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path):
+        """
+        Writes all metrics to a json file or, for any other extension (e.g. .prom), in the Prometheus text format
+        :param path: the path of the file
+        """
+        if os.path.dirname(path) != '':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            if os.path.splitext(path)[1].lower() == '.json':
+                json.dump(self.to_json(), file, indent=2)
+            else:
+                file.write(self.to_prometheus())
@@ -0,0 +1,261 @@
+# import packages
+import pandas as pd
+import numpy as np
+import os
+
+from parameters import run_parameters
+from objects.ResultCache import ResultCache
+from objects.EmissionFactorSurrogate import EmissionFactorSurrogate
+from objects.BatchEmissionsEngine import RESULT_COLUMNS
+
+# columns identifying a lane of the index
+LANE_COLUMNS = ['Configuration', 'Transportation Mode', 'Origin Latitude', 'Origin Longitude', 'Destination Latitude',
+                'Destination Longitude', 'Distance [km]']
+
+
+class LaneEmissionIndex:
+    """
+    Class object answering the legs on the lanes of the service-center network from a precomputed index instead of NTM.
+    For each lane, transportation mode and NTM parameter configuration the index holds the emissions of one container
+    and per kg of (chargeable) weight. The emissions of a leg are scaled linearly with its weight, which assumes that
+    NTM is linear in the weight of a leg for a fixed configuration; the load factors are NTM parameters and do not
+    depend on the weight. Legs on lanes that are not in the index are calculated by the wrapped engine. Same interface
+    as BatchEmissionsEngine.calculate_leg_emissions.
+    """
+
+    def __init__(self, engine, path=None, precision=None, emissions_calculator=None):
+        """
+        :param engine: the engine calculating the legs on unseen lanes, e.g. the BatchEmissionsEngine
+        :param path: the path of the parquet file holding the index, loaded on first use
+        :param precision: the number of decimals the coordinates of a lane are rounded to
+        :param emissions_calculator: the EmissionsCalculator whose query templates give the hash of the NTM query a leg
+        from the index stands for, without it these legs have no payload hash
+        """
+        self.engine = engine
+        self.path = path
+        self.precision = precision if precision is not None else run_parameters.lane_emission_index_precision
+        self.emissions_calculator = emissions_calculator
+
+        # emissions per kg, distance and distance source keyed by the lane, the file is loaded on first use
+        self.lanes = None
+
+        # statistics of the current run
+        self.number_of_indexed_legs = 0
+        self.number_of_live_legs = 0
+
+    @staticmethod
+    def get_configuration(transportation_mode, parameter_dict):
+        """
+        :return: the hash of the NTM parameters of a transportation mode and the additional factors of air freight
+        """
+        return ResultCache.make_key({'NTM parameters': parameter_dict['NTM parameters'].get(transportation_mode),
+                                     'RFI': run_parameters.RFI if transportation_mode == 'Air' else None,
+                                     'DETOUR_KM': run_parameters.DETOUR_KM if transportation_mode == 'Air' else None})
+
+    def get_lane_keys(self, legs_df, parameter_dict):
+        """
+        :param legs_df: DataFrame with one row per leg
+        :param parameter_dict: the parameter dict used for all legs
+        :return: list with the key of the lane of each leg
+        """
+
+        configurations = {transportation_mode: self.get_configuration(transportation_mode, parameter_dict)
+                          for transportation_mode in set(legs_df['Transportation Mode'])
+                          if transportation_mode in parameter_dict['NTM parameters']}
+        distances = legs_df['Distance [km]'].tolist() if 'Distance [km]' in legs_df.columns else [None] * len(legs_df)
+
+        return [(configurations.get(transportation_mode), transportation_mode,
+                 round(float(origin_latitude), self.precision), round(float(origin_longitude), self.precision),
+                 round(float(destination_latitude), self.precision), round(float(destination_longitude), self.precision),
+                 None if pd.isna(distance_km) else round(float(distance_km), 2))
+                for transportation_mode, origin_latitude, origin_longitude, destination_latitude, destination_longitude,
+                    distance_km
+                in zip(legs_df['Transportation Mode'].tolist(),
+                       legs_df['Origin Latitude'].tolist(), legs_df['Origin Longitude'].tolist(),
+                       legs_df['Destination Latitude'].tolist(), legs_df['Destination Longitude'].tolist(), distances)]
+
+    @staticmethod
+    def get_chargeable_weight_kg(legs_df, parameter_dict):
+        """
+        :return: array with the weight of each leg the emissions are proportional to, for air freight the chargeable
+        weight
+        """
+        chargeable_weight_kg = legs_df['Shipment Weight [kg]'].to_numpy(dtype=float).copy()
+        is_air = (legs_df['Transportation Mode'] == 'Air').to_numpy()
+        if is_air.any():
+            chargeable_weight_kg[is_air] = 1000 * EmissionFactorSurrogate.get_tonne_kilometres(
+                'Air', chargeable_weight_kg[is_air], legs_df['Shipment Volume [m3]'].to_numpy(dtype=float)[is_air], 1,
+                parameter_dict)
+        return chargeable_weight_kg
+
+    def load(self):
+        """
+        Loads the index from disk if it was not loaded yet, without file all legs are calculated by the wrapped engine
+        """
+
+        if self.lanes is not None:
+            return
+
+        lanes = dict()
+        if self.path is not None and os.path.exists(self.path):
+            df = pd.read_parquet(self.path)
+            keys = self.get_keys_of_index(df)
+            for key, emissions_per_kg, distance_km, distance_source in zip(
+                    keys, df['Emissions per kg [kg/kg]'].tolist(), df['Calculation distance [km]'].tolist(),
+                    df['Distance source'].tolist()):
+                lanes[key] = (emissions_per_kg, distance_km, distance_source)
+        self.lanes = lanes
+
+    def get_keys_of_index(self, index_df):
+        """
+        :return: list with the lane key of each row of the index file
+        """
+        return [(configuration, transportation_mode, origin_latitude, origin_longitude, destination_latitude,
+                 destination_longitude, None if pd.isna(distance_km) else distance_km)
+                for configuration, transportation_mode, origin_latitude, origin_longitude, destination_latitude,
+                    destination_longitude, distance_km in index_df[LANE_COLUMNS].itertuples(index=False)]
+
+    def calculate_leg_emissions(self, legs_df, parameter_dict):
+        """
+        Calculates the emissions of all legs, taking the legs on indexed lanes from the index
+        :param legs_df: DataFrame with one row per leg
+        :param parameter_dict: the parameter dict used for all legs
+        :return: copy of legs_df in the same order with the columns 'Emissions [kg]' and 'Error' and the detail columns
+        of the engine, 'Result source' is 'lane index' for the legs taken from the index
+        """
+
+        self.load()
+
+        entries = [self.lanes.get(key) for key in self.get_lane_keys(legs_df, parameter_dict)]
+        indexed_positions = np.flatnonzero([entry is not None for entry in entries])
+        live_positions = np.flatnonzero([entry is None for entry in entries])
+
+        # the result columns of the legs, the distance source of the input is kept unless the leg is calculated
+        results = {column: np.full(len(legs_df), None, dtype=object) for column in RESULT_COLUMNS + ['Result source']}
+        results['Emissions [kg]'] = np.full(len(legs_df), np.nan)
+        if 'Distance source' in legs_df.columns:
+            results['Distance source'] = legs_df['Distance source'].to_numpy(dtype=object).copy()
+
+        # the emissions of the legs on indexed lanes are proportional to their weight
+        if len(indexed_positions) > 0:
+            chargeable_weight_kg = self.get_chargeable_weight_kg(legs_df.iloc[indexed_positions], parameter_dict)
+            emissions_per_kg = np.array([entries[position][0] for position in indexed_positions])
+            results['Emissions [kg]'][indexed_positions] = np.around(emissions_per_kg * chargeable_weight_kg, 2)
+            for position in indexed_positions:
+                results['Calculation distance [km]'][position] = entries[position][1]
+                results['Distance source'][position] = entries[position][2]
+                results['Result source'][position] = 'lane index'
+            results['Payload hash'][indexed_positions] = self.get_payload_hashes(
+                legs_df.iloc[indexed_positions], results['Calculation distance [km]'][indexed_positions], parameter_dict)
+
+        # only the legs on unseen lanes are calculated
+        if len(live_positions) > 0:
+            live_df = self.engine.calculate_leg_emissions(legs_df.iloc[live_positions], parameter_dict)
+            for column in live_df.columns:
+                if column in results or column not in legs_df.columns:
+                    results.setdefault(column, np.full(len(legs_df), None, dtype=object))
+                    results[column][live_positions] = live_df[column].to_numpy()
+
+        results_df = legs_df.copy()
+        for column, values in results.items():
+            results_df[column] = values
+
+        self.number_of_indexed_legs += len(indexed_positions)
+        self.number_of_live_legs += len(live_positions)
+
+        return results_df
+
+    def get_payload_hashes(self, legs_df, distances, parameter_dict):
+        """
+        :param legs_df: DataFrame with the legs taken from the index
+        :param distances: the calculation distance of each leg
+        :param parameter_dict: the parameter dict used for the legs
+        :return: list with the hash of the NTM query each leg stands for, None without emissions calculator
+        """
+
+        emc = self.emissions_calculator
+        if emc is None:
+            return [None] * len(legs_df)
+
+        query_templates = {transportation_mode: emc.get_query_template(transportation_mode, parameter_dict)
+                           for transportation_mode in set(legs_df['Transportation Mode'])}
+        return [emc.make_transport_activity_key(*query_templates[transportation_mode].create_query(
+                    shipment_weight_kg, shipment_volume_m3, distance_km))
+                for transportation_mode, shipment_weight_kg, shipment_volume_m3, distance_km
+                in zip(legs_df['Transportation Mode'].tolist(), legs_df['Shipment Weight [kg]'].tolist(),
+                       legs_df['Shipment Volume [m3]'].tolist(), distances)]
+
+    def create_entries(self, legs_df, parameter_dict, number_of_containers):
+        """
+        Creates the rows of the index from calculated legs
+        :param legs_df: DataFrame with the calculated legs, see BatchEmissionsEngine.calculate_leg_emissions
+        :param parameter_dict: the parameter dict the legs were calculated with
+        :param number_of_containers: the number of containers of each leg
+        :return: DataFrame with one row per successfully calculated lane
+        """
+
+        legs_df = legs_df[legs_df['Error'].isna() & legs_df['Emissions [kg]'].notna()]
+        keys = self.get_lane_keys(legs_df, parameter_dict)
+
+        entries_df = pd.DataFrame(keys, columns=LANE_COLUMNS)
+        for column in ['Origin', 'Destination Service Center', 'Calculation distance [km]', 'Distance source']:
+            entries_df[column] = legs_df[column].to_numpy() if column in legs_df.columns else None
+        entries_df['Emissions per container [kg]'] = legs_df['Emissions [kg]'].to_numpy(dtype=float) / number_of_containers
+        entries_df['Emissions per kg [kg/kg]'] = legs_df['Emissions [kg]'].to_numpy(dtype=float) / \
+                                                 self.get_chargeable_weight_kg(legs_df, parameter_dict)
+        entries_df['Emissions per m3 [kg/m3]'] = legs_df['Emissions [kg]'].to_numpy(dtype=float) / \
+                                                 legs_df['Shipment Volume [m3]'].to_numpy(dtype=float)
+
+        return entries_df
+
+    def build(self, emissions_calculator):
+        """
+        Calculates the emissions of every lane of the provisioning network for one container of the new shipment and
+        of the transportation legs of the new shipment, and saves the index
+        :param emissions_calculator: the EmissionsCalculator with the transportation dict of the new shipment created
+        :return: DataFrame with the index
+        """
+
+        emc = emissions_calculator
+        shipment_parameters = emc.transport_dict['new shipment']['shipment parameters']
+
+        # each lane of the provisioning network once, with one empty container of the new shipment
+        provisioning_df = emc.get_sheet('Script input provisioning data')
+        provisioning_df = provisioning_df[(provisioning_df['Shipment Type'] == 'Provisioning') &
+                                          (provisioning_df['Transportation Mode'].isin(['Road', 'Air', 'Maritime']))]
+        provisioning_df = provisioning_df.assign(**{
+            'Shipment Weight [kg]': shipment_parameters['Empty Container Weight [kg]']/
+                                    shipment_parameters['Number of containers shipped'],
+            'Shipment Volume [m3]': shipment_parameters['Shipment Volume [m3]']/
+                                    shipment_parameters['Number of containers shipped'],
+            'Distance [km]': provisioning_df['Distance [km] (if available)'].where(
+                provisioning_df['Distance [km] (if available)']>0)})
+        provisioning_df = emc.resolve_road_distances(provisioning_df)
+        provisioning_df = provisioning_df.drop_duplicates(['Transportation Mode', 'Origin Latitude', 'Origin Longitude',
+                                                           'Destination Latitude', 'Destination Longitude',
+                                                           'Distance [km]'])
+
+        legs_df = self.engine.calculate_leg_emissions(provisioning_df, emc.transport_dict['repositioning'])
+        entries = [self.create_entries(legs_df, emc.transport_dict['repositioning'], 1)]
+
+        # the transportation legs of the new shipment
+        legs_df = self.engine.calculate_leg_emissions(emc.get_shipment_legs(), emc.transport_dict['new shipment'])
+        entries.append(self.create_entries(legs_df, emc.transport_dict['new shipment'],
+                                           shipment_parameters['Number of containers shipped']))
+
+        index_df = pd.concat(entries).drop_duplicates(LANE_COLUMNS, keep='last')
+        self.save(index_df)
+
+        return index_df
+
+    def save(self, index_df):
+        """
+        Writes the index to disk and uses it for the following legs
+        """
+
+        if os.path.dirname(self.path) != '':
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        index_df.to_parquet(self.path, index=False)
+
+        self.lanes = None
+        self.load()
@@ -0,0 +1,64 @@
+# import packages
+import pandas as pd
+
+
+class Leg:
+    """
+    Class object holding the data of a transportation leg that its emissions depend on. Legs are created for every row
+    of a batch, so they only keep these fields instead of a dict of all columns.
+    """
+    __slots__ = ('transportation_mode', 'origin_latlong', 'destination_latlong', 'shipment_weight_kg',
+                 'shipment_volume_m3', 'distance_km', 'distance_source')
+
+    def __init__(self, transportation_mode, origin_latlong, destination_latlong, shipment_weight_kg, shipment_volume_m3,
+                 distance_km=None, distance_source=None):
+        """
+        :param transportation_mode: 'Road', 'Air' or 'Maritime'
+        :param origin_latlong: the origin as lat long pair
+        :param destination_latlong: the destination as lat long pair
+        :param shipment_weight_kg: the weight of the shipment
+        :param shipment_volume_m3: the volume of the shipment
+        :param distance_km: the distance of the leg, None if unknown
+        :param distance_source: where the distance comes from, e.g. 'input' or the name of the road distance provider
+        """
+        self.transportation_mode = transportation_mode
+        self.origin_latlong = origin_latlong
+        self.destination_latlong = destination_latlong
+        self.shipment_weight_kg = shipment_weight_kg
+        self.shipment_volume_m3 = shipment_volume_m3
+        self.distance_km = distance_km
+        self.distance_source = distance_source
+
+    @staticmethod
+    def from_dataframe(legs_df):
+        """
+        Creates the legs of all rows column by column
+        :param legs_df: DataFrame with one row per leg and the columns 'Transportation Mode', 'Origin Latitude',
+        'Origin Longitude', 'Destination Latitude', 'Destination Longitude', 'Shipment Weight [kg]',
+        'Shipment Volume [m3]' and optionally 'Distance [km]' and 'Distance source'
+        :return: list with one Leg per row
+        """
+
+        # only use the distance if available
+        if 'Distance [km]' in legs_df.columns:
+            distances = [None if pd.isna(distance_km) else distance_km for distance_km in legs_df['Distance [km]'].tolist()]
+        else:
+            distances = [None] * len(legs_df)
+
+        # distances without source were given with the leg
+        if 'Distance source' in legs_df.columns:
+            distance_sources = legs_df['Distance source'].tolist()
+        else:
+            distance_sources = [None] * len(legs_df)
+        distance_sources = [None if distance_km is None else 'input' if pd.isna(distance_source) else distance_source
+                            for distance_km, distance_source in zip(distances, distance_sources)]
+
+        return [Leg(transportation_mode, (origin_latitude, origin_longitude), (destination_latitude, destination_longitude),
+                    shipment_weight_kg, shipment_volume_m3, distance_km, distance_source)
+                for transportation_mode, origin_latitude, origin_longitude, destination_latitude, destination_longitude,
+                    shipment_weight_kg, shipment_volume_m3, distance_km, distance_source
+                in zip(legs_df['Transportation Mode'].tolist(),
+                       legs_df['Origin Latitude'].tolist(), legs_df['Origin Longitude'].tolist(),
+                       legs_df['Destination Latitude'].tolist(), legs_df['Destination Longitude'].tolist(),
+                       legs_df['Shipment Weight [kg]'].tolist(), legs_df['Shipment Volume [m3]'].tolist(),
+                       distances, distance_sources)]
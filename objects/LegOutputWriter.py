@@ -0,0 +1,107 @@
+# import packages
+import pandas as pd
+import numpy as np
+import os
+
+# columns of the leg output and whether they hold text or numbers
+LEG_OUTPUT_COLUMNS = {'Stage': 'string', 'Shipment ID': 'string', 'Container Type': 'string', 'Origin': 'string',
+                      'Destination Service Center': 'string', 'Transportation Mode': 'string',
+                      'Origin Latitude': 'float', 'Origin Longitude': 'float',
+                      'Destination Latitude': 'float', 'Destination Longitude': 'float',
+                      'Shipment Weight [kg]': 'float', 'Shipment Volume [m3]': 'float',
+                      'Calculation distance [km]': 'float', 'Distance source': 'string', 'Payload hash': 'string',
+                      'Result source': 'string', 'Emissions [kg]': 'float', 'Error': 'string'}
+
+
+class LegOutputWriter:
+    """
+    Class object writing the result of every calculated leg to a csv or parquet file while the legs are calculated. The
+    legs are appended batch by batch, so the file never needs to be held in memory.
+
+        with LegOutputWriter('./ExcelModels/Leg_emissions_output.parquet') as leg_output:
+            emc.leg_output = leg_output
+            ...
+    """
+
+    def __init__(self, path):
+        """
+        :param path: the path of the csv or parquet file, an existing file is replaced
+        """
+        self.path = path
+        self.extension = os.path.splitext(path)[1].lower()
+        if self.extension not in ['.csv', '.parquet']:
+            raise Exception(f"Unsupported file type {self.extension}")
+
+        self.parquet_writer = None
+        self.number_of_legs = 0
+
+        # start with an empty file
+        if os.path.dirname(path) != '':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def get_output_df(legs_df, stage):
+        """
+        :param legs_df: DataFrame with one row per calculated leg
+        :param stage: the stage that calculated the legs, e.g. 'transportation' or 'repositioning'
+        :return: DataFrame with the columns LEG_OUTPUT_COLUMNS, columns missing in legs_df are left empty
+        """
+
+        output_df = pd.DataFrame(index=range(len(legs_df)))
+        for column, column_type in LEG_OUTPUT_COLUMNS.items():
+            if column == 'Stage':
+                values = np.full(len(legs_df), stage, dtype=object)
+            elif column in legs_df.columns:
+                values = legs_df[column].to_numpy()
+            else:
+                values = np.full(len(legs_df), None, dtype=object)
+
+            # text columns keep None for missing values, number columns NaN
+            if column_type == 'string':
+                output_df[column] = [None if pd.isna(value) else str(value) for value in values]
+            else:
+                output_df[column] = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=float)
+
+        return output_df
+
+    def write(self, legs_df, stage):
+        """
+        Appends the legs to the file
+        :param legs_df: DataFrame with one row per calculated leg
+        :param stage: the stage that calculated the legs, e.g. 'transportation' or 'repositioning'
+        """
+
+        if len(legs_df) == 0:
+            return
+
+        output_df = self.get_output_df(legs_df, stage)
+        if self.extension == '.csv':
+            output_df.to_csv(self.path, mode='a', header=self.number_of_legs == 0, index=False)
+        else:
+            # pyarrow is only imported for parquet output
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self.parquet_writer is None:
+                schema = pa.schema([(column, pa.string() if column_type == 'string' else pa.float64())
+                                    for column, column_type in LEG_OUTPUT_COLUMNS.items()])
+                self.parquet_writer = pq.ParquetWriter(self.path, schema)
+            self.parquet_writer.write_table(pa.Table.from_pandas(output_df, schema=self.parquet_writer.schema,
+                                                                 preserve_index=False))
+
+        self.number_of_legs += len(output_df)
+
+    def close(self):
+        """
+        Finishes the file
+        """
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
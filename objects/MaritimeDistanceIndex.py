@@ -0,0 +1,243 @@
+# import packages
+from concurrent.futures import ProcessPoolExecutor, Future, wait
+import multiprocessing
+import threading
+import pandas as pd
+import time
+import os
+
+from parameters import run_parameters
+from objects.Instrumentation import Instrumentation
+
+
+def compute_searoute_distance(origin_latlong, destination_latlong):
+    """
+    Computes the sea route distance between two ports, runs in the worker processes of the index
+    :param origin_latlong: the origin as lat long pair
+    :param destination_latlong: the destination as lat long pair
+    :return: the distance in km and the seconds it took
+    """
+
+    # searoute loads its network on import, so it is only imported when a distance is not indexed yet
+    import searoute as sr
+
+    # searoute expects long lat pairs
+    start_time = time.perf_counter()
+    distance_km = sr.searoute([origin_latlong[1], origin_latlong[0]], [destination_latlong[1], destination_latlong[0]],
+                              units="km")['properties']['length']
+
+    return distance_km, time.perf_counter() - start_time
+
+
+class MaritimeDistanceIndex:
+    """
+    Class object memoizing sea route distances between ports, optionally persisted as table on disk. Many unknown
+    distances are computed at once in a pool of worker processes, while the legs waiting for them can already run.
+    """
+
+    def __init__(self, path=None, precision=3, instrumentation=None, max_workers=None, min_pool_pairs=None):
+        """
+        :param path: the path of the csv table holding the distances (None to only keep them in memory)
+        :param precision: the number of decimals the port coordinates are rounded to
+        :param instrumentation: the Instrumentation timing the searoute calculations
+        :param max_workers: the number of worker processes computing distances, None for one per core and 0 to compute
+        all distances in the calling thread
+        :param min_pool_pairs: the minimum number of unknown distances computed in the worker processes, fewer are
+        computed in the calling thread
+        """
+        self.path = path
+        self.precision = precision
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        self.max_workers = max_workers if max_workers is not None else run_parameters.distance_process_pool_workers
+        if self.max_workers is None:
+            self.max_workers = os.cpu_count()
+        self.min_pool_pairs = min_pool_pairs if min_pool_pairs is not None else run_parameters.distance_process_pool_min_pairs
+
+        # distances in km keyed by the rounded ports, the table on disk is loaded on first use
+        self.distances = None
+        self.has_new_distances = False
+        self.lock = threading.Lock()
+
+        # futures of the distances in computation keyed like the distances, in the worker processes (started on first
+        # use) or in the thread that requested the distance first
+        self.pending_distances = dict()
+        self.process_pool = None
+
+    def get_key(self, origin_latlong, destination_latlong):
+        """
+        :return: the rounded coordinates of the two ports used as key of the index, the sea route is the same in both
+        directions so both directions share one key
+        """
+        origin_key = (round(float(origin_latlong[0]), self.precision), round(float(origin_latlong[1]), self.precision))
+        destination_key = (round(float(destination_latlong[0]), self.precision),
+                           round(float(destination_latlong[1]), self.precision))
+        return min(origin_key, destination_key) + max(origin_key, destination_key)
+
+    def load(self):
+        """
+        Loads the distance table from disk if it was not loaded yet
+        """
+
+        with self.lock:
+            if self.distances is not None:
+                return
+
+            distances = dict()
+            if self.path is not None and os.path.exists(self.path):
+                df = pd.read_csv(self.path)
+                for row in df.itertuples(index=False):
+                    distances[self.get_key((row[0], row[1]), (row[2], row[3]))] = row[4]
+            self.distances = distances
+
+    def get_distance(self, origin_latlong, destination_latlong):
+        """
+        Looks up the sea route distance between two ports and computes it with searoute if unknown
+        :param origin_latlong: the origin as lat long pair
+        :param destination_latlong: the destination as lat long pair
+        :return: the distance in km
+        """
+
+        self.load()
+
+        key = self.get_key(origin_latlong, destination_latlong)
+
+        # the first request of an unknown distance computes it, the other requests wait for its result
+        with self.lock:
+            distance_km = self.distances.get(key)
+            if distance_km is not None:
+                return distance_km
+            future = self.pending_distances.get(key)
+            is_shared = future is not None
+            if not is_shared:
+                future = Future()
+                self.pending_distances[key] = future
+
+        if is_shared:
+            return future.result()[0]
+
+        self.instrumentation.increment('external_calls', service='searoute')
+        try:
+            future.set_result(compute_searoute_distance(origin_latlong, destination_latlong))
+        except Exception as err:
+            future.set_exception(err)
+        self.finish_distance(key, future)
+
+        return future.result()[0]
+
+    def submit(self, pairs):
+        """
+        Starts computing the distances of all origin destination pairs that are not indexed yet in the worker processes
+        and returns without waiting for them. get_distance waits for the distances that are still computed.
+        :param pairs: list of (origin_latlong, destination_latlong) tuples
+        :return: list of the futures of the computed distances
+        """
+
+        self.load()
+
+        # the unknown pairs are submitted under the lock, so no other thread starts computing them meanwhile
+        with self.lock:
+
+            # each unknown pair only once
+            unknown_pairs = dict()
+            for origin_latlong, destination_latlong in pairs:
+                key = self.get_key(origin_latlong, destination_latlong)
+                if key not in self.distances and key not in self.pending_distances:
+                    unknown_pairs[key] = (origin_latlong, destination_latlong)
+
+            # starting the worker processes only pays off for many distances
+            if len(unknown_pairs) < max(self.min_pool_pairs, 1) or self.max_workers == 0:
+                return []
+
+            # the worker processes are spawned since forking while the legs run in threads is not safe
+            if self.process_pool is None:
+                self.process_pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                        mp_context=multiprocessing.get_context('spawn'))
+
+            futures = dict()
+            for key, (origin_latlong, destination_latlong) in unknown_pairs.items():
+                futures[key] = self.process_pool.submit(compute_searoute_distance, origin_latlong, destination_latlong)
+                self.pending_distances[key] = futures[key]
+
+        # the callbacks take the lock, so they are added after releasing it
+        for key, future in futures.items():
+            self.instrumentation.increment('external_calls', service='searoute')
+            future.add_done_callback(lambda future, key=key: self.finish_distance(key, future))
+
+        return list(futures.values())
+
+    def finish_distance(self, key, future):
+        """
+        Adds a computed distance to the index, failed distances are computed again when needed
+        :param key: the key of the distance
+        :param future: the finished future of the distance and the seconds it took
+        """
+
+        # the distance leaves the pending distances and enters the index at once, so it is not computed twice
+        with self.lock:
+            if self.pending_distances.get(key) is not future:
+                return
+            del self.pending_distances[key]
+            if future.exception() is not None:
+                return
+            distance_km, seconds = future.result()
+            self.distances[key] = distance_km
+            self.has_new_distances = True
+
+        self.instrumentation.observe('external_call_seconds', seconds, service='searoute')
+
+    def wait_for_pending_distances(self):
+        """
+        Waits until all distances computed in the worker processes are added to the index
+        """
+        with self.lock:
+            pending_distances = list(self.pending_distances.items())
+        wait([future for key, future in pending_distances])
+        for key, future in pending_distances:
+            self.finish_distance(key, future)
+
+    def build(self, pairs, wait_for_distances=True):
+        """
+        Computes the distances of all origin destination pairs that are not indexed yet and saves the index
+        :param pairs: list of (origin_latlong, destination_latlong) tuples
+        :param wait_for_distances: if False, return while the distances are computed in the worker processes, the
+        index is saved by the next save
+        """
+
+        futures = self.submit(pairs)
+        if len(futures) > 0 and not wait_for_distances:
+            return
+
+        self.wait_for_pending_distances()
+        for origin_latlong, destination_latlong in pairs:
+            self.get_distance(origin_latlong, destination_latlong)
+
+        self.save()
+
+    def close(self):
+        """
+        Stops the worker processes
+        """
+        with self.lock:
+            if self.process_pool is not None:
+                self.process_pool.shutdown()
+                self.process_pool = None
+
+    def save(self):
+        """
+        Writes the distance table to disk if new distances were computed
+        """
+
+        self.wait_for_pending_distances()
+        with self.lock:
+            if self.path is None or not self.has_new_distances:
+                return
+
+            # create the folder of the index if needed
+            if os.path.dirname(self.path) != '':
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            df = pd.DataFrame([key + (distance_km,) for key, distance_km in self.distances.items()],
+                              columns=['Origin Latitude', 'Origin Longitude', 'Destination Latitude',
+                                       'Destination Longitude', 'Distance [km]'])
+            df.to_csv(self.path, index=False)
+            self.has_new_distances = False
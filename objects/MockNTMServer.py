@@ -0,0 +1,302 @@
+# import packages
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from haversine import haversine
+import argparse
+import threading
+import random
+import json
+import time
+import os
+
+from parameters import run_parameters
+from objects.ResultCache import ResultCache
+from objects.DistanceProvider import make_distance_key
+from objects.EmissionsCalculator import EmissionsCalculator
+from parameters.authenfitication_parameters import NTM_authentification_settings
+
+# CO2 emissions in kg per tonne-kilometre of each NTM calculation object, used for queries without recorded response
+SYNTHETIC_EMISSION_FACTORS = {'rigid_truck_7_5_t': 0.12,
+                              'freight_aircraft': 0.6,
+                              'belly_freighter_cargo': 0.8,
+                              'container_ship': 0.015}
+
+# path of the distance matrix endpoint below the Google Maps base url
+DISTANCE_MATRIX_PATH = '/maps/api/distancematrix/json'
+
+
+class MockNTMServer:
+    """
+    Class object running a local stand-in of the NTM transport activity API, the NTM token endpoint and the Google Maps
+    distance matrix. Recorded responses are replayed, queries without recorded response get a synthetic response, and
+    latency and errors can be injected so that runs are reproducible without network.
+
+    Usage:
+        with MockNTMServer(MockNTMServer.load_fixtures(path), latency_seconds=0.2) as server:
+            run_parameters.offline_server_url = server.url
+    """
+
+    def __init__(self, fixtures=None, latency_seconds=0, latency_jitter_seconds=0, error_rate=0, error_status=503,
+                 synthesize_missing=True, host='127.0.0.1', port=0, seed=0, token_expires_in=300):
+        """
+        :param fixtures: dict with the recorded 'transport activities' and 'distances', see load_fixtures
+        :param latency_seconds: the latency added to every response
+        :param latency_jitter_seconds: the maximum random latency added on top
+        :param error_rate: the share of responses replaced by an error
+        :param error_status: the HTTP status code of injected errors
+        :param synthesize_missing: answer queries without recorded response with synthetic values, otherwise with 404
+        :param host: the host the server listens on
+        :param port: the port the server listens on (0 for any free port)
+        :param seed: the seed of the random latency and errors
+        :param token_expires_in: the lifetime of the access tokens in seconds
+        """
+        fixtures = fixtures if fixtures is not None else dict()
+        self.transport_activities = fixtures.get('transport activities', dict())
+        self.distances = fixtures.get('distances', dict())
+        self.latency_seconds = latency_seconds
+        self.latency_jitter_seconds = latency_jitter_seconds
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.synthesize_missing = synthesize_missing
+        self.token_expires_in = token_expires_in
+
+        # the random numbers are drawn by concurrent handlers
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        # number of requests and injected errors per endpoint
+        self.request_counts = {'token': 0, 'transport activities': 0, 'distance matrix': 0}
+        self.error_counts = {'token': 0, 'transport activities': 0, 'distance matrix': 0}
+
+        self.token_path = NTM_authentification_settings['tokenEndPointPath']
+        self.transport_activities_path = urlparse(run_parameters.NTM_transport_activities_url).path
+
+        self.server = ThreadingHTTPServer((host, port), self.create_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """
+        Starts serving in a background thread
+        :return: the url of the server
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def load_fixtures(path):
+        """
+        Loads recorded responses from a json file
+        :return: dict with the recorded 'transport activities' keyed by EmissionsCalculator.make_transport_activity_key
+        and the recorded 'distances' in km keyed by make_distance_key
+        """
+        with open(path) as file:
+            return json.load(file)
+
+    @staticmethod
+    def record_fixtures(path, ntm_cache_path=None, distance_cache_path=None):
+        """
+        Writes the responses recorded in the NTM cache and the distance cache of the live services to a fixtures file,
+        the synthetic results of runs against the stand-in are in separate caches and are not recorded
+        :return: the number of recorded transport activities and distances
+        """
+
+        ntm_cache_path = ntm_cache_path if ntm_cache_path is not None else run_parameters.NTM_cache_path
+        distance_cache_path = distance_cache_path if distance_cache_path is not None else run_parameters.distance_cache_path
+
+        fixtures = {'transport activities': dict(ResultCache(ntm_cache_path).items()) if os.path.exists(ntm_cache_path) else dict(),
+                    'distances': {key: distance_km for key, distance_km in ResultCache(distance_cache_path).items()
+                                  if key.startswith('google:')} if os.path.exists(distance_cache_path) else dict()}
+
+        if os.path.dirname(path) != '':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(fixtures, file)
+
+        return len(fixtures['transport activities']), len(fixtures['distances'])
+
+    def inject(self, endpoint):
+        """
+        Waits for the injected latency and decides whether the response is replaced by an error
+        :param endpoint: the name of the endpoint
+        :return: True if an error is injected
+        """
+
+        with self.lock:
+            self.request_counts[endpoint] += 1
+            latency_seconds = self.latency_seconds + self.random.uniform(0, self.latency_jitter_seconds)
+            is_error = self.random.random() < self.error_rate
+            self.error_counts[endpoint] += int(is_error)
+
+        time.sleep(latency_seconds)
+        return is_error
+
+    def create_token_response(self):
+        """
+        :return: the json response of the token endpoint, any credentials are accepted
+        """
+        return 200, {'access_token': f"offline-access-token-{self.request_counts['token']}",
+                     'expires_in': self.token_expires_in,
+                     'refresh_token': f"offline-refresh-token-{self.request_counts['token']}",
+                     'refresh_expires_in': 10*self.token_expires_in,
+                     'token_type': 'Bearer'}
+
+    def create_transport_activity_response(self, query):
+        """
+        Replays the recorded response of a transport activity query or synthesizes one
+        :param query: the json body of the request
+        :return: the status code and the json response
+        """
+
+        calculation_object_id = query['calculationObject']['id']
+        key = EmissionsCalculator.make_transport_activity_key(calculation_object_id, query['parameters'])
+        if key in self.transport_activities:
+            return 200, self.transport_activities[key]
+        if not self.synthesize_missing or calculation_object_id not in SYNTHETIC_EMISSION_FACTORS:
+            return 404, {'error': 'No recorded response for this query'}
+
+        # tonne-kilometres of the shipment, air freight based on the chargeable weight
+        parameters = {parameter['id']: parameter for parameter in query['parameters']}
+        if 'transport_effort' in parameters:
+            tonne_kilometres = float(parameters['transport_effort']['value'])
+        else:
+            weight_ton = float(parameters['shipment_weight']['value'])
+            if parameters['shipment_weight'].get('unit') == 'kg':
+                weight_ton = weight_ton / 1000
+            if 'commercial_volumetric_factor' in parameters:
+                weight_ton = max(weight_ton, float(parameters['shipment_volume']['value']) *
+                                 float(parameters['commercial_volumetric_factor']['value']) / 1000)
+            tonne_kilometres = weight_ton * float(parameters['distance']['value'])
+
+        co2_kg = SYNTHETIC_EMISSION_FACTORS[calculation_object_id] * tonne_kilometres
+        return 200, {'resultTable': {'index': {'co2_total': 0}, 'totals': [{'id': 'co2_total', 'value': co2_kg, 'unit': 'kg'}]}}
+
+    def create_distance_matrix_response(self, query):
+        """
+        Replays the recorded distances of a distance matrix query or estimates them from the great-circle distance
+        :param query: dict with the parsed query string of the request
+        :return: the status code and the json response
+        """
+
+        origins = [tuple(float(value) for value in point.split(',')) for point in query['origins'][0].split('|')]
+        destinations = [tuple(float(value) for value in point.split(',')) for point in query['destinations'][0].split('|')]
+
+        rows = []
+        for origin in origins:
+            elements = []
+            for destination in destinations:
+                distance_km = self.distances.get(make_distance_key('google', origin, destination,
+                                                                   run_parameters.distance_cache_precision))
+                if distance_km is None and self.synthesize_missing:
+                    distance_km = haversine(origin, destination) * run_parameters.road_circuity_factor
+
+                if distance_km is None:
+                    elements.append({'status': 'NOT_FOUND'})
+                else:
+                    elements.append({'status': 'OK',
+                                     'distance': {'text': f"{round(distance_km)} km", 'value': round(distance_km * 1000)},
+                                     'duration': {'text': '', 'value': round(distance_km * 60)}})
+            rows.append({'elements': elements})
+
+        return 200, {'status': 'OK',
+                     'origin_addresses': [query['origins'][0]] * len(origins),
+                     'destination_addresses': [query['destinations'][0]] * len(destinations),
+                     'rows': rows}
+
+    def create_handler(self):
+        """
+        :return: the request handler class routing the requests to this server
+        """
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def send_json(self, status, response):
+                body = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+                if path == server.token_path:
+                    endpoint = 'token'
+                elif path == server.transport_activities_path:
+                    endpoint = 'transport activities'
+                else:
+                    return self.send_json(404, {'error': f"Unknown path {path}"})
+
+                if server.inject(endpoint):
+                    return self.send_json(server.error_status, {'error': 'Injected error'})
+
+                if endpoint == 'token':
+                    return self.send_json(*server.create_token_response())
+                if not self.headers.get('Authorization', '').startswith('Bearer '):
+                    return self.send_json(401, {'error': 'Missing access token'})
+                self.send_json(*server.create_transport_activity_response(json.loads(body)))
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != DISTANCE_MATRIX_PATH:
+                    return self.send_json(404, {'error': f"Unknown path {url.path}"})
+
+                if server.inject('distance matrix'):
+                    return self.send_json(server.error_status, {'status': 'UNKNOWN_ERROR'})
+                self.send_json(*server.create_distance_matrix_response(parse_qs(url.query)))
+
+            def log_message(self, format, *args):
+                # keep the output of benchmarks readable
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Runs a local stand-in of the NTM API, the NTM token endpoint and '
+                                                 'the Google Maps distance matrix')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fixtures', default=run_parameters.offline_fixtures_path,
+                        help='json file with the recorded responses to replay')
+    parser.add_argument('--record', action='store_true',
+                        help='write the responses in the NTM and distance caches to the fixtures file and exit')
+    parser.add_argument('--latency', type=float, default=0, help='latency in seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0, help='maximum random latency in seconds added on top')
+    parser.add_argument('--error-rate', type=float, default=0, help='share of responses replaced by an error')
+    parser.add_argument('--strict', action='store_true',
+                        help='answer queries without recorded response with 404 instead of synthetic values')
+    args = parser.parse_args()
+
+    if args.record:
+        number_of_transport_activities, number_of_distances = MockNTMServer.record_fixtures(args.fixtures)
+        print(f"Recorded {number_of_transport_activities} transport activities and {number_of_distances} distances.")
+    else:
+        fixtures = MockNTMServer.load_fixtures(args.fixtures) if os.path.exists(args.fixtures) else None
+        server = MockNTMServer(fixtures, latency_seconds=args.latency, latency_jitter_seconds=args.jitter,
+                               error_rate=args.error_rate, synthesize_missing=not args.strict, port=args.port)
+        print(f"Serving on {server.url}, set offline_server_url in run_parameters.py to use it.")
+        try:
+            server.server.serve_forever()
+        except KeyboardInterrupt:
+            server.server.server_close()
@@ -1,23 +1,41 @@
 # import packages
 import time as time
-import requests
+import threading
 import base64
 
+from objects.Instrumentation import Instrumentation
+from objects.RetryPolicy import post_with_retries
+
 
 class Auth:
     """
     Class object getting the authorization token and start/end sessions
     """
 
-    def __init__(self, settings):
+    def __init__(self, settings, server_url=None, instrumentation=None, rate_limiter=None):
+        """
+        :param settings: the NTM authentification settings
+        :param server_url: the url of the authorization server, by default https:// and the authServer of the settings
+        :param instrumentation: the Instrumentation counting the token requests, a new one by default
+        :param rate_limiter: the RateLimiter of the token endpoint
+        """
         self.settings = settings
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        self.rate_limiter = rate_limiter
+        self.server_url = server_url if server_url is not None else f"https://{self.settings['authServer']}"
         self.auth_response = None
         self.access_token_expiration = Expiration()
         self.refresh_token_expiration = Expiration()
         self.basic_authorization = base64.b64encode(
             f"{self.settings['clientId']}:{self.settings['clientSecret']}".encode()).decode()
+        # only one thread at a time may check or renew the token so that concurrent legs share one login
+        self.lock = threading.Lock()
 
     def get_access_token(self):
+        with self.lock:
+            return self._get_access_token()
+
+    def _get_access_token(self):
         # At the initial acquire of an access token or when the refresh token has expired:
         # - prepare parameters to acquire an access token with user credentials (grant_type=password)
         # - set the authorization header to contain the client id and client secret, encoded for basic authorization
@@ -27,7 +45,6 @@ class Auth:
                 'username': self.settings['userName'],
                 'password': self.settings['passWord']
             }
-            print('Using credentials to get new access token.')
         # When access token has expired:
         # - prepare parameters to acquire an access token with a refresh token (grant_type=refresh_token)
         # - set the authorization header to contain the client id and client secret, encoded for basic authorization
@@ -36,32 +53,37 @@ class Auth:
                 'grant_type': 'refresh_token',
                 'refresh_token': self.auth_response['refresh_token']
             }
-            print('Using refresh token to renew expired access token.')
         # When the existing acces token is still valid:
         # - just return it
         else:
-            print('Using the existing access token.')
-            print(f"Access token expires in: {self.access_token_expiration.time_to_expiration()}")
-            print(f"Refresh token expires in: {self.refresh_token_expiration.time_to_expiration()}")
+            self.instrumentation.increment('token_requests', grant='existing token')
             return self.auth_response['access_token']
+        self.instrumentation.increment('token_requests', grant=parameters['grant_type'])
+        # requests is only imported when a token is needed, runs answered from the caches never load it
+        import requests
         # Send a POST request to the token end point with the prepared parameters and authorization header
         authorization = {'Authorization': f"Basic {self.basic_authorization}",
                          'Content-Type': 'application/x-www-form-urlencoded'}
 
-        res = requests.post(f"https://{self.settings['authServer']}{self.settings['tokenEndPointPath']}",
-                            data=parameters,
-                            headers=authorization)
+        with self.instrumentation.timer('external_call_seconds', service='ntm token'):
+            res = post_with_retries(requests.post, f"{self.server_url}{self.settings['tokenEndPointPath']}",
+                                    instrumentation=self.instrumentation, service='ntm token',
+                                    rate_limiter=self.rate_limiter,
+                                    data=parameters,
+                                    headers=authorization)
         # If the request was successful, update the auth_response, access_token_expiration, and refresh_token_expiration properties with the values from the response
         if res.status_code == 200:
             self.auth_response = res.json()
             self.access_token_expiration.set_expiration_time(self.auth_response['expires_in'])
             self.refresh_token_expiration.set_expiration_time(self.auth_response['refresh_expires_in'])
             return self.auth_response['access_token']
+        self.instrumentation.increment('failures', service='ntm token')
 
     def end_session(self):
         if not hasattr(self, 'authResponse'):
             return "Never logged in"
-        res = requests.post(f'https://{self.settings["authServer"]}{self.settings["logoutEndPointPath"]}',
+        import requests
+        res = requests.post(f'{self.server_url}{self.settings["logoutEndPointPath"]}',
                             data=f'refresh_token={self.authResponse["refresh_token"]}',
                             headers={'Authorization': f'Basic {self.basicAuthorization}',
                                      'Content-Type': 'application/x-www-form-urlencoded'})
@@ -0,0 +1,160 @@
+# import packages
+import pandas as pd
+import os
+
+from parameters import run_parameters
+from objects.WorkbookLoader import WORKBOOK_SCHEMAS
+
+
+def iter_provisioning_chunks(path, chunk_rows=None):
+    """
+    Reads the provisioning legs from a csv or parquet file in chunks
+    :param path: the path of a file with the columns of 'Script input provisioning data'
+    :param chunk_rows: the number of rows per chunk
+    :return: generator of DataFrames with at most chunk_rows rows
+    """
+
+    chunk_rows = chunk_rows if chunk_rows is not None else run_parameters.provisioning_stream_chunk_rows
+    columns = WORKBOOK_SCHEMAS['Script input provisioning data']
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+    elif extension == '.parquet':
+        # pyarrow is only imported for parquet histories
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        raise Exception(f"Unsupported file type {extension}")
+
+
+class StreamingRepositioningCalculator:
+    """
+    Class object calculating the repositioning emissions of the new shipment from a provisioning history that does not
+    fit into memory. The history is read in chunks, the provisioning legs are calculated in bounded batches and only the
+    totals are kept.
+    """
+
+    def __init__(self, emissions_calculator, chunk_rows=None, batch_legs=None):
+        """
+        :param emissions_calculator: the EmissionsCalculator with the transportation dict of the new shipment created
+        :param chunk_rows: the number of rows read from the file at once
+        :param batch_legs: the number of provisioning legs calculated at once
+        """
+        self.emissions_calculator = emissions_calculator
+        self.chunk_rows = chunk_rows if chunk_rows is not None else run_parameters.provisioning_stream_chunk_rows
+        self.batch_legs = batch_legs if batch_legs is not None else run_parameters.provisioning_stream_batch_legs
+
+        # totals of the last run
+        self.number_of_outgoing_shipments = 0
+        self.number_of_legs = 0
+        self.number_of_failed_legs = 0
+
+    def iter_repositioning_batches(self, chunks):
+        """
+        Filters the provisioning legs to the origin service center of the new shipment and counts the outgoing shipments
+        :param chunks: iterable of DataFrames with the columns of 'Script input provisioning data'
+        :return: generator of DataFrames with at most batch_legs repositioning legs
+        """
+
+        shipment_parameters = self.emissions_calculator.transport_dict['new shipment']['shipment parameters']
+
+        batch = []
+        number_of_buffered_legs = 0
+        for df in chunks:
+
+            # only take the subset of repositioning data that matches the container type
+            df = df[df['Container Type'] == shipment_parameters['Container Type']]
+
+            # count the outgoing shipments of the origin service center
+            self.number_of_outgoing_shipments += df.loc[df['Origin'] == shipment_parameters['Origin Service Center'],
+                                                        'Number of containers shipped'].sum()
+
+            # repositioning shipments with the same destination as our origin service center
+            df = df[(df['Destination Service Center'] == shipment_parameters['Origin Service Center']) &
+                    (df['Shipment Type'] == 'Provisioning') &
+                    (df['Transportation Mode'].isin(['Road', 'Air', 'Maritime']))]
+
+            # split the legs into batches of batch_legs legs
+            while len(df) > 0:
+                batch.append(df.iloc[:self.batch_legs - number_of_buffered_legs])
+                number_of_buffered_legs += len(batch[-1])
+                df = df.iloc[len(batch[-1]):]
+
+                if number_of_buffered_legs == self.batch_legs:
+                    yield pd.concat(batch)
+                    batch = []
+                    number_of_buffered_legs = 0
+
+        if number_of_buffered_legs > 0:
+            yield pd.concat(batch)
+
+    def calculate_batch_emissions(self, df_repositioning):
+        """
+        Calculates the emissions of a batch of repositioning legs
+        :param df_repositioning: DataFrame with the repositioning legs
+        :return: the sum of the emissions of the legs
+        """
+
+        emc = self.emissions_calculator
+        shipment_parameters = emc.transport_dict['new shipment']['shipment parameters']
+
+        # get nominal weight and volume for containers
+        weight_per_empty_container = shipment_parameters['Empty Container Weight [kg]']/\
+                                     shipment_parameters['Number of containers shipped']
+        outer_volume_per_container = shipment_parameters['Shipment Volume [m3]']/\
+                                     shipment_parameters['Number of containers shipped']
+
+        # retrieve the shipment data of the empty containers
+        df_repositioning = df_repositioning.assign(**{
+            'Shipment Weight [kg]': df_repositioning['Number of containers shipped']*weight_per_empty_container,
+            'Shipment Volume [m3]': df_repositioning['Number of containers shipped']*outer_volume_per_container,
+            'Distance [km]': df_repositioning['Distance [km] (if available)'].where(
+                df_repositioning['Distance [km] (if available)']>0)})
+
+        # resolve the missing road distances of the batch in bulk
+        known_keys = set(emc.road_distances)
+        df_repositioning = emc.resolve_road_distances(df_repositioning)
+
+        legs_df = emc.batch_engine.calculate_leg_emissions(df_repositioning, emc.transport_dict['repositioning'])
+        emc.write_leg_results(legs_df, 'repositioning')
+
+        # forget the road distances and the finished NTM requests of the batch so that memory stays flat however long
+        # the history is, lanes repeated in later batches are answered by the distance and NTM caches
+        for key in set(emc.road_distances) - known_keys:
+            del emc.road_distances[key]
+        emc.coalescer.clear_completed()
+        self.number_of_legs += len(legs_df)
+        self.number_of_failed_legs += int(legs_df['Error'].notna().sum())
+
+        return emc.sum_emissions(legs_df['Emissions [kg]'])
+
+    def calculate_repositioning_emissions(self, path):
+        """
+        Calculate the emissions from repositioning/provisioning from a provisioning history file
+        :param path: the path of a csv or parquet file with the columns of 'Script input provisioning data'
+        :return: the emissions created by repositioning/provisioning and attributed to the new shipment
+        """
+
+        emc = self.emissions_calculator
+        number_of_containers = emc.transport_dict['new shipment']['shipment parameters']['Number of containers shipped']
+
+        self.number_of_outgoing_shipments = 0
+        self.number_of_legs = 0
+        self.number_of_failed_legs = 0
+
+        # accumulate the emissions batch by batch
+        repositioning_emissions = 0
+        for df_repositioning in self.iter_repositioning_batches(iter_provisioning_chunks(path, self.chunk_rows)):
+            repositioning_emissions += self.calculate_batch_emissions(df_repositioning)
+
+        # keep the sea route distances computed in this run
+        emc.maritime_distance_index.save()
+
+        # the new shipment is part of the outgoing shipments
+        self.number_of_outgoing_shipments += number_of_containers
+        print(f"Calculated {self.number_of_legs} provisioning legs, {self.number_of_failed_legs} failed.")
+
+        # compute repositioning emissions per container shipment and attribute them to the new shipment
+        return repositioning_emissions/self.number_of_outgoing_shipments*number_of_containers
@@ -0,0 +1,71 @@
+# import packages
+import numpy as np
+import json
+
+
+class QueryTemplate:
+    """
+    Class object holding the NTM query of a transportation mode and parameter configuration with the parameters that
+    are the same for every leg serialized once. Creating the query of a leg only fills in its weight, volume and
+    distance. The parameters of the template are shared by all queries and must not be changed.
+    """
+    __slots__ = ('transportation_mode', 'calculation_object_id', 'parameters', 'variable_positions')
+
+    def __init__(self, transportation_mode, calculation_object_id, parameters):
+        """
+        :param transportation_mode: 'Road', 'Air' or 'Maritime'
+        :param calculation_object_id: the id of the NTM calculation object
+        :param parameters: the list of API parameters, the values of the leg dependent parameters are filled per leg
+        """
+        self.transportation_mode = transportation_mode
+        self.calculation_object_id = calculation_object_id
+        self.parameters = parameters
+
+        # positions of the leg dependent parameters
+        variable_ids = {'Air': ['shipment_volume', 'shipment_weight', 'distance'],
+                        'Road': ['transport_effort'],
+                        'Maritime': ['shipment_weight', 'distance']}[transportation_mode]
+        self.variable_positions = {parameter['id']: position for position, parameter in enumerate(parameters)
+                                   if parameter['id'] in variable_ids}
+
+    @staticmethod
+    def get_configuration_key(transportation_mode, parameter_dict):
+        """
+        :return: key identifying the NTM parameters of a transportation mode in a parameter dict
+        """
+        return transportation_mode, json.dumps(parameter_dict['NTM parameters'][transportation_mode], sort_keys=True,
+                                               default=str)
+
+    def get_values(self, shipment_weight_kg, shipment_volume_m3, distance_km):
+        """
+        :return: dict with the value of each leg dependent parameter
+        """
+
+        if self.transportation_mode == 'Air':
+            return {'shipment_volume': str(np.around(shipment_volume_m3, 2)),
+                    'shipment_weight': str(np.around(shipment_weight_kg, 2)),
+                    'distance': str(np.around(distance_km, 2))}
+
+        if self.transportation_mode == 'Road':
+            # the tonne-kilometres of the shipment
+            return {'transport_effort': str(np.around(distance_km * (shipment_weight_kg / 1000), 2))}
+
+        # the weight in tons
+        return {'shipment_weight': str(shipment_weight_kg / 1000),
+                'distance': str(distance_km)}
+
+    def create_query(self, shipment_weight_kg, shipment_volume_m3, distance_km):
+        """
+        Creates the NTM query of a leg
+        :param shipment_weight_kg: the weight of the shipment
+        :param shipment_volume_m3: the volume of the shipment
+        :param distance_km: the distance of the leg
+        :return: the id of the calculation object and the list of API parameters
+        """
+
+        API_parameters = list(self.parameters)
+        for parameter_id, value in self.get_values(shipment_weight_kg, shipment_volume_m3, distance_km).items():
+            position = self.variable_positions[parameter_id]
+            API_parameters[position] = dict(self.parameters[position], value=value)
+
+        return self.calculation_object_id, API_parameters
@@ -0,0 +1,187 @@
+# import packages
+import threading
+import asyncio
+import time
+
+from parameters import run_parameters
+from objects.Instrumentation import Instrumentation
+
+
+def create_rate_limiters(instrumentation=None):
+    """
+    Creates the rate limiters of the external services with the quotas in run_parameters.rate_limits, shared by all
+    requests of an EmissionsCalculator, its authentification and its road distance provider
+    :param instrumentation: the Instrumentation reporting the waiting time and the concurrency limits
+    :return: dict with the RateLimiter of each service, empty if rate limiting is switched off or the requests are
+    sent to the local stand-in of the services, which has no quota
+    """
+
+    if not run_parameters.use_rate_limiter or run_parameters.offline_server_url is not None:
+        return dict()
+
+    return {service: RateLimiter(service, instrumentation=instrumentation, **quota)
+            for service, quota in run_parameters.rate_limits.items()}
+
+
+class RateLimiter:
+    """
+    Class object limiting the requests to an external service with a token bucket and adapting the number of requests
+    in flight: the limit grows by one per round of successful requests and is halved when the service answers with rate
+    limits (429), server errors (5xx) or connection errors, or when the latency rises well above the lowest observed
+    latency. Rate limits also reduce the request rate, which recovers with the following successful requests.
+
+        rate_limiter.acquire()
+        start_time = time.perf_counter()
+        res = session.post(...)
+        rate_limiter.release(res.status_code, time.perf_counter() - start_time)
+    """
+
+    def __init__(self, service, requests_per_second, burst=None, max_concurrency=None, min_concurrency=1,
+                 latency_tolerance=None, instrumentation=None):
+        """
+        :param service: the name of the service in the instrumentation
+        :param requests_per_second: the quota of the service, the rate the tokens are added to the bucket
+        :param burst: the size of the bucket, the number of requests that can be sent at once, by default one second
+        of requests
+        :param max_concurrency: the maximum number of requests in flight
+        :param min_concurrency: the minimum number of requests in flight the limit is reduced to
+        :param latency_tolerance: the factor of the lowest observed latency above which the limit is reduced
+        :param instrumentation: the Instrumentation reporting the waiting time and the concurrency limit
+        """
+        self.service = service
+        self.max_requests_per_second = requests_per_second
+        self.requests_per_second = requests_per_second
+        self.burst = burst if burst is not None else max(1, requests_per_second)
+        self.max_concurrency = max_concurrency if max_concurrency is not None else run_parameters.NTM_max_concurrent_requests
+        self.min_concurrency = min_concurrency
+        self.latency_tolerance = latency_tolerance if latency_tolerance is not None else \
+            run_parameters.rate_limiter_latency_tolerance
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+
+        # the bucket starts full
+        self.tokens = self.burst
+        self.last_refill = time.monotonic()
+
+        # requests in flight and their adaptive limit, starting at the maximum
+        self.concurrency_limit = float(self.max_concurrency)
+        self.in_flight = 0
+
+        # no requests are sent until paused_until, e.g. after a 429 with Retry-After
+        self.paused_until = 0
+
+        # the lowest and the smoothed latency of successful requests
+        self.min_latency_seconds = None
+        self.latency_seconds = None
+
+        # the limit is reduced at most once per smoothed latency, so a burst of failures counts as one
+        self.last_decrease = 0
+
+        self.condition = threading.Condition()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.requests_per_second)
+        self.last_refill = now
+
+    def try_acquire(self):
+        """
+        Takes a token and a slot for a request if both are available
+        :return: 0 if the request may be sent, otherwise the seconds to wait before trying again
+        """
+
+        with self.condition:
+            now = time.monotonic()
+            self.refill(now)
+
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.in_flight >= int(self.concurrency_limit):
+                # released slots notify the waiting threads
+                return 0.05
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.requests_per_second
+
+            self.tokens -= 1
+            self.in_flight += 1
+            return 0
+
+    def acquire(self):
+        """
+        Waits until a request may be sent
+        """
+
+        start_time = time.perf_counter()
+        wait_seconds = self.try_acquire()
+        while wait_seconds > 0:
+            with self.condition:
+                self.condition.wait(wait_seconds)
+            wait_seconds = self.try_acquire()
+
+        self.instrumentation.observe('rate_limiter_wait_seconds', time.perf_counter() - start_time, service=self.service)
+
+    async def acquire_async(self):
+        """
+        Waits until a request may be sent without blocking the event loop
+        """
+
+        start_time = time.perf_counter()
+        wait_seconds = self.try_acquire()
+        while wait_seconds > 0:
+            await asyncio.sleep(wait_seconds)
+            wait_seconds = self.try_acquire()
+
+        self.instrumentation.observe('rate_limiter_wait_seconds', time.perf_counter() - start_time, service=self.service)
+
+    def release(self, status_code=None, latency_seconds=None, retry_after_seconds=None):
+        """
+        Frees the slot of a finished request and adapts the limits to its outcome
+        :param status_code: the HTTP status code of the response, None if the request failed without response
+        :param latency_seconds: the duration of the request
+        :param retry_after_seconds: the Retry-After of a 429 response, no requests are sent until then
+        """
+
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+
+            is_throttled = status_code is None or status_code == 429 or status_code >= 500
+            if is_throttled:
+                self.decrease(now)
+
+                # the quota was exceeded, slow down the request rate as well
+                if status_code == 429:
+                    self.requests_per_second = max(self.max_requests_per_second / 10, self.requests_per_second / 2)
+                    if retry_after_seconds is not None:
+                        self.paused_until = max(self.paused_until, now + retry_after_seconds)
+                    self.instrumentation.increment('rate_limited', service=self.service)
+
+            elif latency_seconds is not None:
+                self.min_latency_seconds = latency_seconds if self.min_latency_seconds is None else \
+                    min(self.min_latency_seconds, latency_seconds)
+                self.latency_seconds = latency_seconds if self.latency_seconds is None else \
+                    0.8 * self.latency_seconds + 0.2 * latency_seconds
+
+                # the service queues the requests, fewer in flight give the same throughput
+                if self.latency_seconds > self.latency_tolerance * self.min_latency_seconds:
+                    self.decrease(now)
+                else:
+                    # add one request in flight per round of successful requests and recover the rate
+                    self.concurrency_limit = min(self.max_concurrency,
+                                                 self.concurrency_limit + 1 / self.concurrency_limit)
+                    self.requests_per_second = min(self.max_requests_per_second,
+                                                   self.requests_per_second + self.max_requests_per_second / 100)
+
+            self.condition.notify_all()
+
+        self.instrumentation.set_gauge('concurrency_limit', int(self.concurrency_limit), service=self.service)
+
+    def decrease(self, now):
+        """
+        Halves the concurrency limit, at most once per smoothed latency
+        """
+        if now - self.last_decrease < (self.latency_seconds or 0):
+            return
+        self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit / 2)
+        self.last_decrease = now
+
+        # measure the latency again at the lower limit
+        self.latency_seconds = self.min_latency_seconds
@@ -0,0 +1,94 @@
+# import packages
+from concurrent.futures import Future
+import threading
+
+from objects.Instrumentation import Instrumentation
+
+
+class RequestCoalescer:
+    """
+    Class object sharing the result of identical requests within a run. The first request of a key is calculated, the
+    requests of the same key arriving while it is in flight wait for its result and later requests reuse it. Failed
+    requests are not kept, so a later identical request is calculated again.
+
+    The results are kept until they are cleared, so callers running many batches or runs with one coalescer call
+    clear_completed after each batch (or clear after each run) to keep its memory bounded.
+
+        emissions_kg = coalescer.call('legs', key, emc.calculate_road_freight_emissions, ...)
+    """
+
+    def __init__(self, instrumentation=None):
+        """
+        :param instrumentation: the Instrumentation counting the calculated and shared requests
+        """
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+
+        # futures of the requests keyed by the kind and key of the request
+        self.futures = dict()
+        self.lock = threading.Lock()
+
+        # number of requests and shared requests per kind
+        self.statistics = dict()
+
+    def call(self, kind, key, function, *args, **kwargs):
+        """
+        Returns the result of an identical request of the run or calculates it
+        :param kind: the kind of request, e.g. 'legs' or 'distances'
+        :param key: the hashable key identifying identical requests
+        :param function: the function calculating the result, failed requests raise
+        :return: the result of the function
+        """
+
+        with self.lock:
+            future = self.futures.get((kind, key))
+            is_shared = future is not None
+            if not is_shared:
+                future = Future()
+                self.futures[(kind, key)] = future
+
+            statistics = self.statistics.setdefault(kind, {'requests': 0, 'shared': 0})
+            statistics['requests'] += 1
+            statistics['shared'] += int(is_shared)
+
+        self.instrumentation.increment('coalesced_requests', kind=kind, result='shared' if is_shared else 'calculated')
+
+        # wait for the identical request in flight or take its result
+        if is_shared:
+            return future.result()
+
+        try:
+            result = function(*args, **kwargs)
+        except Exception as err:
+            self.forget(kind, key)
+            future.set_exception(err)
+            raise
+
+        future.set_result(result)
+
+        return result
+
+    def forget(self, kind, key):
+        with self.lock:
+            self.futures.pop((kind, key), None)
+
+    def clear_completed(self):
+        """
+        Forgets the results of the finished requests, the requests in flight are still shared. The statistics are kept.
+        """
+        with self.lock:
+            self.futures = {key: future for key, future in self.futures.items() if not future.done()}
+
+    def clear(self):
+        """
+        Forgets all results, e.g. at the start of a new run of a long-running service
+        """
+        with self.lock:
+            self.futures = dict()
+            self.statistics = dict()
+
+    def get_dedup_ratio(self, kind):
+        """
+        :return: the share of requests of a kind that were answered by an identical request
+        """
+        statistics = self.statistics.get(kind, {'requests': 0, 'shared': 0})
+        return statistics['shared'] / statistics['requests'] if statistics['requests'] > 0 else 0
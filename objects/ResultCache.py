@@ -0,0 +1,117 @@
+# import packages
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import os
+
+
+class ResultCache:
+    """
+    Class object storing results of external queries on disk, keyed by a hash of the query
+    """
+
+    def __init__(self, path, ttl_seconds=None, max_entries=None):
+        """
+        :param path: the path of the sqlite file holding the cache
+        :param ttl_seconds: the time after which an entry expires (None for no expiration)
+        :param max_entries: the maximum number of entries, the least recently used entries are evicted first
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        # statistics of the current run
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0
+
+        # create the folder of the cache if needed
+        if os.path.dirname(path) != '':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # the connection is shared between threads, the lock makes sure only one uses it at a time
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, "
+                                "created REAL, last_access REAL, latency REAL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access)")
+
+        # remove expired entries from previous runs
+        with self.lock:
+            if self.ttl_seconds is not None:
+                self.connection.execute("DELETE FROM cache WHERE created < ?", (time.time() - self.ttl_seconds,))
+            self.number_of_entries = self.connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    @staticmethod
+    def make_key(query):
+        """
+        Creates the canonical hash of a query
+        :param query: json serializable query
+        :return: the hex digest of the query
+        """
+        canonical_query = json.dumps(query, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical_query.encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Looks up a cached result
+        :param key: the key of the query
+        :return: the cached result or None if not cached or expired
+        """
+
+        with self.lock:
+            row = self.connection.execute("SELECT value, created, latency FROM cache WHERE key = ?", (key,)).fetchone()
+
+            if row is None or (self.ttl_seconds is not None and row[1] < time.time() - self.ttl_seconds):
+                self.misses += 1
+                return None
+
+            # mark the entry as recently used
+            self.connection.execute("UPDATE cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            self.saved_seconds += row[2]
+
+        return json.loads(row[0])
+
+    def set(self, key, value, latency_seconds=0):
+        """
+        Stores a result
+        :param key: the key of the query
+        :param value: the json serializable result
+        :param latency_seconds: the time it took to get the result, reported as saved time on later hits
+        """
+
+        now = time.time()
+        with self.lock:
+            is_new = self.connection.execute("SELECT 1 FROM cache WHERE key = ?", (key,)).fetchone() is None
+            self.connection.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                                    (key, json.dumps(value), now, now, latency_seconds))
+            self.number_of_entries += int(is_new)
+
+            # evict the least recently used entries if the cache is full
+            if self.max_entries is not None and self.number_of_entries > self.max_entries:
+                self.connection.execute("DELETE FROM cache WHERE key IN (SELECT key FROM cache "
+                                        "ORDER BY last_access LIMIT ?)", (self.number_of_entries - self.max_entries,))
+                self.number_of_entries = self.connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def items(self):
+        """
+        :return: list with the key and result of all entries that have not expired
+        """
+
+        with self.lock:
+            rows = self.connection.execute("SELECT key, value, created FROM cache").fetchall()
+
+        return [(key, json.loads(value)) for key, value, created in rows
+                if self.ttl_seconds is None or created >= time.time() - self.ttl_seconds]
+
+    def statistics(self):
+        """
+        :return: dict with the hits, misses and the time saved by the cache in the current run
+        """
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'saved seconds': round(self.saved_seconds, 2)}
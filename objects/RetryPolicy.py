@@ -0,0 +1,70 @@
+# import packages
+import random
+import time
+
+from parameters import run_parameters
+
+# HTTP status codes worth retrying
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+
+def get_backoff_seconds(attempt):
+    """
+    Calculates the waiting time before a retry - it doubles with every attempt up to a maximum, and half of it is
+    random so that concurrent requests failing together do not retry together
+    :param attempt: the number of the failed attempt, starting at 0
+    :return: the waiting time in seconds
+    """
+    backoff_seconds = min(run_parameters.NTM_retry_max_backoff_seconds,
+                          run_parameters.NTM_retry_backoff_seconds * 2 ** attempt)
+    return backoff_seconds / 2 + random.uniform(0, backoff_seconds / 2)
+
+
+def get_retry_after_seconds(headers):
+    """
+    :param headers: the headers of a response
+    :return: the seconds of the Retry-After header, None if it is missing or a date
+    """
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def post_with_retries(post, url, instrumentation=None, service=None, rate_limiter=None, **kwargs):
+    """
+    Sends a POST request and retries connection errors, timeouts, rate limits and server errors with backoff
+    :param post: the function sending the request, e.g. requests.post or the post method of a session
+    :param url: the url of the request
+    :param instrumentation: the Instrumentation counting the retries
+    :param service: the name of the service in the instrumentation
+    :param rate_limiter: the RateLimiter of the service every attempt waits for
+    :return: the response of the last attempt
+    """
+
+    # requests is only imported when the first request is sent
+    import requests
+
+    for attempt in range(run_parameters.NTM_max_retries + 1):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        start_time = time.perf_counter()
+
+        res = None
+        try:
+            res = post(url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == run_parameters.NTM_max_retries:
+                raise
+        finally:
+            # requests failing without response count like server errors
+            if rate_limiter is not None:
+                rate_limiter.release(res.status_code if res is not None else None, time.perf_counter() - start_time,
+                                     get_retry_after_seconds(res.headers) if res is not None else None)
+
+        if res is not None and (res.status_code not in RETRY_STATUS_CODES or attempt == run_parameters.NTM_max_retries):
+            return res
+
+        if instrumentation is not None:
+            instrumentation.increment('retries', service=service)
+        time.sleep(get_backoff_seconds(attempt))
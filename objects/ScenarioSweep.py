@@ -0,0 +1,208 @@
+# import packages
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import copy
+import numpy as np
+import pandas as pd
+import logging
+
+from parameters import run_parameters
+from objects.DistanceProvider import great_circle_distance_km
+
+logger = logging.getLogger(__name__)
+
+# NTM parameter in the parameter dict of each run parameter that can be swept
+NTM_PARAMETER_OVERRIDES = {'volumetric_cargo_load_factor': ('Air', 'volumetric_cargo_load_factor'),
+                           'cargo_load_factor_weight_air': ('Air', 'cargo_load_factor_weight'),
+                           'commercial_volumetric_factor': ('Air', 'commercial_volumetric_factor'),
+                           'NTM_default_passenger_load_factor': ('Air', 'passenger_load_factor'),
+                           'fuel': ('Road', 'fuel'),
+                           'road_type': ('Road', 'road_type'),
+                           'euro_class': ('Road', 'euro_class'),
+                           'cargo_carrier_capacity_weight': ('Road', 'cargo_carrier_capacity_weight'),
+                           'type_of_waters': ('Maritime', 'type_of_waters'),
+                           'ship_size': ('Maritime', 'ship_size'),
+                           'cargo_load_factor_weight_maritime': ('Maritime', 'cargo_load_factor_weight')}
+
+# run parameters applied after the NTM calculation
+ADDITIONAL_OVERRIDES = ['default_aircraft_type_ID', 'RFI', 'DETOUR_KM']
+
+
+def create_scenarios(grid):
+    """
+    Creates all combinations of a grid of run parameter overrides
+    :param grid: dict with the list of values of each run parameter, e.g. {'RFI': [1, 2], 'euro_class': ['euro_5', 'euro_6']}.
+    'all' as value of default_aircraft_type_ID sweeps all Air_freighters and Belly_freighters. The overrides apply to
+    every leg, see ScenarioSweep.apply_overrides.
+    :return: list with a dict of overrides per scenario
+    """
+
+    grid = dict(grid)
+    if grid.get('default_aircraft_type_ID') == 'all':
+        grid['default_aircraft_type_ID'] = run_parameters.Air_freighters + run_parameters.Belly_freighters
+
+    for name in grid:
+        if name not in NTM_PARAMETER_OVERRIDES and name not in ADDITIONAL_OVERRIDES:
+            raise Exception(f"Run parameter {name} can not be swept")
+
+    return [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+
+
+class ScenarioSweep:
+    """
+    Class object evaluating the emissions of the new shipment in the workbook for many scenarios of run parameters.
+    Distances are resolved once for all scenarios and every distinct NTM query is only sent once across all scenarios.
+    """
+
+    def __init__(self, emissions_calculator, max_workers=None):
+        """
+        :param emissions_calculator: the EmissionsCalculator with the transportation dict of the new shipment created
+        :param max_workers: the number of NTM queries in flight at the same time
+        """
+        self.emissions_calculator = emissions_calculator
+        self.max_workers = max_workers if max_workers is not None else run_parameters.NTM_max_concurrent_requests
+
+    @staticmethod
+    def apply_overrides(parameter_dict, overrides):
+        """
+        Applies the run parameter overrides of a scenario to a parameter dict. Every override applies to every leg, it
+        replaces the value of the shipment in the workbook (e.g. its load factors or aircraft model) as well as the
+        default of run_parameters.py.
+        :return: copy of the parameter dict with the overridden NTM parameters
+        """
+
+        parameter_dict = copy.deepcopy(parameter_dict)
+        for name, value in overrides.items():
+            if name in NTM_PARAMETER_OVERRIDES:
+                transportation_mode, parameter = NTM_PARAMETER_OVERRIDES[name]
+                parameter_dict['NTM parameters'][transportation_mode][parameter] = str(value)
+
+            elif name == 'default_aircraft_type_ID':
+                if value in run_parameters.Air_freighters:
+                    aircraft_type = "Freight aircraft"
+                elif value in run_parameters.Belly_freighters:
+                    aircraft_type = "Belly freight - cargo"
+                else:
+                    raise Exception("Please select a valid aircraft type")
+                air_parameters = parameter_dict['NTM parameters']['Air']
+                air_parameters["aircraft_type_ID"] = value.lower().replace('-', '_').replace(' ', '_')
+                air_parameters["aircraft model"] = value
+                air_parameters["aircraft type"] = aircraft_type
+
+        return parameter_dict
+
+    def get_legs(self):
+        """
+        Gets the legs of the new shipment and of repositioning with all distances resolved, the air legs with the
+        great-circle distance without detour
+        :return: DataFrame with the shipment legs and DataFrame with the repositioning legs and the number of outgoing shipments
+        """
+
+        emc = self.emissions_calculator
+        shipment_legs_df = emc.get_shipment_legs()
+        repositioning_legs_df, number_of_outgoing_shipments = emc.get_repositioning_legs()
+
+        for legs_df in [shipment_legs_df, repositioning_legs_df]:
+            is_air = (legs_df['Transportation Mode']=='Air') & legs_df['Distance [km]'].isna()
+            legs_df['Great-circle distance [km]'] = np.where(is_air, great_circle_distance_km(legs_df), np.nan)
+
+            # the sea route distances are looked up once for all scenarios
+            is_maritime = (legs_df['Transportation Mode']=='Maritime') & legs_df['Distance [km]'].isna()
+            legs_df.loc[is_maritime, 'Distance [km]'] = [
+                emc.get_distance('Maritime', (leg['Origin Latitude'], leg['Origin Longitude']),
+                                 (leg['Destination Latitude'], leg['Destination Longitude']))
+                for leg in legs_df[is_maritime].to_dict('records')]
+
+        return shipment_legs_df, repositioning_legs_df, number_of_outgoing_shipments
+
+    def create_queries(self, legs_df, parameter_dict, detour_km):
+        """
+        Creates the NTM query of each leg for a scenario
+        :return: list with a tuple of the transportation mode and the query of each leg (None if the leg has no distance)
+        """
+
+        emc = self.emissions_calculator
+        queries = []
+        for leg in legs_df.to_dict('records'):
+            distance_km = leg['Distance [km]']
+            if leg['Transportation Mode'] == 'Air':
+                if pd.isna(distance_km):
+                    distance_km = np.around(leg['Great-circle distance [km]'] + detour_km, 2)
+                query = emc.create_air_freight_query(leg['Shipment Weight [kg]'], leg['Shipment Volume [m3]'],
+                                                     distance_km, parameter_dict)
+            elif pd.isna(distance_km):
+                query = None
+            elif leg['Transportation Mode'] == 'Road':
+                query = emc.create_road_freight_query(leg['Shipment Weight [kg]'], distance_km, parameter_dict)
+            else:
+                query = emc.create_maritime_freight_query(leg['Shipment Weight [kg]'], distance_km, parameter_dict)
+            queries.append((leg['Transportation Mode'], query))
+
+        return queries
+
+    def post_query(self, query):
+        """
+        Sends a query to NTM
+        :return: the CO2 emissions without radiative forcing index, NaN if the query failed
+        """
+        try:
+            return self.emissions_calculator.get_co2_emissions(self.emissions_calculator.post_transport_activity(*query))
+        except Exception as err:
+            logger.warning(f"NTM query of the sweep failed: {err}")
+            return np.nan
+
+    def run(self, scenarios):
+        """
+        Evaluates all scenarios
+        :param scenarios: list with a dict of run parameter overrides per scenario, see create_scenarios
+        :return: DataFrame with one row per scenario, the overrides and the emissions of the new shipment
+        """
+
+        emc = self.emissions_calculator
+        shipment_legs_df, repositioning_legs_df, number_of_outgoing_shipments = self.get_legs()
+        number_of_containers = emc.transport_dict['new shipment']['shipment parameters']['Number of containers shipped']
+
+        # create the queries of all scenarios
+        scenario_queries = []
+        for overrides in scenarios:
+            detour_km = overrides.get('DETOUR_KM', run_parameters.DETOUR_KM)
+            scenario_queries.append((
+                self.create_queries(shipment_legs_df, self.apply_overrides(emc.transport_dict['new shipment'], overrides), detour_km),
+                self.create_queries(repositioning_legs_df, self.apply_overrides(emc.transport_dict['repositioning'], overrides), detour_km)))
+
+        # send every distinct query once
+        unique_queries = dict()
+        for shipment_queries, repositioning_queries in scenario_queries:
+            for transportation_mode, query in shipment_queries + repositioning_queries:
+                if query is not None:
+                    unique_queries.setdefault(emc.make_transport_activity_key(*query), query)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            emissions = dict(zip(unique_queries, executor.map(self.post_query, unique_queries.values())))
+        print(f"Sent {len(unique_queries)} distinct NTM queries for {len(scenarios)} scenarios.")
+
+        # sum up the emissions of each scenario
+        rows = []
+        for overrides, (shipment_queries, repositioning_queries) in zip(scenarios, scenario_queries):
+            rfi = overrides.get('RFI', run_parameters.RFI)
+
+            leg_emissions = {'Road': [], 'Air': [], 'Repositioning': []}
+            for transportation_mode, query in shipment_queries:
+                leg_emissions[transportation_mode].append(
+                    emissions[emc.make_transport_activity_key(*query)] if query is not None else np.nan)
+            for transportation_mode, query in repositioning_queries:
+                emissions_kg = emissions[emc.make_transport_activity_key(*query)] if query is not None else np.nan
+                leg_emissions['Repositioning'].append(rfi*emissions_kg if transportation_mode == 'Air' else emissions_kg)
+
+            # totals with failed legs are left empty like in the workbook calculation
+            row = dict(overrides)
+            row['Variable road freight emissions'] = np.around(
+                emc.sum_emissions(pd.Series(leg_emissions['Road'], dtype=float)), 2)
+            row['Variable air freight emissions'] = np.around(
+                rfi*emc.sum_emissions(pd.Series(leg_emissions['Air'], dtype=float)), 2)
+            row['Repositioning/Provisioning emissions'] = np.around(
+                emc.sum_emissions(pd.Series(leg_emissions['Repositioning'], dtype=float)) /
+                number_of_outgoing_shipments*number_of_containers, 2)
+            row['Failed legs'] = int(sum(np.isnan(leg_emissions[key]).sum() for key in leg_emissions))
+            rows.append(row)
+
+        return pd.DataFrame(rows)
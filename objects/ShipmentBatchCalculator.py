@@ -0,0 +1,155 @@
+# import packages
+import pandas as pd
+import numpy as np
+import json
+import os
+
+# columns identifying a leg - legs with identical values lead to identical NTM queries
+LEG_COLUMNS = ['Transportation Mode', 'Origin Latitude', 'Origin Longitude', 'Destination Latitude',
+               'Destination Longitude', 'Shipment Weight [kg]', 'Shipment Volume [m3]', 'Distance [km]']
+
+
+def read_table(path, sheet_name=0):
+    """
+    Reads a table from a csv, parquet or Excel file
+    :param path: the path of the file
+    :param sheet_name: the sheet to read from Excel files
+    :return: the DataFrame
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return pd.read_csv(path)
+    elif extension == '.parquet':
+        return pd.read_parquet(path)
+    elif extension in ['.xlsx', '.xlsm', '.xls']:
+        return pd.read_excel(path, sheet_name=sheet_name)
+    raise Exception(f"Unsupported file type {extension}")
+
+
+def write_table(df, path):
+    """
+    Writes a table to a csv, parquet or Excel file
+    :param df: the DataFrame
+    :param path: the path of the file
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        df.to_csv(path, index=False)
+    elif extension == '.parquet':
+        df.to_parquet(path, index=False)
+    elif extension in ['.xlsx', '.xlsm']:
+        df.to_excel(path, index=False)
+    else:
+        raise Exception(f"Unsupported file type {extension}")
+
+
+class ShipmentBatchCalculator:
+    """
+    Class object calculating the transportation and repositioning emissions of many shipments in one run
+    """
+
+    def __init__(self, emissions_calculator):
+        self.emissions_calculator = emissions_calculator
+
+    def calculate_shipment_emissions(self, shipments_df, legs_df):
+        """
+        Calculates the emissions of all shipments. Identical legs are only calculated once across all shipments.
+        :param shipments_df: DataFrame with one row per shipment, the column 'Shipment ID' and the columns of
+        'Script input new shipment data'
+        :param legs_df: DataFrame with one row per leg, the column 'Shipment ID' and the columns of
+        'Script input transpo data'
+        :return: DataFrame with one row per shipment and one column per emission component
+        """
+
+        emc = self.emissions_calculator
+
+        # create the parameters of each shipment
+        shipment_parameters = {row['Shipment ID']: emc.create_shipment_parameters(row)
+                               for row in shipments_df.to_dict('records')}
+
+        # shipments with the same NTM parameters share their NTM queries
+        configuration_keys = {shipment_id: json.dumps(parameter_dict['NTM parameters'], sort_keys=True, default=str)
+                              for shipment_id, parameter_dict in shipment_parameters.items()}
+
+        # only road and air legs are part of the shipment itinerary
+        legs_df = legs_df[legs_df['Transportation Mode'].isin(['Road', 'Air'])]
+
+        # resolve the missing road distances of all shipments in bulk
+        legs_df = emc.resolve_road_distances(legs_df)
+        legs_df['Configuration'] = legs_df['Shipment ID'].map(configuration_keys)
+
+        # calculate each unique leg once per NTM parameter configuration
+        results = []
+        number_of_unique_legs = 0
+        for configuration_key, configuration_legs_df in legs_df.groupby('Configuration', sort=False):
+            parameter_dict = next(shipment_parameters[shipment_id] for shipment_id, key in configuration_keys.items()
+                                  if key == configuration_key)
+
+            unique_legs_df = configuration_legs_df.drop_duplicates(LEG_COLUMNS)[LEG_COLUMNS + ['Distance source']]
+            number_of_unique_legs += len(unique_legs_df)
+            unique_legs_df = emc.batch_engine.calculate_leg_emissions(unique_legs_df, parameter_dict)
+
+            # every leg of every shipment is written with the result of its unique leg
+            configuration_legs_df = configuration_legs_df.drop(columns=['Distance source']).merge(
+                unique_legs_df, on=LEG_COLUMNS, how='left')
+            emc.write_leg_results(configuration_legs_df, 'transportation')
+            results.append(configuration_legs_df)
+        print(f"Calculated {number_of_unique_legs} unique legs for {len(legs_df)} legs of {len(shipments_df)} shipments.")
+
+        legs_df = pd.concat(results) if len(results) > 0 else legs_df.assign(**{'Emissions [kg]': np.nan, 'Error': None})
+
+        # sum up the emissions per shipment and transportation mode, shipments with failed legs get no total
+        transportation_emissions = legs_df.groupby(['Shipment ID', 'Transportation Mode'])['Emissions [kg]'].agg(
+            emc.sum_emissions).unstack(fill_value=0)
+        failed_legs = legs_df.groupby('Shipment ID')['Error'].count()
+
+        # calculate the repositioning emissions once per container type and container specification
+        repositioning_emissions = self.calculate_repositioning_emissions(shipments_df)
+
+        output_df = pd.DataFrame({'Shipment ID': shipments_df['Shipment ID']})
+        has_legs = output_df['Shipment ID'].isin(transportation_emissions.index)
+        for transportation_mode, column in [('Road', 'Variable road freight emissions'),
+                                            ('Air', 'Variable air freight emissions')]:
+            # shipments without legs of a transportation mode have no emissions of that mode
+            mode_emissions = transportation_emissions.get(transportation_mode, pd.Series(0, index=transportation_emissions.index))
+            output_df[column] = np.around(output_df['Shipment ID'].map(mode_emissions).where(has_legs, 0), 2)
+        output_df['Repositioning/Provisioning emissions'] = np.around(repositioning_emissions, 2)
+        output_df['Failed legs'] = output_df['Shipment ID'].map(failed_legs).fillna(0).astype(int)
+
+        return output_df
+
+    def calculate_repositioning_emissions(self, shipments_df):
+        """
+        Calculates the repositioning emissions attributable to each shipment
+        :param shipments_df: DataFrame with one row per shipment and the columns of 'Script input new shipment data'
+        :return: list with the repositioning emissions of each shipment
+        """
+
+        emc = self.emissions_calculator
+
+        # nominal weight and volume per container of each shipment
+        shipments_df = shipments_df.assign(**{
+            'Empty Container Weight per container [kg]': shipments_df['Empty Container Weight [kg]']/shipments_df['Number of containers shipped'],
+            'Volume per container [m3]': shipments_df['Shipment Volume [m3]']/shipments_df['Number of containers shipped']})
+
+        # one repositioning table per container type and container specification
+        repositioning_tables = dict()
+        for container_specification in shipments_df[['Container Type', 'Empty Container Weight per container [kg]',
+                                                      'Volume per container [m3]']].drop_duplicates().itertuples(index=False):
+            container_type, weight_per_empty_container, outer_volume_per_container = container_specification
+            repositioning_tables[tuple(container_specification)] = emc.calculate_repositioning_table(
+                {container_type: {'Empty Container Weight [kg]': weight_per_empty_container,
+                                  'Shipment Volume [m3]': outer_volume_per_container}})
+
+        # look up the emissions of each shipment
+        repositioning_emissions = []
+        for row in shipments_df.to_dict('records'):
+            repositioning_table = repositioning_tables[(row['Container Type'],
+                                                        row['Empty Container Weight per container [kg]'],
+                                                        row['Volume per container [m3]'])]
+            repositioning_emissions.append(emc.lookup_repositioning_emissions(row['Container Type'],
+                                                                              row['Origin Service Center'],
+                                                                              row['Number of containers shipped'],
+                                                                              repositioning_table))
+
+        return repositioning_emissions
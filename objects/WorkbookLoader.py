@@ -0,0 +1,127 @@
+# import packages
+import hashlib
+import pandas as pd
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# columns required by the script in each sheet of the workbook
+WORKBOOK_SCHEMAS = {
+    'Script input transpo data': ['Transportation Mode', 'Origin Latitude', 'Origin Longitude',
+                                  'Destination Latitude', 'Destination Longitude',
+                                  'Shipment Weight [kg]', 'Shipment Volume [m3]'],
+    'Script input new shipment data': ['Container Type', 'Origin Service Center', 'Number of containers shipped',
+                                       'Shipment Volume [m3]', 'Empty Container Weight [kg]', 'Aircraft Type',
+                                       'Aircraft Model', 'Weight Load Factor [%]', 'Volumetric Load Factor [%]'],
+    'Script input provisioning data': ['Container Type', 'Origin', 'Number of containers shipped',
+                                       'Destination Service Center', 'Transportation Mode',
+                                       'Distance [km] (if available)', 'Shipment Type', 'Origin Latitude',
+                                       'Origin Longitude', 'Destination Latitude', 'Destination Longitude'],
+}
+
+
+class WorkbookLoader:
+    """
+    Class object reading all input sheets of the workbook in one pass, optionally from a columnar sidecar cache
+    """
+
+    def __init__(self, path, sidecar_folder=None, sidecar_format=None):
+        """
+        :param path: the path of the Excel workbook
+        :param sidecar_folder: the folder of the sidecar files
+        :param sidecar_format: 'parquet' or 'feather' to cache the parsed sheets, None to always parse the workbook
+        """
+        self.path = path
+        self.sidecar_folder = sidecar_folder
+        self.sidecar_format = sidecar_format
+
+    def load(self):
+        """
+        Reads the input sheets of the workbook
+        :return: dict with a DataFrame per sheet name
+        """
+
+        # use the sidecar files if they were written for this version of the workbook
+        if self.sidecar_format is not None:
+            sidecar_paths = self.get_sidecar_paths()
+            if all(os.path.exists(path) for path in sidecar_paths.values()):
+                return {sheet_name: self.read_sidecar(path) for sheet_name, path in sidecar_paths.items()}
+
+        # parse all sheets in one pass through the workbook
+        sheets = pd.read_excel(self.path, sheet_name=list(WORKBOOK_SCHEMAS))
+        for sheet_name, df in sheets.items():
+            self.validate(sheet_name, df)
+            sheets[sheet_name] = self.normalize(df)
+
+        if self.sidecar_format is not None:
+            try:
+                self.write_sidecars(sheets, sidecar_paths)
+            except Exception as err:
+                logger.warning(f"The sidecar files of the workbook could not be written: {err}")
+
+        return sheets
+
+    @staticmethod
+    def validate(sheet_name, df):
+        """
+        Checks that the sheet has all columns required by the script
+        :param sheet_name: the name of the sheet
+        :param df: the DataFrame of the sheet
+        """
+        missing_columns = [column for column in WORKBOOK_SCHEMAS[sheet_name] if column not in df.columns]
+        if len(missing_columns) > 0:
+            raise Exception(f"Sheet '{sheet_name}' is missing the columns {missing_columns}")
+
+    @staticmethod
+    def normalize(df):
+        """
+        Converts text columns mixed with numbers (e.g. the 0 filled empty rows) to text so they can be stored columnar
+        :param df: the DataFrame of the sheet
+        :return: the normalized DataFrame
+        """
+        df = df.copy()
+        for column in df.columns:
+            if df[column].dtype == object:
+                df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+        return df
+
+    def get_sidecar_paths(self):
+        """
+        :return: dict with the sidecar path per sheet, keyed on the modification time and content hash of the workbook
+        """
+
+        with open(self.path, 'rb') as file:
+            workbook_hash = hashlib.sha256(file.read()).hexdigest()[:16]
+        workbook_key = f"{os.stat(self.path).st_mtime_ns}_{workbook_hash}"
+        workbook_name = os.path.splitext(os.path.basename(self.path))[0]
+
+        return {sheet_name: os.path.join(self.sidecar_folder, f"{workbook_name}_{workbook_key}_{sheet_name}.{self.sidecar_format}")
+                for sheet_name in WORKBOOK_SCHEMAS}
+
+    def read_sidecar(self, path):
+        if self.sidecar_format == 'parquet':
+            return pd.read_parquet(path)
+        return pd.read_feather(path)
+
+    def write_sidecars(self, sheets, sidecar_paths):
+        """
+        Writes the parsed sheets as sidecar files
+        :param sheets: dict with a DataFrame per sheet name
+        :param sidecar_paths: dict with the sidecar path per sheet name
+        """
+
+        os.makedirs(self.sidecar_folder, exist_ok=True)
+
+        # remove the sidecar files of older versions of the workbook
+        for file_name in os.listdir(self.sidecar_folder):
+            path = os.path.join(self.sidecar_folder, file_name)
+            if file_name.startswith(os.path.splitext(os.path.basename(self.path))[0] + '_') and \
+                    path not in sidecar_paths.values():
+                os.remove(path)
+
+        for sheet_name, df in sheets.items():
+            if self.sidecar_format == 'parquet':
+                df.to_parquet(sidecar_paths[sheet_name], index=False)
+            else:
+                df.reset_index(drop=True).to_feather(sidecar_paths[sheet_name])
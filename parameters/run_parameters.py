@@ -5,9 +5,32 @@
 # Paths to excel spreadsheet
 path_save_solution = './ExcelModels/Transportation_emissions_output.xlsx'
 
+# Path of the emissions per shipment when running main.py with --shipments
+path_save_batch_solution = './ExcelModels/Batch_emissions_output.csv'
+
+# Path of the emissions per scenario when running main.py with --sweep
+path_save_sweep_solution = './ExcelModels/Scenario_sweep_output.csv'
+
+# Path of the per-leg results (stage, shipment, mode, distance and its source, NTM payload hash and emissions), written
+# batch by batch while the legs are calculated - csv or parquet, None to not write the legs
+path_save_leg_results = './ExcelModels/Leg_emissions_output.csv'
+
+# Path of the emissions of the new shipment of the workbook as csv or parquet table
+path_save_shipment_results = './ExcelModels/Shipment_emissions_output.csv'
+
+# The Excel file at path_save_solution read by the Excel model is derived from the shipment results - set to False if
+# only the columnar output is needed. Batch outputs with more than excel_max_rows shipments are written as csv instead
+write_excel_summary = True
+excel_max_rows = 10000
+
 # set the path to the Excel Workbook
 path_to_workbook = './ExcelModels/CO2 Emissions Calculator - 2023.xlsm'
 
+# Sidecar files of the parsed workbook sheets - 'parquet', 'feather' or None to always parse the workbook.
+# The sidecar files are keyed on the modification time and hash of the workbook
+workbook_sidecar_format = 'parquet'
+workbook_sidecar_folder = './cache/workbook'
+
 
 ############################
 ######## PARAMETERS ########
@@ -87,5 +110,106 @@ default_belly_freighter = 'B777-300ER-Belly'
 # Radiative Forcing Index (RFI)
 RFI = 2
 
+# Provider of road distances for legs without a distance: 'google' queries the Google Maps distance matrix,
+# 'haversine' estimates the distance offline as great-circle distance times the road circuity factor
+road_distance_provider = 'google'
+road_circuity_factor = 1.3
+
 # Flight detour we apply to account for maneuvering the aircraft. 95km from EN 16258 standard is used
 DETOUR_KM = 95
+
+
+#############################
+######## PERFORMANCE ########
+#############################
+
+# Endpoint of the NTM transport activity calculations
+NTM_transport_activities_url = 'https://api.transportmeasures.org/v1/transportactivities'
+
+# Local stand-in of the NTM API, the NTM token endpoint and the Google Maps distance matrix, started with
+# python -m objects.MockNTMServer - None uses the live services, e.g. 'http://127.0.0.1:8765' to run without network
+offline_server_url = None
+# Recorded responses replayed by the stand-in, written from the NTM and distance caches with --record
+offline_fixtures_path = './cache/offline_fixtures.json'
+
+# Long-running local emissions service keeping the token and caches warm, started with python -m objects.EmissionsService
+# - main.py sends its calculations to emissions_service_url if set, e.g. 'http://127.0.0.1:8766'
+emissions_service_host = '127.0.0.1'
+emissions_service_port = 8766
+emissions_service_url = None
+
+# Maximum number of NTM requests in flight at the same time when calculating many legs
+NTM_max_concurrent_requests = 8
+
+# Retries of NTM requests failing with connection errors, rate limits (429) or server errors (5xx) - the waiting
+# time doubles with every retry up to the maximum, half of it is random
+NTM_max_retries = 3
+NTM_retry_backoff_seconds = 1
+NTM_retry_max_backoff_seconds = 30
+
+# Client-side quota of each external service - the requests of a run wait for a token of a bucket refilled at
+# requests_per_second and holding at most burst tokens. The requests in flight start at max_concurrency, are halved on
+# rate limits (429), server errors and connection errors or when the latency grows above rate_limiter_latency_tolerance
+# times the lowest latency, and grow again by one per round of successful requests. Set the NTM quota to the one of
+# your NTM membership - requests to offline_server_url are not limited
+use_rate_limiter = True
+rate_limits = {'ntm': {'requests_per_second': 20, 'burst': 20, 'max_concurrency': NTM_max_concurrent_requests},
+               'ntm token': {'requests_per_second': 1, 'burst': 2, 'max_concurrency': 1},
+               'google distance matrix': {'requests_per_second': 50, 'burst': 50, 'max_concurrency': 8}}
+rate_limiter_latency_tolerance = 3
+
+# Totals of legs of which some failed are NaN, set to True to sum up the successfully calculated legs only
+allow_partial_totals = False
+
+# Cache of NTM results on disk - identical queries are answered from the cache instead of the NTM API
+use_NTM_cache = True
+NTM_cache_path = './cache/ntm_results.sqlite'
+NTM_cache_ttl_seconds = 30*24*60*60 # results older than 30 days are queried again
+NTM_cache_max_entries = 100000
+
+# Emissions of each leg kept between runs - only new or changed legs are calculated again, the totals are rebuilt from
+# the stored results of the other legs. Off by default, results stored in an earlier run are not checked against NTM again
+use_incremental_recomputation = False
+leg_results_path = './cache/leg_results.sqlite'
+leg_results_ttl_seconds = NTM_cache_ttl_seconds
+leg_results_max_entries = 1000000
+# the results are stored every leg_results_checkpoint_legs legs, so an interrupted run resumes from the last checkpoint
+leg_results_checkpoint_legs = 50
+
+# Cache of distances on disk - coordinates are rounded to distance_cache_precision decimals (4 decimals are ~10m)
+use_distance_cache = True
+distance_cache_path = './cache/distances.sqlite'
+distance_cache_ttl_seconds = None # road networks rarely change, distances do not expire
+distance_cache_precision = 4
+
+# Google bills every element of a distance matrix request, requests combine the distances of several origins and
+# destinations only while at least this share of their elements is needed (1 to only request needed elements, lower
+# values send fewer requests)
+distance_matrix_min_utilization = 0.5
+
+# Table of sea route distances between ports on disk (None to only keep them in memory during a run) - port
+# coordinates are rounded to maritime_distance_index_precision decimals
+maritime_distance_index_path = './cache/maritime_distances.csv'
+maritime_distance_index_precision = 3
+
+# Unknown sea route distances are computed in distance_process_pool_workers worker processes (None for one per core,
+# 0 to compute them in the calling thread) while the other legs are sent to NTM. Starting the workers only pays off for
+# at least distance_process_pool_min_pairs unknown port pairs
+distance_process_pool_workers = None
+distance_process_pool_min_pairs = 100
+
+# Index of the emissions per container and per kg of every lane of the service-center network, built with main.py
+# --build-lane-index. Legs on indexed lanes are scaled from the index by their weight, legs on other lanes or with
+# other NTM parameters are calculated. The scaling assumes that the NTM emissions of a lane are linear in the
+# (chargeable) weight, so it is off by default. Lane coordinates are rounded to lane_emission_index_precision decimals
+use_lane_emission_index = False
+lane_emission_index_path = './cache/lane_emission_index.parquet'
+lane_emission_index_precision = 4
+
+# Provisioning histories streamed with main.py --provisioning are read in chunks of provisioning_stream_chunk_rows rows
+# and their legs are calculated in batches of provisioning_stream_batch_legs legs
+provisioning_stream_chunk_rows = 100000
+provisioning_stream_batch_legs = 1000
+
+# Emission factor tables calibrated against NTM with main.py --calibrate-surrogate, used by main.py --surrogate
+surrogate_tables_path = './cache/emission_factor_tables.json'
@@ -0,0 +1,67 @@
+# import packages
+import sys
+import os
+import pytest
+
+# the tests import the packages of the repository like main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parameters import run_parameters
+
+
+@pytest.fixture
+def isolated_run_parameters(tmp_path, monkeypatch):
+    """
+    Points every file read or written between runs to a temporary folder and switches off the state kept between runs,
+    so that the tests neither depend on nor change the caches in ./cache
+    :return: the temporary folder
+    """
+
+    monkeypatch.setattr(run_parameters, 'path_save_solution', str(tmp_path / 'Transportation_emissions_output.xlsx'))
+    monkeypatch.setattr(run_parameters, 'path_save_leg_results', str(tmp_path / 'Leg_emissions_output.csv'))
+    monkeypatch.setattr(run_parameters, 'path_save_shipment_results', str(tmp_path / 'Shipment_emissions_output.csv'))
+    monkeypatch.setattr(run_parameters, 'workbook_sidecar_folder', str(tmp_path / 'workbook'))
+    monkeypatch.setattr(run_parameters, 'NTM_cache_path', str(tmp_path / 'ntm_results.sqlite'))
+    monkeypatch.setattr(run_parameters, 'distance_cache_path', str(tmp_path / 'distances.sqlite'))
+    monkeypatch.setattr(run_parameters, 'leg_results_path', str(tmp_path / 'leg_results.sqlite'))
+    monkeypatch.setattr(run_parameters, 'maritime_distance_index_path', str(tmp_path / 'maritime_distances.csv'))
+    monkeypatch.setattr(run_parameters, 'lane_emission_index_path', str(tmp_path / 'lane_emission_index.parquet'))
+    monkeypatch.setattr(run_parameters, 'surrogate_tables_path', str(tmp_path / 'emission_factor_tables.json'))
+    monkeypatch.setattr(run_parameters, 'use_incremental_recomputation', False)
+    monkeypatch.setattr(run_parameters, 'use_lane_emission_index', False)
+    monkeypatch.setattr(run_parameters, 'distance_process_pool_workers', 0)
+    monkeypatch.setattr(run_parameters, 'road_distance_provider', 'google')
+    monkeypatch.setattr(run_parameters, 'emissions_service_url', None)
+
+    # failed requests are retried without waiting
+    monkeypatch.setattr(run_parameters, 'NTM_retry_backoff_seconds', 0)
+
+    return tmp_path
+
+
+@pytest.fixture
+def mock_server(isolated_run_parameters, monkeypatch):
+    """
+    Runs the local stand-in of NTM, its token endpoint and the distance matrix, which all requests of the test are sent to
+    """
+
+    from objects.MockNTMServer import MockNTMServer
+
+    with MockNTMServer() as server:
+        monkeypatch.setattr(run_parameters, 'offline_server_url', server.url)
+        yield server
+
+
+@pytest.fixture
+def emc(mock_server):
+    """
+    :return: an EmissionsCalculator sending its requests to the local stand-in, with the transportation dict of the
+    workbook created
+    """
+
+    from objects.EmissionsCalculator import EmissionsCalculator
+
+    emissions_calculator = EmissionsCalculator()
+    emissions_calculator.create_transportation_dict()
+    yield emissions_calculator
+    emissions_calculator.maritime_distance_index.close()
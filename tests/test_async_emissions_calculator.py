@@ -0,0 +1,21 @@
+# import packages
+import asyncio
+
+from objects.AsyncEmissionsCalculator import AsyncEmissionsCalculator
+
+
+def test_async_calculation_matches_the_threaded_calculation(emc):
+    airfreight_emissions_kg, road_freight_emissions_kg = emc.calculate_shipment_transportation_emissions()
+    repositioning_emissions_kg = emc.calculate_repositioning_emissions()
+
+    async def calculate():
+        async with AsyncEmissionsCalculator(emc) as calculator:
+            return await calculator.calculate_shipment_transportation_emissions(), \
+                   await calculator.calculate_repositioning_emissions()
+
+    (async_airfreight_emissions_kg, async_road_freight_emissions_kg), async_repositioning_emissions_kg = \
+        asyncio.run(calculate())
+
+    assert async_airfreight_emissions_kg == airfreight_emissions_kg
+    assert async_road_freight_emissions_kg == road_freight_emissions_kg
+    assert async_repositioning_emissions_kg == repositioning_emissions_kg
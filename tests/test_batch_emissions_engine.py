@@ -0,0 +1,61 @@
+# import packages
+from haversine import haversine
+import pandas as pd
+import numpy as np
+import logging
+
+from parameters import run_parameters
+from objects.BatchEmissionsEngine import BatchEmissionsEngine, RESULT_COLUMNS
+
+
+def create_legs(rows):
+    """
+    :param rows: list of (transportation mode, weight [kg], volume [m3], distance [km]) tuples
+    :return: DataFrame with one leg per row between Hamburg and Rotterdam
+    """
+    return pd.DataFrame([{'Transportation Mode': transportation_mode, 'Origin Latitude': 53.55, 'Origin Longitude': 9.99,
+                          'Destination Latitude': 51.92, 'Destination Longitude': 4.48,
+                          'Shipment Weight [kg]': weight_kg, 'Shipment Volume [m3]': volume_m3,
+                          'Distance [km]': distance_km}
+                         for transportation_mode, weight_kg, volume_m3, distance_km in rows])
+
+
+def test_legs_are_calculated_in_order(emc):
+    legs_df = create_legs([('Road', 1000, 1, 100), ('Road', 2000, 1, 100), ('Maritime', 10000, 20, 1000)] * 5)
+
+    results_df = BatchEmissionsEngine(emc, max_workers=4).calculate_leg_emissions(legs_df, emc.transport_dict['repositioning'])
+
+    assert list(results_df.columns) == list(legs_df.columns) + RESULT_COLUMNS + ['Result source']
+    assert (results_df['Result source'] == 'NTM').all()
+    # the stand-in emits 0.12 kg per tkm on road and 0.015 kg per tkm at sea
+    assert results_df['Emissions [kg]'].tolist() == [12.0, 24.0, 150.0] * 5
+    assert results_df['Error'].isna().all()
+    assert results_df['Distance source'].tolist() == ['input'] * 15
+
+
+def test_air_legs_get_the_great_circle_distance_and_rfi(emc):
+    legs_df = create_legs([('Air', 1000, 1, np.nan)])
+
+    results_df = BatchEmissionsEngine(emc).calculate_leg_emissions(legs_df, emc.transport_dict['repositioning'])
+
+    distance_km = results_df['Calculation distance [km]'][0]
+    assert results_df['Distance source'][0] == 'great circle'
+    assert distance_km == np.around(haversine((53.55, 9.99), (51.92, 4.48)) + run_parameters.DETOUR_KM, 2)
+    assert results_df['Emissions [kg]'][0] == np.around(run_parameters.RFI * np.around(0.6 * distance_km, 2), 2)
+
+
+def test_failed_and_unsupported_legs_are_reported(emc, mock_server, caplog):
+    mock_server.error_rate = 1
+    legs_df = create_legs([('Road', 1000, 1, 100), ('Road', 1000, 1, 200), ('Rail', 1000, 1, 100)])
+
+    with caplog.at_level(logging.WARNING, logger='objects.BatchEmissionsEngine'):
+        results_df = BatchEmissionsEngine(emc).calculate_leg_emissions(legs_df, emc.transport_dict['repositioning'])
+
+    assert results_df['Emissions [kg]'].isna().all()
+    assert results_df['Error'].notna().all()
+    assert 'Unsupported transportation mode' in results_df['Error'][2]
+
+    # the failures are summarized in one line instead of one line per leg
+    messages = [record.getMessage() for record in caplog.records if record.name == 'objects.BatchEmissionsEngine']
+    assert len(messages) == 1
+    assert messages[0].startswith('3 of 3 legs failed (2 Road, 1 Rail)')
@@ -0,0 +1,68 @@
+# import packages
+from haversine import haversine
+
+from parameters import run_parameters
+from objects.ResultCache import ResultCache
+from objects.DistanceProvider import GoogleMapsDistanceProvider, HaversineDistanceProvider, CachedDistanceProvider, \
+    MAX_MATRIX_ELEMENTS
+
+HAMBURG = (53.55, 9.99)
+ROTTERDAM = (51.92, 4.48)
+
+
+class CountingProvider(HaversineDistanceProvider):
+    """
+    Haversine provider counting the distances it is asked for
+    """
+
+    def __init__(self):
+        super().__init__(1.3)
+        self.number_of_distances = 0
+
+    def get_distances(self, pairs):
+        self.number_of_distances += len(pairs)
+        return super().get_distances(pairs)
+
+
+def test_cached_distances_are_not_queried_again(tmp_path):
+    provider = CountingProvider()
+    cached_provider = CachedDistanceProvider(provider, ResultCache(str(tmp_path / 'distances.sqlite')), 4)
+
+    distances = cached_provider.get_distances([(HAMBURG, ROTTERDAM), (ROTTERDAM, HAMBURG)])
+    # coordinates are rounded to the precision of the cache
+    assert cached_provider.get_distances([((53.55001, 9.99), ROTTERDAM)]) == distances[:1]
+
+    assert provider.number_of_distances == 2
+    assert distances[0] == 1.3 * haversine(HAMBURG, ROTTERDAM)
+
+
+def test_distance_matrix_requests_are_batched(mock_server):
+    provider = GoogleMapsDistanceProvider('AIza-offline', mock_server.url)
+    pairs = [((50 + origin / 10, 8), (48, 2 + destination / 10)) for origin in range(12) for destination in range(12)]
+
+    distances = provider.get_distances(pairs)
+
+    assert all(distance_km is not None for distance_km in distances)
+    # 144 pairs in two requests of at most MAX_MATRIX_ELEMENTS elements instead of one request per pair
+    assert mock_server.request_counts['distance matrix'] == 2
+
+
+def test_sparse_pairs_do_not_request_unneeded_elements(mock_server):
+    provider = GoogleMapsDistanceProvider('AIza-offline', mock_server.url)
+    requested_elements = []
+    query_distance_matrix = provider.query_distance_matrix
+
+    def count_elements(origins, destinations):
+        requested_elements.append(len(origins) * len(destinations))
+        return query_distance_matrix(origins, destinations)
+
+    provider.query_distance_matrix = count_elements
+
+    # every origin needs another destination, plus a hub needed by all origins
+    pairs = [((50 + leg / 10, 8), (48, 2 + leg / 10)) for leg in range(40)] + \
+            [((50 + leg / 10, 8), (47, 1)) for leg in range(40)]
+    distances = provider.get_distances(pairs)
+
+    assert all(distance_km is not None for distance_km in distances)
+    assert all(elements <= MAX_MATRIX_ELEMENTS for elements in requested_elements)
+    assert sum(requested_elements) <= len(pairs) / run_parameters.distance_matrix_min_utilization
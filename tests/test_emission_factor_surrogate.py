@@ -0,0 +1,27 @@
+# import packages
+import numpy as np
+
+from objects.EmissionFactorSurrogate import EmissionFactorSurrogate
+
+
+def test_calibration_error_is_zero_for_linear_emissions(emc):
+    # the emissions of the stand-in are linear in the tonne-kilometres
+    surrogate = EmissionFactorSurrogate()
+    errors = surrogate.calibrate(emc, emc.transport_dict['new shipment'])
+
+    assert len(errors) == 3
+    assert max(errors.values()) < 1e-3
+
+
+def test_workbook_legs_are_estimated_like_the_live_values(emc, tmp_path):
+    legs_df = emc.get_shipment_legs()
+    live_df = emc.batch_engine.calculate_leg_emissions(legs_df, emc.transport_dict['new shipment'])
+
+    surrogate = EmissionFactorSurrogate()
+    surrogate.calibrate(emc, emc.transport_dict['new shipment'])
+    surrogate.save(str(tmp_path / 'emission_factor_tables.json'))
+    surrogate = EmissionFactorSurrogate.load(str(tmp_path / 'emission_factor_tables.json'), emc)
+    estimated_df = surrogate.calculate_leg_emissions(legs_df, emc.transport_dict['new shipment'])
+
+    assert estimated_df['Error'].isna().all()
+    assert np.allclose(estimated_df['Emissions [kg]'], live_df['Emissions [kg]'], rtol=1e-3)
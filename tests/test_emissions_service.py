@@ -0,0 +1,21 @@
+# import packages
+import pandas as pd
+
+from objects.EmissionsService import EmissionsService
+from objects.EmissionsServiceClient import EmissionsServiceClient
+from objects.ShipmentBatchCalculator import ShipmentBatchCalculator
+from tests.test_shipment_batch_calculator import create_batch
+
+
+def test_service_returns_the_local_results(emc):
+    emissions_dict = emc.calculate_workbook_emissions()
+    shipments_df, legs_df = create_batch(emc, 2)
+    output_df = ShipmentBatchCalculator(emc).calculate_shipment_emissions(shipments_df, legs_df)
+
+    with EmissionsService(port=0) as service:
+        client = EmissionsServiceClient(service.url)
+
+        assert client.calculate_workbook_emissions() == emissions_dict
+        pd.testing.assert_frame_equal(client.calculate_shipment_emissions(shipments_df, legs_df), output_df,
+                                      check_dtype=False)
+        assert service.number_of_calculations == 2
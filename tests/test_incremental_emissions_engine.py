@@ -0,0 +1,43 @@
+# import packages
+import numpy as np
+
+from parameters import run_parameters
+from objects.EmissionsCalculator import EmissionsCalculator
+from objects.IncrementalEmissionsEngine import IncrementalEmissionsEngine
+from objects.EmissionFactorSurrogate import EmissionFactorSurrogate
+
+
+def create_emissions_calculator():
+    emissions_calculator = EmissionsCalculator()
+    emissions_calculator.create_transportation_dict()
+    return emissions_calculator
+
+
+def test_only_new_or_changed_legs_are_calculated(mock_server, monkeypatch):
+    monkeypatch.setattr(run_parameters, 'use_incremental_recomputation', True)
+
+    emc = create_emissions_calculator()
+    assert isinstance(emc.batch_engine, IncrementalEmissionsEngine)
+    legs_df = emc.get_shipment_legs()
+    results_df = emc.batch_engine.calculate_leg_emissions(legs_df, emc.transport_dict['new shipment'])
+    assert emc.batch_engine.number_of_calculated_legs == len(legs_df)
+
+    # the next run reuses all legs but an edited one
+    emc = create_emissions_calculator()
+    legs_df.loc[legs_df.index[0], 'Shipment Weight [kg]'] *= 2
+    rerun_df = emc.batch_engine.calculate_leg_emissions(legs_df, emc.transport_dict['new shipment'])
+
+    assert emc.batch_engine.number_of_calculated_legs == 1
+    assert emc.batch_engine.number_of_reused_legs == len(legs_df) - 1
+    assert np.allclose(rerun_df['Emissions [kg]'].iloc[1:], results_df['Emissions [kg]'].iloc[1:])
+    assert rerun_df['Emissions [kg]'].iloc[0] != results_df['Emissions [kg]'].iloc[0]
+
+
+def test_calibration_bypasses_the_stored_results(mock_server, monkeypatch):
+    monkeypatch.setattr(run_parameters, 'use_incremental_recomputation', True)
+
+    emc = create_emissions_calculator()
+    EmissionFactorSurrogate().calibrate(emc, emc.transport_dict['new shipment'], ['Road'])
+
+    assert emc.batch_engine.number_of_calculated_legs == 0
+    assert emc.batch_engine.number_of_reused_legs == 0
@@ -0,0 +1,31 @@
+# import packages
+import json
+
+from objects.Instrumentation import Instrumentation, METRIC_PREFIX
+
+
+def test_counters_histograms_and_gauges_are_exported(tmp_path):
+    instrumentation = Instrumentation()
+    instrumentation.increment('external_calls', service='ntm')
+    instrumentation.increment('external_calls', 2, service='ntm')
+    instrumentation.observe('external_call_seconds', 0.2, service='ntm')
+    instrumentation.set_gauge('concurrency_limit', 4, service='ntm')
+
+    instrumentation.export(str(tmp_path / 'metrics.json'))
+    with open(tmp_path / 'metrics.json') as file:
+        metrics = json.load(file)
+    assert metrics['counters'] == [{'name': 'external_calls', 'labels': {'service': 'ntm'}, 'value': 3}]
+    assert metrics['gauges'][0]['value'] == 4
+    assert metrics['histograms'][0]['count'] == 1
+
+    prometheus = instrumentation.to_prometheus()
+    assert f'{METRIC_PREFIX}external_calls_total{{service="ntm"}} 3' in prometheus
+    assert f'{METRIC_PREFIX}external_call_seconds_count{{service="ntm"}} 1' in prometheus
+
+
+def test_timer_observes_the_duration_of_a_stage():
+    instrumentation = Instrumentation()
+    with instrumentation.timer('stage_seconds', stage='output writing'):
+        pass
+
+    assert 'stage_seconds (stage=output writing): 1 calls' in instrumentation.summary()
@@ -0,0 +1,39 @@
+# import packages
+import numpy as np
+
+from parameters import run_parameters
+from objects.EmissionsCalculator import EmissionsCalculator
+from objects.LaneEmissionIndex import LaneEmissionIndex
+
+
+def test_indexed_legs_are_scaled_and_marked(emc, monkeypatch):
+    legs_df = emc.get_shipment_legs()
+    live_df = emc.live_engine.calculate_leg_emissions(legs_df, emc.transport_dict['new shipment'])
+    LaneEmissionIndex(emc.live_engine, run_parameters.lane_emission_index_path, emissions_calculator=emc).build(emc)
+
+    monkeypatch.setattr(run_parameters, 'use_lane_emission_index', True)
+    emissions_calculator = EmissionsCalculator()
+    emissions_calculator.create_transportation_dict()
+
+    # the weight of the legs changes, the emissions are linear in it
+    legs_df['Shipment Weight [kg]'] *= 2
+    legs_df['Shipment Volume [m3]'] *= 2
+    indexed_df = emissions_calculator.batch_engine.calculate_leg_emissions(legs_df, emc.transport_dict['new shipment'])
+    rerun_df = emc.live_engine.calculate_leg_emissions(legs_df, emc.transport_dict['new shipment'])
+
+    assert (indexed_df['Result source'] == 'lane index').all()
+    assert emissions_calculator.batch_engine.number_of_indexed_legs == len(legs_df)
+    assert np.allclose(indexed_df['Emissions [kg]'], rerun_df['Emissions [kg]'], rtol=1e-3, atol=0.01)
+    assert indexed_df['Payload hash'].tolist() == rerun_df['Payload hash'].tolist()
+    assert (live_df['Result source'] == 'NTM').all()
+
+
+def test_legs_on_unseen_lanes_are_calculated(emc):
+    lane_index = LaneEmissionIndex(emc.live_engine, run_parameters.lane_emission_index_path, emissions_calculator=emc)
+    legs_df = emc.get_shipment_legs()
+
+    results_df = lane_index.calculate_leg_emissions(legs_df, emc.transport_dict['new shipment'])
+
+    assert (results_df['Result source'] == 'NTM').all()
+    assert lane_index.number_of_live_legs == len(legs_df)
+    assert results_df['Payload hash'].notna().all()
@@ -0,0 +1,26 @@
+# import packages
+import pandas as pd
+import numpy as np
+
+from objects.LegOutputWriter import LegOutputWriter, LEG_OUTPUT_COLUMNS
+
+
+def create_legs(number_of_legs):
+    return pd.DataFrame({'Transportation Mode': 'Road', 'Origin Latitude': 53.55, 'Origin Longitude': 9.99,
+                         'Destination Latitude': 51.92, 'Destination Longitude': 4.48,
+                         'Shipment Weight [kg]': np.arange(number_of_legs), 'Shipment Volume [m3]': 1,
+                         'Emissions [kg]': np.arange(number_of_legs) / 10, 'Error': None})
+
+
+def test_batches_are_appended(tmp_path):
+    for extension in ['csv', 'parquet']:
+        path = str(tmp_path / f'legs.{extension}')
+        with LegOutputWriter(path) as leg_output:
+            leg_output.write(create_legs(3), 'transportation')
+            leg_output.write(create_legs(2), 'repositioning')
+
+        output_df = pd.read_csv(path) if extension == 'csv' else pd.read_parquet(path)
+        assert list(output_df.columns) == list(LEG_OUTPUT_COLUMNS)
+        assert output_df['Stage'].tolist() == ['transportation'] * 3 + ['repositioning'] * 2
+        assert output_df['Emissions [kg]'].tolist() == [0, 0.1, 0.2, 0, 0.1]
+        assert output_df['Payload hash'].isna().all()
@@ -0,0 +1,17 @@
+# import packages
+import subprocess
+import sys
+import os
+
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_help_does_not_load_the_calculation_modules():
+    res = subprocess.run([sys.executable, '-c', 'import sys, main; print(sorted(set(sys.modules) & '
+                                                "{'pandas', 'numpy', 'objects.EmissionsCalculator'}))"],
+                         cwd=REPOSITORY_PATH, capture_output=True, text=True, check=True)
+    assert res.stdout.strip() == '[]'
+
+    res = subprocess.run([sys.executable, 'main.py', '--help'], cwd=REPOSITORY_PATH, capture_output=True, text=True,
+                         check=True)
+    assert '--shipments' in res.stdout
@@ -0,0 +1,75 @@
+# import packages
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import pytest
+
+from objects.Instrumentation import Instrumentation
+from objects import MaritimeDistanceIndex as maritime_distance_index_module
+from objects.MaritimeDistanceIndex import MaritimeDistanceIndex
+
+ROTTERDAM = (51.95, 4.05)
+SINGAPORE = (1.26, 103.82)
+NEW_YORK = (40.66, -74.05)
+
+
+def get_number_of_searoute_calls(instrumentation):
+    return instrumentation.counters.get(Instrumentation.get_key('external_calls', {'service': 'searoute'}), 0)
+
+
+def test_both_directions_share_one_distance(tmp_path):
+    index = MaritimeDistanceIndex(str(tmp_path / 'maritime_distances.csv'), max_workers=0)
+
+    distance_km = index.get_distance(ROTTERDAM, SINGAPORE)
+    assert index.get_distance(SINGAPORE, ROTTERDAM) == distance_km
+    assert get_number_of_searoute_calls(index.instrumentation) == 1
+
+    # the saved distances are used by the next run
+    index.save()
+    index = MaritimeDistanceIndex(str(tmp_path / 'maritime_distances.csv'), max_workers=0)
+    assert index.get_distance(SINGAPORE, (51.9501, 4.0499)) == pytest.approx(distance_km)
+    assert get_number_of_searoute_calls(index.instrumentation) == 0
+
+
+def test_only_the_port_pairs_of_the_legs_are_indexed(tmp_path):
+    index = MaritimeDistanceIndex(None, max_workers=0)
+
+    index.build([(ROTTERDAM, SINGAPORE), (SINGAPORE, ROTTERDAM), (ROTTERDAM, NEW_YORK)])
+
+    assert len(index.distances) == 2
+    assert get_number_of_searoute_calls(index.instrumentation) == 2
+
+
+def test_workbook_index_computes_one_distance_per_lane(emc):
+    provisioning_df = emc.get_sheet('Script input provisioning data')
+    maritime_df = provisioning_df[(provisioning_df['Transportation Mode'] == 'Maritime') &
+                                  ~(provisioning_df['Distance [km] (if available)'] > 0)]
+    lanes = {emc.maritime_distance_index.get_key((row['Origin Latitude'], row['Origin Longitude']),
+                                                 (row['Destination Latitude'], row['Destination Longitude']))
+             for row in maritime_df.to_dict('records')}
+
+    emc.build_maritime_distance_index()
+
+    assert get_number_of_searoute_calls(emc.instrumentation) == len(lanes)
+
+
+def test_concurrent_requests_compute_a_distance_once(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def compute_searoute_distance(origin_latlong, destination_latlong):
+        with lock:
+            calls.append((origin_latlong, destination_latlong))
+        time.sleep(0.05)
+        return 100.0, 0.05
+
+    monkeypatch.setattr(maritime_distance_index_module, 'compute_searoute_distance', compute_searoute_distance)
+    index = MaritimeDistanceIndex(None, max_workers=0)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        distances = list(executor.map(lambda pair: index.get_distance(*pair), [(ROTTERDAM, SINGAPORE),
+                                                                                (SINGAPORE, ROTTERDAM)] * 8))
+
+    assert distances == [100.0] * 16
+    assert len(calls) == 1
+    assert len(index.pending_distances) == 0
@@ -0,0 +1,43 @@
+# import packages
+import os
+from parameters import run_parameters
+from objects.MockNTMServer import MockNTMServer
+from objects.EmissionsCalculator import EmissionsCalculator
+
+
+def test_workbook_is_calculated_offline(emc):
+    emissions_dict = emc.calculate_workbook_emissions()
+
+    assert emissions_dict == {'Variable road freight emissions': 17.67, 'Variable air freight emissions': 10036.66,
+                              'Repositioning/Provisioning emissions': 92.65}
+
+
+def test_offline_runs_do_not_change_the_caches_of_the_live_services(emc, tmp_path):
+    emc.calculate_workbook_emissions()
+
+    # the synthetic results are kept apart, so neither live runs nor recorded fixtures use them
+    assert emc.get_cache_path(run_parameters.NTM_cache_path) == str(tmp_path / 'ntm_results_offline.sqlite')
+    assert os.path.exists(emc.get_cache_path(run_parameters.NTM_cache_path))
+    assert os.path.exists(emc.get_cache_path(run_parameters.distance_cache_path))
+    assert not os.path.exists(run_parameters.NTM_cache_path)
+    assert not os.path.exists(run_parameters.distance_cache_path)
+    assert MockNTMServer.record_fixtures(str(tmp_path / 'fixtures.json')) == (0, 0)
+
+
+def test_recorded_responses_are_replayed(emc, mock_server, monkeypatch, tmp_path):
+    calculation_object_id, API_parameters = emc.create_road_freight_query(1000, 100, emc.transport_dict['repositioning'])
+    emc.post_transport_activity(calculation_object_id, API_parameters)
+
+    fixtures_path = str(tmp_path / 'fixtures.json')
+    assert MockNTMServer.record_fixtures(fixtures_path, emc.get_cache_path(run_parameters.NTM_cache_path))[0] == 1
+
+    # the replaying server answers unknown queries with 404
+    with MockNTMServer(MockNTMServer.load_fixtures(fixtures_path), synthesize_missing=False) as server:
+        monkeypatch.setattr(run_parameters, 'offline_server_url', server.url)
+        monkeypatch.setattr(run_parameters, 'use_NTM_cache', False)
+        emissions_calculator = EmissionsCalculator()
+
+        assert emissions_calculator.get_co2_emissions(
+            emissions_calculator.post_transport_activity(calculation_object_id, API_parameters)) == 12.0
+        assert 'resultTable' not in emissions_calculator.post_transport_activity(
+            *emc.create_road_freight_query(1000, 200, emc.transport_dict['repositioning']))
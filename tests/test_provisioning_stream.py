@@ -0,0 +1,47 @@
+# import packages
+import numpy as np
+
+from objects.ProvisioningStream import StreamingRepositioningCalculator
+
+
+def test_streamed_history_matches_the_provisioning_sheet(emc, tmp_path):
+    repositioning_emissions_kg = emc.calculate_repositioning_emissions()
+
+    for extension in ['csv', 'parquet']:
+        path = str(tmp_path / f"provisioning.{extension}")
+        provisioning_df = emc.get_sheet('Script input provisioning data')
+        provisioning_df.to_csv(path, index=False) if extension == 'csv' else provisioning_df.to_parquet(path, index=False)
+
+        calculator = StreamingRepositioningCalculator(emc, chunk_rows=3, batch_legs=2)
+        assert np.isclose(calculator.calculate_repositioning_emissions(path), repositioning_emissions_kg)
+        assert calculator.number_of_failed_legs == 0
+
+
+def test_memory_stays_flat_across_batches(emc, tmp_path):
+    shipment_parameters = emc.transport_dict['new shipment']['shipment parameters']
+
+    # a history of road legs on distinct lanes without distance
+    provisioning_df = emc.get_sheet('Script input provisioning data').iloc[[0]*40].reset_index(drop=True)
+    provisioning_df = provisioning_df.assign(**{
+        'Container Type': shipment_parameters['Container Type'],
+        'Destination Service Center': shipment_parameters['Origin Service Center'],
+        'Shipment Type': 'Provisioning', 'Transportation Mode': 'Road', 'Distance [km] (if available)': 0,
+        'Origin Latitude': 50 + 0.01*provisioning_df.index})
+    path = str(tmp_path / 'provisioning.csv')
+    provisioning_df.to_csv(path, index=False)
+
+    calculator = StreamingRepositioningCalculator(emc, chunk_rows=7, batch_legs=5)
+    sizes = []
+    calculate_batch_emissions = calculator.calculate_batch_emissions
+    def record_sizes(df_repositioning):
+        emissions_kg = calculate_batch_emissions(df_repositioning)
+        sizes.append((len(emc.road_distances), len(emc.coalescer.futures)))
+        return emissions_kg
+    calculator.calculate_batch_emissions = record_sizes
+    number_of_road_distances = len(emc.road_distances)
+
+    calculator.calculate_repositioning_emissions(path)
+
+    assert calculator.number_of_legs == 40 and calculator.number_of_failed_legs == 0
+    assert len(sizes) == 8
+    assert all(size == (number_of_road_distances, 0) for size in sizes)
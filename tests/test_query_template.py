@@ -0,0 +1,36 @@
+# import packages
+import pandas as pd
+
+from objects.Leg import Leg
+from objects.QueryTemplate import QueryTemplate
+
+
+def test_queries_only_differ_in_the_leg_values(emc):
+    parameter_dict = emc.transport_dict['new shipment']
+    query_template = emc.get_query_template('Air', parameter_dict)
+
+    calculation_object_id, API_parameters = query_template.create_query(1000, 2, 500)
+    values = {parameter['id']: parameter['value'] for parameter in API_parameters}
+    assert calculation_object_id in ['freight_aircraft', 'belly_freighter_cargo']
+    assert (values['shipment_weight'], values['shipment_volume'], values['distance']) == ('1000', '2', '500')
+
+    # the template is shared and not changed by the queries
+    assert all(parameter['value'] is None for parameter in query_template.parameters
+               if parameter['id'] in ['shipment_weight', 'shipment_volume', 'distance'])
+    assert emc.get_query_template('Air', parameter_dict) is query_template
+    assert QueryTemplate.get_configuration_key('Air', parameter_dict)[0] == 'Air'
+
+
+def test_road_queries_hold_the_tonne_kilometres(emc):
+    calculation_object_id, API_parameters = emc.create_road_freight_query(2500, 100, emc.transport_dict['repositioning'])
+    assert {parameter['id']: parameter['value'] for parameter in API_parameters}['transport_effort'] == '250.0'
+
+
+def test_legs_are_created_column_by_column():
+    legs = Leg.from_dataframe(pd.DataFrame({
+        'Transportation Mode': ['Road', 'Air'], 'Origin Latitude': [1, 2], 'Origin Longitude': [3, 4],
+        'Destination Latitude': [5, 6], 'Destination Longitude': [7, 8], 'Shipment Weight [kg]': [10, 20],
+        'Shipment Volume [m3]': [1, 2], 'Distance [km]': [100, float('nan')]}))
+
+    assert [(leg.origin_latlong, leg.distance_km, leg.distance_source) for leg in legs] == \
+           [((1, 3), 100, 'input'), ((2, 4), None, None)]
@@ -0,0 +1,46 @@
+# import packages
+import time
+
+from parameters import run_parameters
+from objects.RateLimiter import RateLimiter, create_rate_limiters
+
+
+def test_requests_wait_for_the_token_bucket():
+    rate_limiter = RateLimiter('ntm', requests_per_second=20, burst=5, max_concurrency=100)
+
+    start_time = time.perf_counter()
+    for request in range(15):
+        rate_limiter.acquire()
+        rate_limiter.release(200, 0.01)
+
+    # the burst is sent at once, the other 10 requests at 20 per second
+    assert 0.4 < time.perf_counter() - start_time < 1
+
+
+def test_rate_limits_halve_the_concurrency_and_pause_the_requests():
+    rate_limiter = RateLimiter('ntm', requests_per_second=100, max_concurrency=8)
+
+    rate_limiter.acquire()
+    rate_limiter.release(429, 0.01, retry_after_seconds=0.3)
+
+    assert rate_limiter.concurrency_limit == 4
+    assert rate_limiter.requests_per_second == 50
+    assert rate_limiter.try_acquire() > 0.2
+
+
+def test_successful_requests_increase_the_concurrency():
+    rate_limiter = RateLimiter('ntm', requests_per_second=1000, burst=1000, max_concurrency=8)
+    rate_limiter.concurrency_limit = 2
+
+    for request in range(10):
+        rate_limiter.acquire()
+        rate_limiter.release(200, 0.01)
+
+    assert rate_limiter.concurrency_limit > 4
+
+
+def test_requests_to_the_local_stand_in_are_not_limited(mock_server, monkeypatch):
+    assert create_rate_limiters() == dict()
+
+    monkeypatch.setattr(run_parameters, 'offline_server_url', None)
+    assert set(create_rate_limiters()) == set(run_parameters.rate_limits)
@@ -0,0 +1,16 @@
+# import packages
+import numpy as np
+
+
+def test_table_lookup_matches_the_calculation_of_the_new_shipment(emc):
+    repositioning_emissions_kg = emc.calculate_repositioning_emissions()
+
+    assert repositioning_emissions_kg > 0
+    assert np.isclose(emc.calculate_repositioning_emissions(vectorized=True), repositioning_emissions_kg)
+
+
+def test_service_centers_without_provisioning_legs_have_no_emissions(emc):
+    repositioning_table = emc.calculate_repositioning_table()
+    container_type = emc.transport_dict['new shipment']['shipment parameters']['Container Type']
+
+    assert emc.lookup_repositioning_emissions(container_type, 'Unknown service center', 2, repositioning_table) == 0
@@ -0,0 +1,80 @@
+# import packages
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import copy
+import time
+import pytest
+
+from objects.RequestCoalescer import RequestCoalescer
+
+
+def test_requests_in_flight_are_shared():
+    coalescer = RequestCoalescer()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def calculate(value):
+        calls.append(value)
+        started.set()
+        release.wait(5)
+        return value
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(coalescer.call, 'legs', 'key', calculate, 1)
+        started.wait(5)
+        second = executor.submit(coalescer.call, 'legs', 'key', calculate, 2)
+        release.set()
+
+        assert first.result() == 1
+        assert second.result() == 1
+    assert calls == [1]
+    assert coalescer.get_dedup_ratio('legs') == 0.5
+
+
+def test_failed_requests_are_calculated_again():
+    coalescer = RequestCoalescer()
+
+    def fail():
+        raise Exception('NTM request failed')
+
+    with pytest.raises(Exception):
+        coalescer.call('legs', 'key', fail)
+    assert coalescer.call('legs', 'key', lambda: 12.0) == 12.0
+
+
+def test_legs_of_shipments_with_other_parameters_share_the_ntm_query(emc):
+    legs_df = emc.get_shipment_legs()
+    road_legs_df = legs_df[legs_df['Transportation Mode'] == 'Road']
+
+    # the shipments only differ in their air freight parameters
+    parameter_dict = copy.deepcopy(emc.transport_dict['new shipment'])
+    parameter_dict['shipment parameters']['Shipment ID'] = 'other shipment'
+    parameter_dict['NTM parameters']['Air']['cargo_load_factor_weight'] = '80'
+
+    results_df = emc.batch_engine.calculate_leg_emissions(road_legs_df, emc.transport_dict['new shipment'])
+    number_of_shared_legs = emc.coalescer.statistics['legs']['shared']
+    other_results_df = emc.batch_engine.calculate_leg_emissions(road_legs_df, parameter_dict)
+
+    assert other_results_df['Emissions [kg]'].tolist() == results_df['Emissions [kg]'].tolist()
+    assert emc.coalescer.statistics['legs']['shared'] == number_of_shared_legs + len(road_legs_df)
+
+
+def test_completed_results_are_cleared():
+    coalescer = RequestCoalescer()
+    release = threading.Event()
+
+    assert coalescer.call('legs', 'finished', lambda: 12.0) == 12.0
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        in_flight = executor.submit(coalescer.call, 'legs', 'in flight', lambda: release.wait(5) and 24.0)
+        while ('legs', 'in flight') not in coalescer.futures:
+            time.sleep(0.01)
+
+        coalescer.clear_completed()
+        assert list(coalescer.futures) == [('legs', 'in flight')]
+        release.set()
+        assert in_flight.result() == 24.0
+
+    coalescer.clear_completed()
+    assert len(coalescer.futures) == 0
+    assert coalescer.statistics['legs']['requests'] == 2
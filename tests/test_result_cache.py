@@ -0,0 +1,39 @@
+# import packages
+import time
+
+from objects.ResultCache import ResultCache
+
+
+def test_results_are_kept_between_runs(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    ResultCache(path).set('query', {'value': 1.5}, latency_seconds=2)
+
+    cache = ResultCache(path)
+    assert cache.get('query') == {'value': 1.5}
+    assert cache.get('other query') is None
+    assert cache.statistics() == {'hits': 1, 'misses': 1, 'saved seconds': 2}
+
+
+def test_keys_do_not_depend_on_the_order_of_the_query():
+    assert ResultCache.make_key({'a': 1, 'b': [1, 2]}) == ResultCache.make_key({'b': [1, 2], 'a': 1})
+    assert ResultCache.make_key({'a': 1}) != ResultCache.make_key({'a': 2})
+
+
+def test_expired_results_are_not_returned(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.sqlite'), ttl_seconds=0.05)
+    cache.set('query', 1)
+    time.sleep(0.1)
+
+    assert cache.get('query') is None
+    assert cache.items() == []
+
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.sqlite'), max_entries=2)
+    cache.set('first', 1)
+    cache.set('second', 2)
+    time.sleep(0.01)
+    cache.get('first')
+    cache.set('third', 3)
+
+    assert sorted(key for key, value in cache.items()) == ['first', 'third']
@@ -0,0 +1,63 @@
+# import packages
+import numpy as np
+import pytest
+
+from parameters import run_parameters
+from objects.RetryPolicy import post_with_retries, get_retry_after_seconds
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+
+def test_server_errors_are_retried(isolated_run_parameters):
+    responses = [FakeResponse(503), FakeResponse(429), FakeResponse(200)]
+
+    res = post_with_retries(lambda url, **kwargs: responses.pop(0), 'http://ntm')
+
+    assert res.status_code == 200
+    assert len(responses) == 0
+
+
+def test_the_last_response_is_returned_after_the_retries(isolated_run_parameters):
+    number_of_attempts = []
+
+    def post(url, **kwargs):
+        number_of_attempts.append(url)
+        return FakeResponse(503)
+
+    assert post_with_retries(post, 'http://ntm').status_code == 503
+    assert len(number_of_attempts) == run_parameters.NTM_max_retries + 1
+
+
+def test_retry_after_is_read_in_seconds():
+    assert get_retry_after_seconds({'Retry-After': '2'}) == 2
+    assert get_retry_after_seconds({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}) is None
+    assert get_retry_after_seconds({}) is None
+
+
+def test_totals_with_failed_legs_are_not_undercounted(emc, mock_server, monkeypatch):
+    # only the NTM requests fail
+    emc.prefetch_road_distances()
+    mock_server.error_rate = 1
+
+    assert np.isnan(emc.calculate_repositioning_emissions())
+
+    monkeypatch.setattr(run_parameters, 'allow_partial_totals', True)
+    assert emc.calculate_repositioning_emissions() == 0
+
+
+def test_malformed_responses_fail_the_leg(emc, monkeypatch):
+    with pytest.raises(Exception, match='NTM returned no result'):
+        emc.get_co2_emissions({'resultTable': {'index': {}, 'totals': []}})
+
+    monkeypatch.setattr(emc, 'post_transport_activity', lambda *query: {'resultTable': {'index': {'co2_total': 3},
+                                                                                         'totals': []}})
+    legs_df = emc.get_shipment_legs()
+    legs_df['Distance [km]'] = 100.0
+    results_df = emc.batch_engine.calculate_leg_emissions(legs_df, emc.transport_dict['new shipment'])
+
+    assert results_df['Emissions [kg]'].isna().all()
+    assert results_df['Error'].str.startswith('NTM returned no result').all()
@@ -0,0 +1,47 @@
+# import packages
+import numpy as np
+
+from parameters import run_parameters
+from objects.ScenarioSweep import ScenarioSweep, create_scenarios
+
+
+def test_scenarios_have_the_emissions_of_the_workbook(emc):
+    emissions_dict = emc.calculate_workbook_emissions()
+
+    output_df = ScenarioSweep(emc).run(create_scenarios({'RFI': [run_parameters.RFI, 2*run_parameters.RFI]}))
+
+    for name, emissions_kg in emissions_dict.items():
+        assert output_df.loc[0, name] == emissions_kg
+    assert np.isclose(output_df.loc[1, 'Variable air freight emissions'], 2*emissions_dict['Variable air freight emissions'])
+    assert (output_df['Failed legs'] == 0).all()
+
+
+def test_overrides_apply_to_every_leg(emc):
+    overrides = {'default_aircraft_type_ID': 'A330-200-Belly', 'volumetric_cargo_load_factor': 0.5}
+
+    # the shipment of the workbook has its own aircraft model and load factors, repositioning flies the default
+    assert emc.transport_dict['new shipment']['NTM parameters']['Air']['aircraft model'] == 'B747-400F'
+    for leg_type in ['new shipment', 'repositioning']:
+        air_parameters = ScenarioSweep.apply_overrides(emc.transport_dict[leg_type], overrides)['NTM parameters']['Air']
+        assert air_parameters['aircraft_type_ID'] == 'a330_200_belly'
+        assert air_parameters['aircraft model'] == 'A330-200-Belly'
+        assert air_parameters['aircraft type'] == 'Belly freight - cargo'
+        assert air_parameters['volumetric_cargo_load_factor'] == '0.5'
+
+
+def test_aircraft_sweep_changes_the_shipment_of_the_workbook(emc):
+    output_df = ScenarioSweep(emc).run(create_scenarios({'default_aircraft_type_ID': 'all'}))
+
+    air_emissions = output_df.set_index('default_aircraft_type_ID')['Variable air freight emissions']
+    assert air_emissions['A330-200-Belly'] != air_emissions['B747-400F']
+    assert (output_df['Failed legs'] == 0).all()
+
+
+def test_totals_with_failed_legs_are_left_empty(emc, mock_server):
+    emc.prefetch_road_distances()
+    mock_server.error_rate = 1
+
+    output_df = ScenarioSweep(emc).run([{}])
+
+    assert np.isnan(output_df.loc[0, 'Variable road freight emissions'])
+    assert output_df.loc[0, 'Failed legs'] > 0
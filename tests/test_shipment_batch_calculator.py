@@ -0,0 +1,37 @@
+# import packages
+import pandas as pd
+import numpy as np
+
+from objects.ShipmentBatchCalculator import ShipmentBatchCalculator, read_table, write_table
+
+
+def create_batch(emc, number_of_shipments):
+    """
+    :return: DataFrame with copies of the new shipment of the workbook and DataFrame with copies of its legs
+    """
+    shipment_df = emc.get_sheet('Script input new shipment data').iloc[:1]
+    legs_df = emc.get_sheet('Script input transpo data')
+
+    shipments_df = pd.concat([shipment_df.assign(**{'Shipment ID': f"S{number}"}) for number in range(number_of_shipments)], ignore_index=True)
+    legs_df = pd.concat([legs_df.assign(**{'Shipment ID': f"S{number}"}) for number in range(number_of_shipments)], ignore_index=True)
+    return shipments_df, legs_df
+
+
+def test_identical_shipments_have_the_emissions_of_the_workbook(emc):
+    airfreight_emissions_kg, road_freight_emissions_kg = emc.calculate_shipment_transportation_emissions()
+    repositioning_emissions_kg = emc.calculate_repositioning_emissions()
+
+    output_df = ShipmentBatchCalculator(emc).calculate_shipment_emissions(*create_batch(emc, 3))
+
+    assert output_df['Shipment ID'].tolist() == ['S0', 'S1', 'S2']
+    assert np.allclose(output_df['Variable air freight emissions'], np.around(airfreight_emissions_kg, 2))
+    assert np.allclose(output_df['Variable road freight emissions'], np.around(road_freight_emissions_kg, 2))
+    assert np.allclose(output_df['Repositioning/Provisioning emissions'], np.around(repositioning_emissions_kg, 2))
+    assert (output_df['Failed legs'] == 0).all()
+
+
+def test_tables_are_read_and_written_by_extension(tmp_path):
+    df = pd.DataFrame({'Shipment ID': ['S0', 'S1'], 'Variable road freight emissions': [1.5, 2.5]})
+    for extension in ['csv', 'parquet', 'xlsx']:
+        write_table(df, str(tmp_path / f"table.{extension}"))
+        pd.testing.assert_frame_equal(read_table(str(tmp_path / f"table.{extension}")), df)
@@ -0,0 +1,25 @@
+# import packages
+import os
+import pytest
+import pandas as pd
+
+from parameters import run_parameters
+from objects.WorkbookLoader import WorkbookLoader, WORKBOOK_SCHEMAS
+
+
+def test_sheets_are_read_from_the_sidecars(tmp_path):
+    loader = WorkbookLoader(run_parameters.path_to_workbook, str(tmp_path), 'parquet')
+    sheets = loader.load()
+
+    assert set(sheets) == set(WORKBOOK_SCHEMAS)
+    assert len(os.listdir(tmp_path)) == len(WORKBOOK_SCHEMAS)
+
+    # the second load does not parse the workbook
+    sidecar_sheets = loader.load()
+    for sheet_name, df in sheets.items():
+        pd.testing.assert_frame_equal(sidecar_sheets[sheet_name], df, check_dtype=False)
+
+
+def test_missing_columns_are_reported():
+    with pytest.raises(Exception, match='missing the columns'):
+        WorkbookLoader.validate('Script input transpo data', pd.DataFrame({'Transportation Mode': ['Road']}))